@@ -23,38 +23,40 @@ states = [
 ffiec = "http://www.ffiec.gov/hmdarawdata/OTHER/"
 
 
-def load_transmittal(working_dir):
+def load_transmittal(working_dir, year=2012):
     """Download and run the load_transmittal command"""
+    filename = "%sHMDAInstitutionRecords" % year
     with lcd(working_dir):
-        local("wget %s2012HMDAInstitutionRecords.zip" % ffiec)
-        local("unzip 2012HMDAInstitutionRecords.zip")
-        local("rm 2012HMDAInstitutionRecords.zip")
+        local("wget %s%s.zip" % (ffiec, filename))
+        local("unzip %s.zip" % filename)
+        local("rm %s.zip" % filename)
     with lcd("../institutions"):
         local("python manage.py load_transmittal "
-              + working_dir + "/2012HMDAInstitutionRecords.txt")
+              + working_dir + "/%s.txt" % filename)
     with lcd(working_dir):
-        local("rm 2012HMDAInstitutionRecords.txt")
+        local("rm %s.txt" % filename)
 
 
-def load_reporter_panel(working_dir):
+def load_reporter_panel(working_dir, year=2012):
     """Download and run the load_reporter_panel command"""
+    filename = "%sHMDAReporterPanel" % year
     with lcd(working_dir):
-        local("wget %s2012HMDAReporterPanel.zip" % ffiec)
-        local("unzip 2012HMDAReporterPanel.zip")
-        local("rm 2012HMDAReporterPanel.zip")
+        local("wget %s%s.zip" % (ffiec, filename))
+        local("unzip %s.zip" % filename)
+        local("rm %s.zip" % filename)
     with lcd("../institutions"):
         local("python manage.py load_reporter_panel "
-              + working_dir + "/2012HMDAReporterPanel.dat")
+              + working_dir + "/%s.dat" % filename)
     with lcd(working_dir):
-        local("rm 2012HMDAReporterPanel.dat")
+        local("rm %s.dat" % filename)
 
 
-def load_respondants(working_dir):
+def load_respondants(working_dir, year=2012):
     """Load everything for the respondants app"""
     with lcd("../institutions"):
         local("python manage.py loaddata agency")
-    load_transmittal(working_dir)
-    load_reporter_panel(working_dir)
+    load_transmittal(working_dir, year)
+    load_reporter_panel(working_dir, year)
 
 
 def load_state_shapefiles(working_dir):
@@ -77,28 +79,37 @@ def load_state_shapefiles(working_dir):
             local("rm " + filename.replace("zip", "*"))
 
 
-def load_summary_ones(working_dir):
-    """For all states, download census files and load them into the db"""
+def load_summary_ones(working_dir, processes=4):
+    """For all states, download census files and load them into the db. The
+    states are downloaded and loaded a batch (of `processes` states) at a
+    time, and each batch's files are removed once loaded, so only that many
+    states' files are on disk at once"""
     url_tpl = "http://www2.census.gov/census_2010/04-Summary_File_1/%s/"
     url_tpl += "%s2010.sf1.zip"
-    for long_name, short_name in states:
+    processes = int(processes)
+    for start in range(0, len(states), processes):
+        batch = states[start:start + processes]
         with lcd(working_dir):
-            local("wget " + url_tpl % (long_name, short_name))
-            local("unzip {0}2010.sf1.zip {0}geo2010.sf1 {0}0000?2010.sf1"
-                  .format(short_name))
-            local("rm %s2010.sf1.zip" % short_name)
+            for long_name, short_name in batch:
+                local("wget " + url_tpl % (long_name, short_name))
+                local("unzip {0}2010.sf1.zip {0}geo2010.sf1 {0}0000?2010.sf1"
+                      .format(short_name))
+                local("rm %s2010.sf1.zip" % short_name)
         with lcd("../institutions"):
-            local("python manage.py load_summary_one "
-                  + working_dir + "/%sgeo2010.sf1" % short_name)
+            local("python manage.py load_summary_one --processes %s "
+                  % processes
+                  + " ".join(working_dir + "/%sgeo2010.sf1" % short_name
+                             for _, short_name in batch))
         with lcd(working_dir):
-            local("rm %sgeo2010.sf1" % short_name)
-            local("rm %s0000?2010.sf1" % short_name)
+            for _, short_name in batch:
+                local("rm %sgeo2010.sf1" % short_name)
+                local("rm %s0000?2010.sf1" % short_name)
 
 
-def load_hmda(working_dir):
-    """Download HMDA data and then load it into the db"""
+def load_hmda(working_dir, year=2012):
+    """Download a year's HMDA data and then load it into the db"""
     base_url = "http://www.ffiec.gov/hmdarawdata/LAR/National/"
-    filename = "2012HMDALAR - National.zip"
+    filename = "%sHMDALAR - National.zip" % year
     with lcd(working_dir):
         local("wget '" + base_url + filename + "'")
         local("unzip '" + filename + "'")
@@ -110,9 +121,11 @@ def load_hmda(working_dir):
         local("rm '" + filename.replace("zip", "csv") + "'")
 
 
-def load_all(working_dir="/tmp"):
-    """Download and import all data for the app"""
-    load_respondants(working_dir)
+def load_all(working_dir="/tmp", year=2012):
+    """Download and import all data for the app, with HMDA data (and
+    institutions) for the given year. Further years can be added with
+    load_respondants and load_hmda"""
+    load_respondants(working_dir, year)
     load_state_shapefiles(working_dir)
     load_summary_ones(working_dir)
-    load_hmda(working_dir)
+    load_hmda(working_dir, year)
@@ -0,0 +1,74 @@
+"""Many map users request the same (endpoint, params) pairs. Results are
+shared in two ways: identical requests which arrive while one is already
+being computed wait for that computation rather than start their own, and
+finished results are kept in a cache shared between processes, keyed by the
+versions of the data they were computed from (see batch.versions)."""
+import hashlib
+import json
+import threading
+
+from django.core.cache import get_cache
+
+
+def results_cache():
+    return get_cache('batch_results')
+
+
+def request_key(endpoint, params):
+    """Params arrive in any order (and, via GET, as a QueryDict)"""
+    normalized = json.dumps(sorted(dict(params.items()).items()))
+    return hashlib.md5(endpoint + ':' + normalized).hexdigest()
+
+
+class _Call(object):
+    """A computation which other threads may be waiting on"""
+    def __init__(self):
+        self.done = threading.Event()
+        self.result, self.error = None, None
+
+
+class Coalescer(object):
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.in_flight = {}
+
+    def call(self, key, fn, params):
+        """Run fn(params) unless an identical call is already running, in
+        which case wait for and share its result (or exception)"""
+        with self.lock:
+            call = self.in_flight.get(key)
+            leader = call is None
+            if leader:
+                call = self.in_flight[key] = _Call()
+        if leader:
+            try:
+                call.result = fn(params)
+            except Exception as err:
+                call.error = err
+            finally:
+                with self.lock:
+                    del self.in_flight[key]
+                call.done.set()
+        else:
+            call.done.wait()
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+
+_coalescer = Coalescer()
+
+
+def cached_call(endpoint, fn, params, version):
+    """Look for a cached result, otherwise compute one (sharing the work with
+    identical concurrent requests). `version` names the data the result
+    depends on (see batch.versions.stamp). Only successful (i.e. dictionary)
+    responses are cached"""
+    key = 'batch:%s:%s' % (version, request_key(endpoint, params))
+    cache = results_cache()
+    result = cache.get(key)
+    if result is None:
+        result = _coalescer.call(key, fn, params)
+        if isinstance(result, dict):
+            cache.set(key, result)
+    return result
@@ -0,0 +1,99 @@
+"""Responses which are cached (tiles, statistics) are stored already
+compressed, once per encoding clients may accept. Serving a cache hit is then
+a matter of picking the variant named by Accept-Encoding (see
+encoded_response) rather than compressing again. Brotli is optional: without
+the brotli package, only gzip variants are stored."""
+import gzip
+from StringIO import StringIO
+
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:     # optional
+    brotli = None
+
+
+#   In order of preference
+ENCODINGS = ('br', 'gzip')
+
+
+def gzip_compress(content):
+    if isinstance(content, unicode):
+        content = content.encode('utf-8')
+    buf = StringIO()
+    with gzip.GzipFile(fileobj=buf, mode='wb', compresslevel=9) as gz:
+        gz.write(content)
+    return buf.getvalue()
+
+
+def gzip_decompress(content):
+    with gzip.GzipFile(fileobj=StringIO(content), mode='rb') as gz:
+        return gz.read()
+
+
+def brotli_compress(content):
+    if isinstance(content, unicode):
+        content = content.encode('utf-8')
+    return brotli.compress(content)
+
+
+def compress(content):
+    """{encoding: compressed bytes} for each available encoding"""
+    variants = {'gzip': gzip_compress(content)}
+    if brotli is not None:
+        variants['br'] = brotli_compress(content)
+    return variants
+
+
+def accepted_encodings(request):
+    """Encodings named in the Accept-Encoding header, less any refused
+    (q=0)"""
+    accepted = set()
+    for entry in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        params = [param.strip() for param in entry.split(';')]
+        refused = False
+        for param in params[1:]:
+            if param.startswith('q='):
+                try:
+                    refused = float(param[2:]) == 0
+                except ValueError:
+                    pass
+        if params[0] and not refused:
+            accepted.add(params[0].lower())
+    return accepted
+
+
+def selected_encoding(request, available=None):
+    """The encoding encoded_response will send: the most preferred of those
+    available (by default, all which compress() produces) which the client
+    accepts, else 'identity' (uncompressed)"""
+    if available is None:
+        available = ENCODINGS if brotli is not None else ('gzip',)
+    accepted = accepted_encodings(request)
+    for encoding in ENCODINGS:
+        if encoding in available and encoding in accepted:
+            return encoding
+    return 'identity'
+
+
+def encoding_etag(request, etag):
+    """Each encoding of a response is a different representation, so needs
+    its own (strong) ETag"""
+    return '%s-%s' % (etag, selected_encoding(request))
+
+
+def encoded_response(request, variants, content_type):
+    """Send the preferred variant the client accepts, or, failing that, the
+    uncompressed content"""
+    encoding = selected_encoding(request, variants)
+    if encoding == 'identity':
+        response = HttpResponse(gzip_decompress(variants['gzip']),
+                                content_type=content_type)
+    else:
+        response = HttpResponse(variants[encoding],
+                                content_type=content_type)
+        response['Content-Encoding'] = encoding
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
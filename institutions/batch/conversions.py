@@ -2,6 +2,11 @@ import json
 
 from django.http import HttpResponse
 
+from batch import versions
+from batch.coalesce import request_key, results_cache
+from batch.compression import compress, encoded_response, encoding_etag
+from geo.filters import area_states
+
 
 def use_GET_in(fn, request):
     """Pass the request's GET dictionary in to fn. If the response is not a
@@ -13,3 +18,37 @@ def use_GET_in(fn, request):
                             content_type='application/json')
     else:
         return response
+
+
+def versioned_key(endpoint, datasets, params):
+    """Identifies an endpoint's response to params, given the current
+    versions of the datasets it is computed from"""
+    return '%s:%s' % (versions.stamp(datasets, area_states(params)),
+                      request_key(endpoint, params))
+
+
+def versioned_etag(endpoint, datasets):
+    """An etag_func (see django.views.decorators.http.condition) for a GET
+    endpoint whose responses only change when the requested area's data (in
+    the given datasets) does. Unchanged responses become 304s without being
+    computed"""
+    def etag(request, *args, **kwargs):
+        return encoding_etag(request, versions.etag(
+            versioned_key(endpoint, datasets, request.GET)))
+    return etag
+
+
+def cached_GET_in(endpoint, fn, request, datasets):
+    """Like use_GET_in, but dictionary responses are cached as compressed
+    JSON (see batch.compression) until the requested area's data changes,
+    and sent in whichever encoding the client accepts"""
+    key = 'http:' + versioned_key(endpoint, datasets, request.GET)
+    cache = results_cache()
+    variants = cache.get(key)
+    if variants is None:
+        response = fn(request.GET)
+        if not isinstance(response, dict):
+            return response
+        variants = compress(json.dumps(response))
+        cache.set(key, variants)
+    return encoded_response(request, variants, 'application/json')
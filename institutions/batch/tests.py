@@ -1,12 +1,18 @@
 import json
+from multiprocessing import TimeoutError
+import threading
+import time
 
 from django.core.urlresolvers import reverse
 from django.http import HttpResponseNotFound
 from django.test import TestCase
+from django.test.client import RequestFactory
+from django.test.utils import override_settings
 from mock import Mock, patch
 
-from batch import views
-from batch.conversions import use_GET_in
+from batch import coalesce, compression, versions, views
+from batch.conversions import cached_GET_in, use_GET_in
+from dataload.models import DataVersion
 
 
 class ConversionTest(TestCase):
@@ -27,9 +33,60 @@ class ConversionTest(TestCase):
         self.assertEqual(response.status_code, 404)
         self.assertEqual(response.content, 'Oh noes')
 
+    def test_cached_GET_in(self):
+        coalesce.results_cache().clear()
+        fn = Mock(return_value={'a': 1})
+        params = {'state_fips': '11', 'county_fips': '222'}
+        request = RequestFactory().get('/', params,
+                                       HTTP_ACCEPT_ENCODING='gzip')
+        for _ in range(2):
+            response = cached_GET_in('e', fn, request, versions.DATASETS)
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+            self.assertEqual(
+                json.loads(compression.gzip_decompress(response.content)),
+                {'a': 1})
+        self.assertEqual(1, fn.call_count)
+
+        versions.bump(versions.CENSUS, ['11'])
+        response = cached_GET_in('e', fn, RequestFactory().get('/', params),
+                                 versions.DATASETS)
+        self.assertEqual(json.loads(response.content), {'a': 1})
+        self.assertEqual(2, fn.call_count)
+
+        # Errors aren't cached
+        fn.return_value = HttpResponseNotFound('Oh noes')
+        response = cached_GET_in('other', fn, request, versions.DATASETS)
+        self.assertEqual(response.status_code, 404)
+
+
+class CompressionTest(TestCase):
+    """Tests batch.compression"""
+    def test_accepted_encodings(self):
+        request = RequestFactory().get(
+            '/', HTTP_ACCEPT_ENCODING='gzip;q=1.0, br; q=0.0, identity')
+        self.assertEqual(compression.accepted_encodings(request),
+                         set(['gzip', 'identity']))
+
+    def test_encoded_response(self):
+        variants = compression.compress(u'{"a": 1}')
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip')
+        response = compression.encoded_response(request, variants,
+                                                'application/json')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response.content, variants['gzip'])
+        self.assertTrue('Accept-Encoding' in response['Vary'])
+
+        response = compression.encoded_response(
+            RequestFactory().get('/'), variants, 'application/json')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(response.content, '{"a": 1}')
+
 
 class ViewsTests(TestCase):
     """Tests batch.views"""
+    def setUp(self):
+        coalesce.results_cache().clear()
+
     def test_batch_user_errors(self):
         resp = self.client.post(reverse('batch'),
                                 content_type='application/json',
@@ -72,3 +129,181 @@ class ViewsTests(TestCase):
         self.assertEqual(args1, {})
         self.assertEqual(args2, {'a': '1'})
         self.assertEqual(args3, {'a': '5', 'b': '8'})
+
+    @patch.dict('batch.views.ENDPOINTS', other=Mock())
+    def test_batch_concurrent(self):
+        threads = set()
+
+        def slow(params):
+            threads.add(threading.current_thread())
+            time.sleep(0.05 * (3 - int(params['a'])))
+            return {'a': params['a']}
+        views.ENDPOINTS['other'].side_effect = slow
+        data = {"requests": [{"endpoint": "other", "params": {"a": str(i)}}
+                             for i in range(3)]}
+        resp = self.client.post(reverse('batch'),
+                                content_type='application/json',
+                                data=json.dumps(data))
+        self.assertEqual(resp.status_code, 200)
+        resp = json.loads(resp.content)
+        # Slowest first, but results are still in request order
+        self.assertEqual(resp['responses'],
+                         [{'a': '0'}, {'a': '1'}, {'a': '2'}])
+        self.assertEqual(3, len(threads))
+
+    @override_settings(BATCH_TIMEOUT=0.05)
+    @patch.dict('batch.views.ENDPOINTS', other=Mock())
+    def test_batch_timeout(self):
+        views.ENDPOINTS['other'].side_effect = lambda p: time.sleep(0.5)
+        resp = self.client.post(reverse('batch'),
+                                content_type='application/json',
+                                data='{"requests": [{"endpoint": "other"}]}')
+        self.assertEqual(resp.status_code, 504)
+
+    def test_run_endpoint_expired(self):
+        """Sub-requests which would start after the batch has given up are
+        skipped"""
+        fn = Mock(return_value={'a': 1})
+        self.assertRaises(TimeoutError, views.run_endpoint, 'other', fn, {},
+                          'v', time.time() - 1, threading.Event())
+        cancelled = threading.Event()
+        cancelled.set()
+        self.assertRaises(TimeoutError, views.run_endpoint, 'other', fn, {},
+                          'v', time.time() + 10, cancelled)
+        self.assertFalse(fn.called)
+        self.assertEqual({'a': 1}, views.run_endpoint(
+            'other', fn, {}, 'v', time.time() + 10, threading.Event()))
+
+    @override_settings(BATCH_TIMEOUT=0)
+    @patch.dict('batch.views.ENDPOINTS', other=Mock())
+    def test_batch_expired(self):
+        views.ENDPOINTS['other'].return_value = {'a': 1}
+        resp = self.client.post(reverse('batch'),
+                                content_type='application/json',
+                                data='{"requests": [{"endpoint": "other"}]}')
+        self.assertEqual(resp.status_code, 504)
+        self.assertFalse(views.ENDPOINTS['other'].called)
+
+    @patch.dict('batch.views.ENDPOINTS', other=Mock())
+    def test_batch_cached(self):
+        views.ENDPOINTS['other'].return_value = {'some': 3}
+        data = json.dumps({"requests": [
+            {"endpoint": "other", "params": {"a": "1", "b": "2"}},
+            {"endpoint": "other", "params": {"b": "2", "a": "1"}}]})
+        for _ in range(2):
+            resp = self.client.post(reverse('batch'),
+                                    content_type='application/json',
+                                    data=data)
+            self.assertEqual(json.loads(resp.content)['responses'],
+                             [{'some': 3}]*2)
+        self.assertEqual(1, views.ENDPOINTS['other'].call_count)
+
+        # Loading data makes the results stale
+        versions.bump(versions.HMDA)
+        self.client.post(reverse('batch'), content_type='application/json',
+                         data=data)
+        self.assertEqual(2, views.ENDPOINTS['other'].call_count)
+
+    @patch.dict('batch.views.ENDPOINTS', other=Mock())
+    def test_batch_cached_per_state(self):
+        views.ENDPOINTS['other'].return_value = {'some': 3}
+        data = json.dumps({"requests": [{"endpoint": "other", "params": {
+            "state_fips": "11", "county_fips": "222"}}]})
+
+        def post():
+            self.client.post(reverse('batch'),
+                             content_type='application/json', data=data)
+        post()
+        # Loading another state's data leaves the result cached
+        versions.bump(versions.CENSUS, ['12'])
+        post()
+        self.assertEqual(1, views.ENDPOINTS['other'].call_count)
+        versions.bump(versions.CENSUS, ['11'])
+        post()
+        self.assertEqual(2, views.ENDPOINTS['other'].call_count)
+
+
+class CoalesceTest(TestCase):
+    """Tests batch.coalesce"""
+    def setUp(self):
+        coalesce.results_cache().clear()
+
+    def test_request_key(self):
+        self.assertEqual(coalesce.request_key('a', {'x': '1', 'y': '2'}),
+                         coalesce.request_key('a', {'y': '2', 'x': '1'}))
+        self.assertNotEqual(coalesce.request_key('a', {'x': '1'}),
+                            coalesce.request_key('b', {'x': '1'}))
+        self.assertNotEqual(coalesce.request_key('a', {'x': '1'}),
+                            coalesce.request_key('a', {'x': '2'}))
+
+    def test_coalesce_in_flight(self):
+        release, calls, results = threading.Event(), [], []
+
+        def fn(params):
+            calls.append(params)
+            release.wait()
+            return {'value': len(calls)}
+        coalescer = coalesce.Coalescer()
+        threads = [threading.Thread(target=lambda: results.append(
+            coalescer.call('key', fn, {}))) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        while not coalescer.in_flight:
+            time.sleep(0.01)
+        time.sleep(0.05)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(1, len(calls))
+        self.assertEqual([{'value': 1}]*4, results)
+        self.assertEqual({}, coalescer.in_flight)
+
+    def test_errors_not_cached(self):
+        fn = Mock(side_effect=ValueError)
+        self.assertRaises(ValueError, coalesce.cached_call, 'e', fn, {}, 'v')
+        response = HttpResponseNotFound('Oh noes')
+        fn = Mock(return_value=response)
+        self.assertEqual(response, coalesce.cached_call('e', fn, {}, 'v'))
+        self.assertEqual(response, coalesce.cached_call('e', fn, {}, 'v'))
+        self.assertEqual(2, fn.call_count)
+
+
+class VersionsTest(TestCase):
+    """Tests batch.versions"""
+    def setUp(self):
+        coalesce.results_cache().clear()
+
+    def test_bump(self):
+        il, wi = versions.versions('d', ['17']), versions.versions('d', ['55'])
+        any_state = versions.versions('d')
+        self.assertEqual(il, versions.versions('d', ['17']))
+
+        versions.bump('d', ['17'])
+        self.assertNotEqual(il, versions.versions('d', ['17']))
+        self.assertEqual(wi, versions.versions('d', ['55']))
+        self.assertNotEqual(any_state, versions.versions('d'))
+        self.assertEqual(versions.versions('other', ['17']),
+                         versions.versions('other', ['17']))
+
+        wi = versions.versions('d', ['55'])
+        versions.bump('d')      # nationwide
+        self.assertNotEqual(wi, versions.versions('d', ['55']))
+
+    def test_evicted(self):
+        """Versions are kept in the database; losing them from the cache
+        neither changes them nor takes them back to an earlier one"""
+        versions.bump('d', ['17'])
+        bumped = versions.versions('d', ['17'])
+        coalesce.results_cache().clear()
+        self.assertEqual(bumped, versions.versions('d', ['17']))
+
+        versions.bump('d', ['17'])
+        coalesce.results_cache().clear()
+        self.assertNotEqual(bumped, versions.versions('d', ['17']))
+        self.assertEqual(2, DataVersion.objects.get(
+            dataset='d', scope='17').version)
+
+    def test_stamp(self):
+        stamp = versions.stamp(versions.DATASETS, ['17'])
+        versions.bump(versions.GEO, ['17'])
+        self.assertNotEqual(stamp, versions.stamp(versions.DATASETS, ['17']))
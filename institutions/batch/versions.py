@@ -0,0 +1,82 @@
+"""Cached output (tiles, batch results, census columns) is keyed by the
+versions of the datasets it was computed from. Loaders bump the versions of
+the states whose data they changed (see bump()), so reloading one state only
+retires the output which covers that state; the rest of the cache stays
+warm.
+
+Each dataset has a version per state, plus a nationwide version, bumped when
+data outside any one state (or in every state) changes, and an "any"
+version, bumped by every load, for output which isn't confined to known
+states (e.g. metro areas and bounding boxes can cross state lines)."""
+import hashlib
+
+from django.db import transaction
+from django.db.models import F
+
+from batch.coalesce import results_cache
+from dataload.models import DataVersion
+
+
+GEO, CENSUS, HMDA = 'geo', 'census', 'hmda'
+DATASETS = (GEO, CENSUS, HMDA)
+NATIONWIDE, ANY = 'us', 'any'
+#   Versions are stored in the database (dataload.DataVersion) and each
+#   process re-reads them at least this often. bump() clears them from the
+#   results cache, so where that is shared new versions are seen right away
+VERSION_TIMEOUT = 60
+
+
+def version_key(dataset, scope):
+    return 'version:%s:%s' % (dataset, scope)
+
+
+def bump(dataset, states=None):
+    """Called by data loaders after changing the given states' data, or, if
+    states is None, data which isn't limited to particular states"""
+    if states is None:
+        scopes = [NATIONWIDE]
+    else:
+        scopes = sorted(set(states))
+    with transaction.atomic():
+        for scope in [ANY] + scopes:
+            version, created = DataVersion.objects.get_or_create(
+                dataset=dataset, scope=scope, defaults={'version': 1})
+            if not created:
+                DataVersion.objects.filter(pk=version.pk).update(
+                    version=F('version') + 1)
+    results_cache().delete_many(
+        [version_key(dataset, scope) for scope in [ANY] + scopes])
+
+
+def versions(dataset, states=None):
+    """The dataset's version, as a string, for output computed from the
+    given states' data, or, if states is None, from any of its data"""
+    if states is None:
+        scopes = [ANY]
+    else:
+        scopes = [NATIONWIDE] + sorted(set(states))
+    keys = dict((version_key(dataset, scope), scope) for scope in scopes)
+    cache = results_cache()
+    found = cache.get_many(keys.keys())
+    missing = [keys[key] for key in keys if key not in found]
+    if missing:
+        stored = dict(DataVersion.objects.filter(
+            dataset=dataset, scope__in=missing
+        ).values_list('scope', 'version'))
+        fetched = dict((version_key(dataset, scope), stored.get(scope, 0))
+                       for scope in missing)
+        cache.set_many(fetched, timeout=VERSION_TIMEOUT)
+        found.update(fetched)
+    return '.'.join(str(found[version_key(dataset, scope)])
+                    for scope in scopes)
+
+
+def stamp(datasets, states=None):
+    """Versions of several datasets, for use in a cache key"""
+    return '-'.join(versions(dataset, states) for dataset in datasets)
+
+
+def etag(*parts):
+    """An ETag for output which is determined by the parts (versions,
+    request params, etc.), so that it can be checked without rendering"""
+    return hashlib.md5(':'.join(str(part) for part in parts)).hexdigest()
@@ -1,11 +1,20 @@
 import json
+from multiprocessing import TimeoutError
+from multiprocessing.pool import ThreadPool
+import threading
+import time
 
+from django.conf import settings
+from django.db import connection
 from django.http import HttpResponse, HttpResponseBadRequest
 from django.views.decorators.csrf import csrf_exempt
 import jsonschema
 
-from censusdata.views import race_summary
-from hmda.views import loan_originations
+from batch import versions
+from batch.coalesce import cached_call
+from censusdata.views import race_summary, RACE_SUMMARY_DATASETS
+from geo.filters import area_states
+from hmda.views import loan_originations, LOAN_ORIGINATIONS_DATASETS
 
 
 #   JSON Schema for batch request -- used to validate input
@@ -41,27 +50,86 @@ ENDPOINTS = {
     'loanVolume': loan_originations
 }
 
+#   The data each endpoint's results are computed from; results are cached
+#   until one of these changes for the requested area
+ENDPOINT_DATASETS = {
+    'minority': RACE_SUMMARY_DATASETS,
+    'loanVolume': LOAN_ORIGINATIONS_DATASETS,
+}
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def pool():
+    """Thread pool shared by all batch requests, so that the number of
+    concurrent sub-requests (and hence database connections) is bounded by
+    BATCH_WORKERS"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPool(settings.BATCH_WORKERS)
+    return _pool
+
+
+def endpoint_version(endpoint, params):
+    """Versions of the data the endpoint's response to params depends on.
+    Read once per batch, in the request's thread, so that all of its
+    sub-requests see the same versions"""
+    return versions.stamp(ENDPOINT_DATASETS.get(endpoint, versions.DATASETS),
+                          area_states(params))
+
+
+def run_endpoint(endpoint, fn, params, version, deadline, cancelled):
+    """Runs in a pool thread. Sub-requests which only get a thread once
+    their batch has timed out (or failed) raise TimeoutError rather than
+    run, so that one slow batch doesn't hold up the rest. Django's
+    connections are per-thread, so close this thread's connection rather
+    than leave it idling between tasks"""
+    if cancelled.is_set() or time.time() >= deadline:
+        raise TimeoutError("batch expired before %s started" % endpoint)
+    try:
+        return cached_call(endpoint, fn, params, version)
+    finally:
+        connection.close()
+
 
 @csrf_exempt
 def batch(request):
     """This endpoint allows multiple statistical queries to be made in a
-    single HTTP request"""
+    single HTTP request. Sub-requests run concurrently; each must finish
+    within BATCH_TIMEOUT seconds of the batch arriving, else the whole
+    request fails with a 504 and its unstarted sub-requests are dropped"""
     try:
         body = json.loads(request.body)
         jsonschema.validate(body, BATCH_SCHEMA)
+        calls = [(entry['endpoint'], ENDPOINTS[entry['endpoint']],
+                  entry.get('params', {}))
+                 for entry in body['requests']]
+        calls = [call + (endpoint_version(call[0], call[2]),)
+                 for call in calls]
+        deadline = time.time() + settings.BATCH_TIMEOUT
+        cancelled = threading.Event()
+        pending = [pool().apply_async(run_endpoint,
+                                      call + (deadline, cancelled))
+                   for call in calls]
         responses = []
-        #   @todo: these should be parallelized
-        for request in body['requests']:
-            fn = ENDPOINTS[request['endpoint']]
-            response = fn(request.get('params', {}))
-            if isinstance(response, dict):
-                responses.append(response)
-            else:
-                return response     # whole request errors
+        try:
+            for result in pending:      # in request order
+                response = result.get(max(deadline - time.time(), 0))
+                if isinstance(response, dict):
+                    responses.append(response)
+                else:
+                    return response     # whole request errors
+        finally:
+            cancelled.set()     # skip whatever hasn't started
         return HttpResponse(json.dumps({'responses': responses}),
                             content_type='application/json')
     except KeyError:
         return HttpResponseBadRequest("invalid endpoint")
+    except TimeoutError:
+        return HttpResponse("batch timed out", status=504)
     except ValueError:
         return HttpResponseBadRequest("invalid format")
     except jsonschema.ValidationError:
@@ -0,0 +1,109 @@
+"""An in-process cache of census tables, held as NumPy columns per county (or
+metro area). Statistics requests can then bin and extract fields with array
+operations rather than instantiating a model per census tract. Areas are
+cached under the version of the census data (and shapes) they were loaded
+from (see batch.versions), and only the most recently used are kept."""
+from collections import OrderedDict
+import threading
+
+from django.db import models
+import numpy as np
+
+from batch import versions
+from censusdata.models import (
+    Census2010Age, Census2010HispanicOrigin, Census2010Households,
+    Census2010Race, Census2010RaceStats, Census2010Sex)
+from geo.filters import area_states, tract_filters
+
+
+class TractColumns(object):
+    """One area's rows. geoids[i] is the census tract of row i in each
+    column"""
+    def __init__(self, geoids, columns):
+        self.geoids = geoids
+        self.columns = columns
+
+    def __len__(self):
+        return len(self.geoids)
+
+
+class ColumnarTable(object):
+    #   Areas kept per table, least recently used dropped first
+    MAX_AREAS = 256
+
+    def __init__(self, model):
+        self.model = model
+        self.fields = [field.name for field in model._meta.fields
+                       if not field.primary_key]
+        self.dtypes = dict(
+            (field.name, np.float64 if isinstance(field, models.FloatField)
+             else np.int64)
+            for field in model._meta.fields if not field.primary_key)
+        self.lock = threading.Lock()
+        self.areas = OrderedDict()      # (key, version) -> columns
+
+    def load(self, filters):
+        """One query, returning tuples rather than model instances"""
+        rows = list(self.model.objects.filter(**filters).order_by(
+            'geoid').values_list('geoid', *self.fields))
+        geoids = np.array([row[0] for row in rows], dtype=object)
+        columns = {}
+        for idx, field in enumerate(self.fields, start=1):
+            columns[field] = np.fromiter((row[idx] for row in rows),
+                                         dtype=self.dtypes[field],
+                                         count=len(rows))
+        return TractColumns(geoids, columns)
+
+    def select(self, key, filters, version=None):
+        """Columns for the rows matching filters, cached under key (unless
+        key is None) and the data's version"""
+        if key is None:
+            return self.load(filters)
+        key = (key, version)
+        with self.lock:
+            cached = self.areas.pop(key, None)
+            if cached is not None:
+                self.areas[key] = cached    # now the most recently used
+        if cached is None:
+            cached = self.load(filters)
+            with self.lock:
+                self.areas[key] = cached
+                while len(self.areas) > self.MAX_AREAS:
+                    self.areas.popitem(last=False)
+        return cached
+
+    def clear(self):
+        with self.lock:
+            self.areas = OrderedDict()
+
+
+TABLES = dict((model, ColumnarTable(model)) for model in (
+    Census2010Age, Census2010HispanicOrigin, Census2010Households,
+    Census2010Race, Census2010RaceStats, Census2010Sex))
+
+
+def area_columns(model, params):
+    """Columns for the area described by request params (see geo.filters).
+    Counties and metro areas are cached; bounding boxes are not. Returns
+    None if the params don't describe an area"""
+    filters = tract_filters(params)
+    if filters is None:
+        return None
+    if params.get('state_fips') and params.get('county_fips'):
+        key = ('county', params['state_fips'], params['county_fips'])
+    elif params.get('cbsa'):
+        key = ('cbsa', params['cbsa'])
+    else:
+        return TABLES[model].select(None, filters)
+    version = versions.stamp((versions.GEO, versions.CENSUS),
+                             area_states(params))
+    return TABLES[model].select(key, filters, version)
+
+
+def records(geoids, fields):
+    """Assemble {geoid: {field: value}} from parallel lists of values, one
+    list per field name in `fields`"""
+    names = list(fields)
+    rows = zip(*[fields[name] for name in names]) if names else (
+        [()] * len(geoids))
+    return dict(zip(geoids, (dict(zip(names, row)) for row in rows)))
@@ -1,28 +1,98 @@
-from csv import reader
+from multiprocessing import Pool
+from operator import itemgetter
+from optparse import make_option
+import os
 
 from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
 
+from batch import versions
 from censusdata.models import (
     Census2010Age, Census2010HispanicOrigin, Census2010Households,
     Census2010Race, Census2010RaceStats, Census2010Sex)
+from dataload.manifest import Source
+from dataload.models import StateLoad
+from dataload.parallel import init_worker
+from dataload.pgcopy import CopyWriter
 from geo import errors
 
 
+DATASET, YEAR = 'sf1', 2010
+MODELS = (Census2010Age, Census2010HispanicOrigin, Census2010Households,
+          Census2010Race, Census2010RaceStats, Census2010Sex)
+SEGMENTS = ('000032010.sf1', '000042010.sf1', '000052010.sf1')
+
+
+def data_fields(model):
+    """Names of a census model's fields, in order, with the geoid first"""
+    return ['geoid'] + [field.name for field in model._meta.fields
+                        if not field.primary_key]
+
+
+def tract_rows(filename, geoids_by_record, indices):
+    """A generator of (geoid, values) for each census tract row in a segment
+    file, where values are the integer values of the columns at `indices`.
+    Rows for other geographies are skipped before being fully split"""
+    project = itemgetter(*indices)
+    with open(filename, 'r') as datafile:
+        for line in datafile:
+            recordnum = line.split(',', 5)[4]
+            if recordnum in geoids_by_record:
+                values = project(line.rstrip('\r\n').split(','))
+                yield geoids_by_record[recordnum], map(int, values)
+
+
+def load_state(geofile_name):
+    """Load one state's files. Runs in a worker process"""
+    return Command().load_state(geofile_name)
+
+
 class Command(BaseCommand):
     """Loads Summary File 1 data from the decennial census. Official
     documentation for fields at
     http://www.census.gov/prod/cen2010/doc/sf1.pdf"""
-    args = "<path/to/XXgeo2010.sf1>"
+    args = "<path/to/XXgeo2010.sf1> [path/to/YYgeo2010.sf1 ...]"
     help = """
-        Load Decennial Census data for a state.
+        Load Decennial Census data for one or more states.
         Assumes XX#####2010.sf1 files are in the same directory."""
 
+    option_list = BaseCommand.option_list + (
+        make_option('--processes', type='int', default=1,
+                    help='Number of states to load at once'),
+    )
+
     def handle(self, *args, **options):
         if not args:
             raise CommandError("Needs a first argument, "
                                + "path/to/XXgeo2010.sf1")
+        processes = min(options.get('processes') or 1, len(args))
+        loaded = set()
+        if processes > 1:
+            connection.close()      # don't hand the connection to workers
+            pool = Pool(processes, init_worker)
+            try:
+                for state, changed in pool.imap_unordered(load_state, args):
+                    self.stdout.write("Loaded state %s" % state)
+                    if changed:
+                        loaded.add(state)
+            finally:
+                pool.terminate()
+        else:
+            for geofile_name in args:
+                state, changed = self.load_state(geofile_name)
+                if changed:
+                    loaded.add(state)
+        if loaded:
+            versions.bump(versions.CENSUS, loaded)
+
+    def load_state(self, geofile_name):
+        """Load all of the census tables for one state, in one transaction,
+        so that a failure doesn't leave a state partially loaded. If the
+        state's files have changed since it was last loaded, its old data is
+        replaced; if they haven't, nothing is done. Returns the state and
+        whether it was (re)loaded"""
         geoids_by_record = {}
-        geofile = open(args[0], 'r')
+        geofile = open(geofile_name, 'r')
         # As each file covers one state, all geos will have the same state id
         state = ""
         for line in geofile:
@@ -34,117 +104,78 @@ class Command(BaseCommand):
                     geoids_by_record[recordnum] = censustract
                 state = line[27:29]
         geofile.close()
-        self.handle_filethree(args[0], state, geoids_by_record)
-        self.handle_filefour(args[0], state, geoids_by_record)
-        self.handle_filefive(args[0], state, geoids_by_record)
+        if not geoids_by_record:
+            return state, False     # no census tracts to load
+
+        paths = [geofile_name] + [geofile_name[:-11] + segment
+                                  for segment in SEGMENTS]
+        source = Source.from_files(*filter(os.path.exists, paths))
+        if StateLoad.is_current(DATASET, YEAR, state, source):
+            return state, False
+        with transaction.atomic():
+            for model in MODELS:
+                model.objects.filter(geoid__state=state).delete()
+            self.handle_filethree(geofile_name, state, geoids_by_record)
+            self.handle_filefour(geofile_name, state, geoids_by_record)
+            self.handle_filefive(geofile_name, state, geoids_by_record)
+            StateLoad.mark_completed(DATASET, YEAR, state,
+                                     len(geoids_by_record), source)
+        return state, True
 
     def handle_filethree(self, geofile_name, state, geoids_by_record):
         """File three (XX000032010.sf1) contains race and ethnicity summaries.
         Documentation starts at page 6-22."""
         file3_name = geofile_name[:-11] + "000032010.sf1"
-        datafile = open(file3_name, 'r')
-        state = geoids_by_record.values()[0][:2]
-        race, hispanic, stats = [], [], []
-        skip_race = Census2010Race.objects.filter(
-            geoid__state=state).exists()
-        skip_hisp = Census2010HispanicOrigin.objects.filter(
-            geoid__state=state).exists()
-        skip_stats = Census2010RaceStats.objects.filter(
-            geoid__state=state).exists()
-
-        if not skip_race or not skip_hisp or not skip_stats:
-            for row in reader(datafile):
-                recordnum = row[4]
-                if recordnum in geoids_by_record:
-                    data = Census2010Race(
-                        total_pop=int(row[5]), white_alone=int(row[6]),
-                        black_alone=int(row[7]), amind_alone=int(row[8]),
-                        asian_alone=int(row[9]), pacis_alone=int(row[10]),
-                        other_alone=int(row[11]), two_or_more=int(row[12]))
-                    # Save geoid separately so we don't need to load the
-                    # Tracts
-                    data.geoid_id = geoids_by_record[recordnum]
-                    race.append(data)
-
-                    data = Census2010HispanicOrigin(
-                        total_pop=int(row[13]), non_hispanic=int(row[14]),
-                        hispanic=int(row[15]))
-                    data.geoid_id = geoids_by_record[recordnum]
-                    hispanic.append(data)
-
-                    data = Census2010RaceStats(
-                        total_pop=int(row[16]), hispanic=int(row[25]),
-                        non_hisp_white_only=int(row[18]),
-                        non_hisp_black_only=int(row[19]),
-                        non_hisp_asian_only=int(row[21]))
-                    data.geoid_id = geoids_by_record[recordnum]
-                    data.auto_fields()
-                    stats.append(data)
-        datafile.close()
-
-        if not skip_race:
-            Census2010Race.objects.bulk_create(race)
-        if not skip_hisp:
-            Census2010HispanicOrigin.objects.bulk_create(hispanic)
-        if not skip_stats:
-            Census2010RaceStats.objects.bulk_create(stats)
+        race = CopyWriter(Census2010Race, data_fields(Census2010Race))
+        hispanic = CopyWriter(Census2010HispanicOrigin,
+                              data_fields(Census2010HispanicOrigin))
+        stats = CopyWriter(Census2010RaceStats,
+                           data_fields(Census2010RaceStats))
+
+        percent = Census2010RaceStats.percent
+        # race: 5-12, hispanic: 13-15, stats: 16, 25, 18, 19, 21
+        indices = range(5, 17) + [25, 18, 19, 21]
+        for geoid, values in tract_rows(file3_name, geoids_by_record,
+                                        indices):
+            race.write([geoid] + values[:8])
+            hispanic.write([geoid] + values[8:11])
+            total, counts = values[11], values[12:]
+            stats.write([geoid, total] + counts
+                        + [percent(count, total) for count in counts])
+
+        for writer in (race, hispanic, stats):
+            writer.flush()
 
     def handle_filefour(self, geofile_name, state, geoids_by_record):
         """File four (XX000042010.sf1) contains age demographics and
         correlations with race, ethnicity, and sex. Documentation starts at
         page 6-30"""
         file4_name = geofile_name[:-11] + "000042010.sf1"
-        datafile = open(file4_name, 'r')
-        sex, age = [], []
-        skip_sex = Census2010Sex.objects.filter(geoid__state=state).exists()
-        skip_age = Census2010Age.objects.filter(geoid__state=state).exists()
-        if not skip_sex or not skip_age:
-            for row in reader(datafile):
-                recordnum = row[4]
-                if recordnum in geoids_by_record:
-                    data = Census2010Sex(
-                        total_pop=int(row[149]), male=int(row[150]),
-                        female=int(row[174]))
-                    # Save geoid separately so we don't need to load the Tracts
-                    data.geoid_id = geoids_by_record[recordnum]
-                    sex.append(data)
-
-                    fields = [None]     # Ignore geoid until later
-                    fields.append(int(row[149]))    # total_pop
-                    # age groups are calculated by adding male to female values
-                    fields.extend(map(
-                        lambda i: int(row[i + 151]) + int(row[i + 175]),
-                        range(23)))
-                    data = Census2010Age(*fields)
-                    data.geoid_id = geoids_by_record[recordnum]
-                    age.append(data)
-        datafile.close()
-
-        if not skip_sex:
-            Census2010Sex.objects.bulk_create(sex)
-        if not skip_age:
-            Census2010Age.objects.bulk_create(age)
+        sex = CopyWriter(Census2010Sex, data_fields(Census2010Sex))
+        age = CopyWriter(Census2010Age, data_fields(Census2010Age))
+
+        # total, male, female, then 23 male and 23 female age groups
+        indices = [149, 150, 174] + range(151, 174) + range(175, 198)
+        for geoid, values in tract_rows(file4_name, geoids_by_record,
+                                        indices):
+            sex.write([geoid] + values[:3])
+            # age groups are calculated by adding male to female values
+            age.write([geoid, values[0]]
+                      + [male + female for male, female
+                         in zip(values[3:26], values[26:49])])
+
+        for writer in (sex, age):
+            writer.flush()
 
     def handle_filefive(self, geofile_name, state, geoids_by_record):
         """File five (XX000052010.sf1) contains household metrics, including
         divisions by household type, household size, etc. Documentation starts
         at page 6-38"""
-        file4_name = geofile_name[:-11] + "000052010.sf1"
-        datafile = open(file4_name, 'r')
-        households = []
-        skip_households = Census2010Households.objects.filter(
-            geoid__state=state).exists()
-        if not skip_households:
-            for row in reader(datafile):
-                recordnum = row[4]
-                if recordnum in geoids_by_record:
-                    fields = [None]     # Ignore geoid until later
-                    # fields match the values in the census
-                    fields.extend(int(row[idx]) for idx in range(28, 37))
-                    data = Census2010Households(*fields)
-                    data.geoid_id = geoids_by_record[recordnum]
-                    households.append(data)
-        datafile.close()
-
-        if not skip_households:
-            Census2010Households.objects.bulk_create(households)
+        file5_name = geofile_name[:-11] + "000052010.sf1"
+        households = CopyWriter(Census2010Households,
+                                data_fields(Census2010Households))
+        # fields match the values in the census
+        for geoid, values in tract_rows(file5_name, geoids_by_record,
+                                        range(28, 37)):
+            households.write([geoid] + values)
+        households.flush()
@@ -84,20 +84,21 @@ class Census2010RaceStats(models.Model):
     non_hisp_black_only_perc = models.FloatField()
     non_hisp_asian_only_perc = models.FloatField()
 
+    @staticmethod
+    def percent(count, total_pop):
+        """Fraction of the population, or 1.00 if there's no population"""
+        if total_pop:
+            return 1.0 * count / total_pop
+        return 1.00
+
     def auto_fields(self):
-        if self.total_pop:
-            self.hispanic_perc = 1.0 * self.hispanic / self.total_pop
-            self.non_hisp_white_only_perc = (1.0 * self.non_hisp_white_only
-                                             / self.total_pop)
-            self.non_hisp_black_only_perc = (1.0 * self.non_hisp_black_only
-                                             / self.total_pop)
-            self.non_hisp_asian_only_perc = (1.0 * self.non_hisp_asian_only
-                                             / self.total_pop)
-        else:
-            self.hispanic_perc = 1.00
-            self.non_hisp_white_only_perc = 1.00
-            self.non_hisp_black_only_perc = 1.00
-            self.non_hisp_asian_only_perc = 1.00
+        self.hispanic_perc = self.percent(self.hispanic, self.total_pop)
+        self.non_hisp_white_only_perc = self.percent(
+            self.non_hisp_white_only, self.total_pop)
+        self.non_hisp_black_only_perc = self.percent(
+            self.non_hisp_black_only, self.total_pop)
+        self.non_hisp_asian_only_perc = self.percent(
+            self.non_hisp_asian_only, self.total_pop)
 
     def save(self, *args, **kwargs):
         self.auto_fields()
@@ -36,6 +36,24 @@ class LoadSummaryDataTest(TestCase):
         self.assertEqual(positional_args[2]['0007159'], '11001000100')
         self.assertEqual(positional_args[2]['0007211'], '11001000902')
 
+    @patch.object(Command, 'handle_filefive')
+    @patch.object(Command, 'handle_filefour')
+    @patch.object(Command, 'handle_filethree')
+    def test_handle_many(self, hf3, hf4, hf5):
+        for prefix in ('YY', 'ZZ'):
+            shutil.copyfile(
+                os.path.join("censusdata", "tests", "mock_geo.txt"),
+                os.path.join(self.tempdir, prefix + "geo2010.sf1"))
+
+        command = Command()
+        command.handle(os.path.join(self.tempdir, 'YYgeo2010.sf1'),
+                       os.path.join(self.tempdir, 'ZZgeo2010.sf1'),
+                       processes=1)
+        self.assertEqual(
+            [os.path.join(self.tempdir, prefix + "geo2010.sf1")
+             for prefix in ('YY', 'ZZ')],
+            [call[0][0] for call in hf5.call_args_list])
+
     @patch('censusdata.management.commands.load_summary_one.errors')
     @patch.object(Command, 'handle_filefive')
     @patch.object(Command, 'handle_filefour')
@@ -80,25 +98,26 @@ class LoadSummaryDataTest(TestCase):
 
         self.assertEqual(len(models.Census2010RaceStats.objects.all()), 0)
 
-    def test_handle_filethree_no_delete(self):
-        shutil.copyfile(os.path.join("censusdata", "tests", "mock_file3.txt"),
-                        os.path.join(self.tempdir, "ZZ000032010.sf1"))
+    @patch.object(Command, 'handle_filefive')
+    @patch.object(Command, 'handle_filefour')
+    @patch.object(Command, 'handle_filethree')
+    def test_handle_unchanged(self, hf3, hf4, hf5):
+        shutil.copyfile(os.path.join("censusdata", "tests", "mock_geo.txt"),
+                        os.path.join(self.tempdir, "ZZgeo2010.sf1"))
         command = Command()
-        command.handle_filethree(os.path.join(self.tempdir, "ZZgeo2010.sf1"),
-                                 '11',  # State
-                                 {'0007159': '11001000100',
-                                  '0007211': '11001000902'})
-        self.assertEqual(len(models.Census2010RaceStats.objects.all()), 2)
-        models.Census2010RaceStats.objects.all()[0].delete()
-        self.assertEqual(len(models.Census2010RaceStats.objects.all()), 1)
+        command.handle(os.path.join(self.tempdir, 'ZZgeo2010.sf1'))
+        self.assertEqual(1, hf3.call_count)
+        # The load manifest says these files are already loaded
+        command.handle(os.path.join(self.tempdir, 'ZZgeo2010.sf1'))
+        self.assertEqual(1, hf3.call_count)
 
-        # Importing again should do nothing
-        command.handle_filethree(os.path.join(self.tempdir, "ZZgeo2010.sf1"),
-                                 '11',  # State
-                                 {'0007159': '11001000100',
-                                  '0007211': '11001000902'})
-        self.assertEqual(len(models.Census2010RaceStats.objects.all()), 1)
-        models.Census2010RaceStats.objects.all().delete()
+    @patch.object(Command, 'handle_filethree')
+    def test_handle_no_tracts(self, hf3):
+        with open(os.path.join(self.tempdir, "ZZgeo2010.sf1"), 'w') as f:
+            f.write('')
+        command = Command()
+        command.handle(os.path.join(self.tempdir, 'ZZgeo2010.sf1'))
+        self.assertFalse(hf3.called)
 
     def test_handle_filefive(self):
         shutil.copyfile(os.path.join("censusdata", "tests", "mock_file5.txt"),
@@ -2,15 +2,24 @@ import json
 
 from django.core.urlresolvers import reverse
 from django.test import TestCase
+from mock import patch
 
+from batch import versions
+from batch.coalesce import results_cache
+from censusdata.columnar import (
+    area_columns, ColumnarTable, records, TABLES)
 from censusdata.models import Census2010RaceStats
 from censusdata import views
+from geo.models import Geo
 
 
 class ViewsTest(TestCase):
     fixtures = ['dummy_tracts']
 
     def setUp(self):
+        results_cache().clear()
+        for table in TABLES.values():
+            table.clear()
         stats = Census2010RaceStats(
             total_pop=10, hispanic=1, non_hisp_white_only=2,
             non_hisp_black_only=4, non_hisp_asian_only=5)
@@ -71,6 +80,28 @@ class ViewsTest(TestCase):
         self.assertEqual(resp['1122233400']['non_hisp_black_only_perc'], .25)
         self.assertEqual(resp['1122233400']['non_hisp_asian_only_perc'], .2)
 
+    def test_race_summary_cbsa(self):
+        Geo.objects.filter(geoid__in=['1122233300', '1222233300']).update(
+            cbsa='10000')
+        resp = self.client.get(reverse('censusdata:race_summary'),
+                               {'cbsa': '10000'})
+        resp = json.loads(resp.content)
+        self.assertEqual(sorted(resp.keys()), ['1122233300', '1222233300'])
+        self.assertEqual(resp['1222233300']['total_pop'], 100)
+
+    def test_race_summary_bbox(self):
+        Geo.objects.filter(geoid='1122333300').update(
+            geom='MULTIPOLYGON (((10 10, 10 11, 11 11, 10 10)))')
+        resp = self.client.get(reverse('censusdata:race_summary'),
+                               {'bbox': '9.5,9.5,12,12'})
+        resp = json.loads(resp.content)
+        self.assertEqual(resp.keys(), ['1122333300'])
+        self.assertEqual(resp['1122333300']['total_pop'], 100)
+
+        resp = self.client.get(reverse('censusdata:race_summary'),
+                               {'bbox': '1,2,3'})
+        self.assertEqual(400, resp.status_code)
+
     def test_split_binned_and_raw_fields(self):
 
         requested_fields = [
@@ -91,22 +122,6 @@ class ViewsTest(TestCase):
 
         self.assertEqual(bins_result, bins)
 
-    def test_collect_field_values(self):
-        bins = {
-            'non_hisp_asian_only_perc': {
-                'values': [], 'bins': [0, 0.5, 0.8, 1.01]}}
-
-        tract_data = Census2010RaceStats.objects.all()
-        bins, statsids = views.collect_field_values(tract_data, bins)
-
-        self.assertEqual(
-            ['1122233300', '1122233400', '1122333300', '1222233300'],
-            statsids)
-
-        self.assertEqual(
-            [0.5, 0.2, 0.04, 0.07],
-            bins['non_hisp_asian_only_perc']['values'])
-
     def test_find_bin_indices(self):
         field = {
             'bins': [0.5, 0.75, 1.0],
@@ -116,14 +131,75 @@ class ViewsTest(TestCase):
         indices = views.find_bin_indices(field)
         self.assertEqual([1, 1, 2, 2], list(indices))
 
-    def test_find_all_bin_indices(self):
-        bins = {
-            'non_hisp_asian_only_perc': {
-                'values': [0.5, 0.6, 0.8, 0.95], 'bins': [0.5, 0.75, 1.0]}}
+    def test_process_statistics(self):
+        statreq = {
+            'state_fips': '11', 'county_fips': '222',
+            'fields': [
+                {'name': 'non_hisp_asian_only_perc', 'type': 'binned',
+                 'bins': [0, 0.3, 1.01]},
+                {'name': 'total_pop', 'type': 'raw'},
+                {'name': 'geoid', 'type': 'raw'},
+                {'name': 'not_a_field', 'type': 'raw'}]}
+        data = views.process_statistics(statreq)
+        self.assertEqual(statreq, data['fields'])
+        self.assertEqual({
+            '1122233300': {'non_hisp_asian_only_perc_bin': 2,
+                           'total_pop': 10},
+            '1122233400': {'non_hisp_asian_only_perc_bin': 1,
+                           'total_pop': 20}}, data['data'])
+        # Plain python types, so it's serializable
+        json.dumps(data)
+
+        statreq['county_fips'] = '999'
+        self.assertEqual({}, views.process_statistics(statreq)['data'])
+
+
+class ColumnarTest(TestCase):
+    fixtures = ['dummy_tracts']
+
+    def setUp(self):
+        results_cache().clear()
+        TABLES[Census2010RaceStats].clear()
 
-        statsids = [4, 2, 3, 1]
+    def tearDown(self):
+        Census2010RaceStats.objects.all().delete()
 
-        bins_results = views.find_all_bin_indices(bins, statsids)
-        self.assertEqual(
-            {1: 2, 2: 1, 3: 2, 4: 1},
-            bins_results['non_hisp_asian_only_perc']['bin_indices'])
+    def test_area_columns(self):
+        for geoid, total in (('1122233400', 20), ('1122233300', 10),
+                             ('1222233300', 5)):
+            stats = Census2010RaceStats(
+                total_pop=total, hispanic=1, non_hisp_white_only=2,
+                non_hisp_black_only=1, non_hisp_asian_only=1)
+            stats.geoid_id = geoid
+            stats.save()
+
+        params = {'state_fips': '11', 'county_fips': '222'}
+        county = area_columns(Census2010RaceStats, params)
+        self.assertEqual(2, len(county))
+        self.assertEqual(['1122233300', '1122233400'], list(county.geoids))
+        self.assertEqual([10, 20], list(county.columns['total_pop']))
+        self.assertEqual([.1, .05], list(county.columns['hispanic_perc']))
+
+        # Cached until data is loaded
+        Census2010RaceStats.objects.filter(geoid='1122233300').delete()
+        county = area_columns(Census2010RaceStats, params)
+        self.assertEqual(2, len(county))
+        versions.bump(versions.CENSUS, ['11'])
+        county = area_columns(Census2010RaceStats, params)
+        self.assertEqual(['1122233400'], list(county.geoids))
+        # Only under the current version
+        self.assertEqual(1, len(TABLES[Census2010RaceStats].areas))
+
+    @patch.object(ColumnarTable, 'MAX_AREAS', 2)
+    def test_max_areas(self):
+        table = TABLES[Census2010RaceStats]
+        for county_fips in ('111', '222', '111', '333'):
+            area_columns(Census2010RaceStats, {'state_fips': '11',
+                                               'county_fips': county_fips})
+        self.assertEqual(['111', '333'],
+                         [key[0][2] for key in table.areas])
+
+    def test_records(self):
+        self.assertEqual({'a': {'x': 1, 'y': 3}, 'b': {'x': 2, 'y': 4}},
+                         records(['a', 'b'], {'x': [1, 2], 'y': [3, 4]}))
+        self.assertEqual({'a': {}, 'b': {}}, records(['a', 'b'], {}))
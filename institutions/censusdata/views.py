@@ -2,46 +2,46 @@ import json
 
 from django.http import HttpResponse, HttpResponseBadRequest
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
 import numpy as np
 
 from .models import Census2010RaceStats
-from batch.conversions import use_GET_in
+from batch import versions
+from batch.conversions import cached_GET_in, versioned_etag
+from censusdata.columnar import area_columns, records
+from geo.filters import AREA_PARAMS
 
 
-def race_by_county(county_fips, state_fips):
-    """ Get race summary statistics by county (specified by FIPS codes). """
-
-    tract_data = Census2010RaceStats.objects.filter(
-        geoid__state=state_fips, geoid__county=county_fips)
-    return tract_data
+#   The data race_summary's results are computed from
+RACE_SUMMARY_DATASETS = (versions.GEO, versions.CENSUS)
+#   Fields included in race_summary
+RACE_SUMMARY_FIELDS = (
+    'total_pop', 'hispanic', 'non_hisp_white_only', 'non_hisp_black_only',
+    'non_hisp_asian_only', 'hispanic_perc', 'non_hisp_white_only_perc',
+    'non_hisp_black_only_perc', 'non_hisp_asian_only_perc')
 
 
 def race_summary(request_dict):
-    """Race summary statistics"""
-    county_fips = request_dict.get('county_fips', '')
-    state_fips = request_dict.get('state_fips', '')
-
-    if county_fips and state_fips:
-        data = {}
-        for stats in race_by_county(county_fips, state_fips):
-            data[stats.geoid_id] = {
-                'total_pop': stats.total_pop,
-                'hispanic': stats.hispanic,
-                'non_hisp_white_only': stats.non_hisp_white_only,
-                'non_hisp_black_only': stats.non_hisp_black_only,
-                'non_hisp_asian_only': stats.non_hisp_asian_only,
-                'hispanic_perc': stats.hispanic_perc,
-                'non_hisp_white_only_perc': stats.non_hisp_white_only_perc,
-                'non_hisp_black_only_perc': stats.non_hisp_black_only_perc,
-                'non_hisp_asian_only_perc': stats.non_hisp_asian_only_perc
-            }
-        return data
+    """Race summary statistics, for each tract in a county, metro area or
+    bounding box"""
+    try:
+        area = area_columns(Census2010RaceStats, request_dict)
+    except ValueError:
+        return HttpResponseBadRequest("Invalid bbox")
+    if area is not None:
+        return records(area.geoids.tolist(), dict(
+            (field, area.columns[field].tolist())
+            for field in RACE_SUMMARY_FIELDS))
     else:
-        return HttpResponseBadRequest("Missing one of state_fips, county_fips")
+        return HttpResponseBadRequest("Missing " + AREA_PARAMS)
 
 
+@cache_control(max_age=0, must_revalidate=True)
+@condition(etag_func=versioned_etag('minority', RACE_SUMMARY_DATASETS))
 def race_summary_http(request):
-    return use_GET_in(race_summary, request)
+    return cached_GET_in('minority', race_summary, request,
+                         RACE_SUMMARY_DATASETS)
 
 
 def find_bin_indices(field):
@@ -57,9 +57,11 @@ def find_bin_indices(field):
 def split_binned_and_raw_fields(requested_fields):
     """ When we get a specification for the fields that are requested
     (requested_fields), split out the ones that need to be binned, and
-    pre-process them a bit. """
+    pre-process them a bit. Only data fields can be requested; each
+    record is already keyed by its geoid. """
 
-    model_fields = [f.name for f in Census2010RaceStats._meta.fields]
+    model_fields = [f.name for f in Census2010RaceStats._meta.fields
+                    if not f.primary_key]
 
     bins = {}
     raw_fields = []
@@ -72,53 +74,24 @@ def split_binned_and_raw_fields(requested_fields):
     return (bins, raw_fields)
 
 
-def collect_field_values(tract_data, bins):
-    """ For a field that needs to be binned, iterate through the tracts
-    and create a single array of all the values. """
-
-    statsids = []
-    for stats in tract_data:
-        statsids.append(stats.geoid_id)
-
-        for field_name in bins:
-            bins[field_name]['values'].append(getattr(stats, field_name))
-    return bins, statsids
-
-
-def find_all_bin_indices(bins, statsids):
-    """ For all fields that need to be binned, bin the values. """
-
-    for field, vbin in bins.items():
-        vbin['bin_indices'] = dict(zip(statsids, find_bin_indices(vbin)))
-    return bins
-
-
 def process_statistics(statreq):
-    """ Process the request for statistics."""
-    state_fips = statreq['state_fips']
-    county_fips = statreq['county_fips']
-
-    if county_fips and state_fips:
-        tract_data = race_by_county(county_fips, state_fips)
-
-        data = {'data': {}}
+    """ Process the request for statistics. The area may be a county, metro
+    area or bounding box (see geo.filters). Works on whole columns of the
+    area's census data at once (see censusdata.columnar)."""
+    area = area_columns(Census2010RaceStats, statreq)
 
+    if area is not None:
         bins, raw_fields = split_binned_and_raw_fields(statreq['fields'])
-        bins, statsids = collect_field_values(tract_data, bins)
-        bins = find_all_bin_indices(bins, statsids)
-
-        for stats in tract_data:
-            sdata = {}
-            for field in bins:
-                field_bin = '%s_bin' % field
-                sdata[field_bin] = bins[field]['bin_indices'][stats.geoid_id]
 
-            for field in raw_fields:
-                sdata[field] = getattr(stats, field)
+        fields = {}
+        for field, vbin in bins.items():
+            vbin['values'] = area.columns[field]
+            fields['%s_bin' % field] = find_bin_indices(vbin).tolist()
+        for field in raw_fields:
+            fields[field] = area.columns[field].tolist()
 
-            data['data'][stats.geoid_id] = sdata
-            data['fields'] = statreq
-        return data
+        return {'data': records(area.geoids.tolist(), fields),
+                'fields': statreq}
 
 
 @csrf_exempt
@@ -129,6 +102,9 @@ def statistics_retriever(request):
 
     if request.is_ajax():
         statistics_request = json.loads(request.body)
-        statistics = process_statistics(statistics_request)
+        try:
+            statistics = process_statistics(statistics_request)
+        except ValueError:
+            return HttpResponseBadRequest("Invalid bbox")
         return HttpResponse(
             json.dumps(statistics), content_type='application/json')
@@ -0,0 +1,20 @@
+"""Fingerprints of loader inputs, recorded in (and compared against) the
+StateLoad manifest"""
+from collections import namedtuple
+import hashlib
+import os
+
+
+class Source(namedtuple('Source', ['path', 'size', 'checksum'])):
+    @classmethod
+    def from_files(cls, *paths):
+        """Fingerprint one or more files. Every byte is read, so this isn't
+        free, but it is far cheaper than reloading"""
+        digest, size = hashlib.sha1(), 0
+        for path in paths:
+            size += os.path.getsize(path)
+            with open(path, 'rb') as source:
+                for block in iter(lambda: source.read(1024 * 1024), ''):
+                    digest.update(block)
+        return cls(','.join(os.path.basename(path) for path in paths), size,
+                   digest.hexdigest())
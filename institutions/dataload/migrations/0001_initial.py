@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+from south.utils import datetime_utils as datetime
+from south.db import db
+from south.v2 import SchemaMigration
+from django.db import models
+
+
+class Migration(SchemaMigration):
+
+    def forwards(self, orm):
+        # Adding model 'StateLoad'
+        db.create_table(u'dataload_stateload', (
+            (u'id', self.gf('django.db.models.fields.AutoField')(primary_key=True)),
+            ('dataset', self.gf('django.db.models.fields.CharField')(max_length=32)),
+            ('year', self.gf('django.db.models.fields.PositiveIntegerField')()),
+            ('state', self.gf('django.db.models.fields.CharField')(max_length=2)),
+            ('row_count', self.gf('django.db.models.fields.PositiveIntegerField')(default=0)),
+            ('completed', self.gf('django.db.models.fields.BooleanField')(default=False)),
+            ('updated', self.gf('django.db.models.fields.DateTimeField')(auto_now=True, blank=True)),
+        ))
+        db.send_create_signal(u'dataload', ['StateLoad'])
+
+        # Adding unique constraint on 'StateLoad', fields ['dataset', 'year', 'state']
+        db.create_unique(u'dataload_stateload', ['dataset', 'year', 'state'])
+
+
+    def backwards(self, orm):
+        # Removing unique constraint on 'StateLoad', fields ['dataset', 'year', 'state']
+        db.delete_unique(u'dataload_stateload', ['dataset', 'year', 'state'])
+
+        # Deleting model 'StateLoad'
+        db.delete_table(u'dataload_stateload')
+
+
+    models = {
+        u'dataload.stateload': {
+            'Meta': {'unique_together': "(('dataset', 'year', 'state'),)", 'object_name': 'StateLoad'},
+            'completed': ('django.db.models.fields.BooleanField', [], {'default': 'False'}),
+            'dataset': ('django.db.models.fields.CharField', [], {'max_length': '32'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'row_count': ('django.db.models.fields.PositiveIntegerField', [], {'default': '0'}),
+            'state': ('django.db.models.fields.CharField', [], {'max_length': '2'}),
+            'updated': ('django.db.models.fields.DateTimeField', [], {'auto_now': 'True', 'blank': 'True'}),
+            'year': ('django.db.models.fields.PositiveIntegerField', [], {})
+        }
+    }
+
+    complete_apps = ['dataload']
\ No newline at end of file
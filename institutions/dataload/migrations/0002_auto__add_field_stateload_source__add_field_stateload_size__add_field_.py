@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+from south.utils import datetime_utils as datetime
+from south.db import db
+from south.v2 import SchemaMigration
+from django.db import models
+
+
+class Migration(SchemaMigration):
+
+    def forwards(self, orm):
+        # Adding field 'StateLoad.source'
+        db.add_column(u'dataload_stateload', 'source',
+                      self.gf('django.db.models.fields.CharField')(default='', max_length=255, blank=True),
+                      keep_default=False)
+
+        # Adding field 'StateLoad.size'
+        db.add_column(u'dataload_stateload', 'size',
+                      self.gf('django.db.models.fields.BigIntegerField')(default=0),
+                      keep_default=False)
+
+        # Adding field 'StateLoad.checksum'
+        db.add_column(u'dataload_stateload', 'checksum',
+                      self.gf('django.db.models.fields.CharField')(default='', max_length=40, blank=True),
+                      keep_default=False)
+
+
+    def backwards(self, orm):
+        # Deleting field 'StateLoad.source'
+        db.delete_column(u'dataload_stateload', 'source')
+
+        # Deleting field 'StateLoad.size'
+        db.delete_column(u'dataload_stateload', 'size')
+
+        # Deleting field 'StateLoad.checksum'
+        db.delete_column(u'dataload_stateload', 'checksum')
+
+
+    models = {
+        u'dataload.stateload': {
+            'Meta': {'unique_together': "(('dataset', 'year', 'state'),)", 'object_name': 'StateLoad'},
+            'checksum': ('django.db.models.fields.CharField', [], {'max_length': '40', 'blank': 'True'}),
+            'completed': ('django.db.models.fields.BooleanField', [], {'default': 'False'}),
+            'dataset': ('django.db.models.fields.CharField', [], {'max_length': '32'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'row_count': ('django.db.models.fields.PositiveIntegerField', [], {'default': '0'}),
+            'size': ('django.db.models.fields.BigIntegerField', [], {'default': '0'}),
+            'source': ('django.db.models.fields.CharField', [], {'max_length': '255', 'blank': 'True'}),
+            'state': ('django.db.models.fields.CharField', [], {'max_length': '2', 'blank': 'True'}),
+            'updated': ('django.db.models.fields.DateTimeField', [], {'auto_now': 'True', 'blank': 'True'}),
+            'year': ('django.db.models.fields.PositiveIntegerField', [], {})
+        }
+    }
+
+    complete_apps = ['dataload']
\ No newline at end of file
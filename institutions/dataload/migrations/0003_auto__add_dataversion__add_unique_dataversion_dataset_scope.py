@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+from south.utils import datetime_utils as datetime
+from south.db import db
+from south.v2 import SchemaMigration
+from django.db import models
+
+
+class Migration(SchemaMigration):
+
+    def forwards(self, orm):
+        # Adding model 'DataVersion'
+        db.create_table(u'dataload_dataversion', (
+            (u'id', self.gf('django.db.models.fields.AutoField')(primary_key=True)),
+            ('dataset', self.gf('django.db.models.fields.CharField')(max_length=32)),
+            ('scope', self.gf('django.db.models.fields.CharField')(max_length=8)),
+            ('version', self.gf('django.db.models.fields.PositiveIntegerField')(default=0)),
+        ))
+        db.send_create_signal(u'dataload', ['DataVersion'])
+
+        # Adding unique constraint on 'DataVersion', fields ['dataset', 'scope']
+        db.create_unique(u'dataload_dataversion', ['dataset', 'scope'])
+
+
+    def backwards(self, orm):
+        # Removing unique constraint on 'DataVersion', fields ['dataset', 'scope']
+        db.delete_unique(u'dataload_dataversion', ['dataset', 'scope'])
+
+        # Deleting model 'DataVersion'
+        db.delete_table(u'dataload_dataversion')
+
+
+    models = {
+        u'dataload.dataversion': {
+            'Meta': {'unique_together': "(('dataset', 'scope'),)", 'object_name': 'DataVersion'},
+            'dataset': ('django.db.models.fields.CharField', [], {'max_length': '32'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'scope': ('django.db.models.fields.CharField', [], {'max_length': '8'}),
+            'version': ('django.db.models.fields.PositiveIntegerField', [], {'default': '0'})
+        },
+        u'dataload.stateload': {
+            'Meta': {'unique_together': "(('dataset', 'year', 'state'),)", 'object_name': 'StateLoad'},
+            'checksum': ('django.db.models.fields.CharField', [], {'max_length': '40', 'blank': 'True'}),
+            'completed': ('django.db.models.fields.BooleanField', [], {'default': 'False'}),
+            'dataset': ('django.db.models.fields.CharField', [], {'max_length': '32'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'row_count': ('django.db.models.fields.PositiveIntegerField', [], {'default': '0'}),
+            'size': ('django.db.models.fields.BigIntegerField', [], {'default': '0'}),
+            'source': ('django.db.models.fields.CharField', [], {'max_length': '255', 'blank': 'True'}),
+            'state': ('django.db.models.fields.CharField', [], {'max_length': '2', 'blank': 'True'}),
+            'updated': ('django.db.models.fields.DateTimeField', [], {'auto_now': 'True', 'blank': 'True'}),
+            'year': ('django.db.models.fields.PositiveIntegerField', [], {})
+        }
+    }
+
+    complete_apps = ['dataload']
\ No newline at end of file
@@ -0,0 +1,60 @@
+from django.db import models
+
+
+class StateLoad(models.Model):
+    """The load manifest: records what was loaded for one state's worth of a
+    dataset (and from which input), so that loaders can skip states whose
+    inputs haven't changed and resume interrupted loads. Datasets which
+    aren't split by state use a blank state."""
+    dataset = models.CharField(max_length=32)
+    year = models.PositiveIntegerField()
+    state = models.CharField(max_length=2, blank=True)
+    source = models.CharField(max_length=255, blank=True,
+                              help_text='Input file(s) the data came from')
+    size = models.BigIntegerField(default=0,
+                                  help_text='Total size of the input, bytes')
+    checksum = models.CharField(max_length=40, blank=True,
+                                help_text='SHA-1 of the input')
+    row_count = models.PositiveIntegerField(default=0)
+    completed = models.BooleanField(default=False)
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('dataset', 'year', 'state')
+
+    @classmethod
+    def current_states(cls, dataset, year, source):
+        """States which finished loading from this exact input"""
+        return set(cls.objects.filter(
+            dataset=dataset, year=year, completed=True,
+            size=source.size, checksum=source.checksum
+        ).values_list('state', flat=True))
+
+    @classmethod
+    def is_current(cls, dataset, year, state, source):
+        return cls.objects.filter(
+            dataset=dataset, year=year, state=state, completed=True,
+            size=source.size, checksum=source.checksum).exists()
+
+    @classmethod
+    def mark_completed(cls, dataset, year, state, row_count, source):
+        progress, _ = cls.objects.get_or_create(
+            dataset=dataset, year=year, state=state)
+        progress.source = source.path[-255:]
+        progress.size, progress.checksum = source.size, source.checksum
+        progress.row_count = row_count
+        progress.completed = True
+        progress.save()
+
+
+class DataVersion(models.Model):
+    """The version of one scope (a state, or nationwide, etc.) of a dataset,
+    bumped whenever that scope's data changes; see batch.versions. Kept in
+    the database so that versions only ever increase, even if the caches
+    are cleared or evict them."""
+    dataset = models.CharField(max_length=32)
+    scope = models.CharField(max_length=8)
+    version = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('dataset', 'scope')
@@ -0,0 +1,38 @@
+"""Helpers for splitting a large flat file between worker processes"""
+import os
+
+from django.db import connection
+
+
+def init_worker():
+    """Worker processes must not share the parent's database connection"""
+    connection.close()
+
+
+def line_ranges(filename, parts):
+    """Split a file into (at most) `parts` byte ranges, each of which starts
+    at the beginning of a line and ends just after a newline (or at the end
+    of the file)"""
+    size = os.path.getsize(filename)
+    boundaries = [0]
+    with open(filename, 'rb') as datafile:
+        for part in range(1, parts):
+            offset = max(size * part // parts, boundaries[-1])
+            if offset > 0:
+                datafile.seek(offset - 1)
+                datafile.readline()     # finish the line we landed in
+            boundaries.append(datafile.tell())
+    boundaries.append(size)
+    return [(start, end) for start, end in zip(boundaries, boundaries[1:])
+            if start < end]
+
+
+def read_lines(filename, start, end):
+    """A generator of the lines in a byte range from line_ranges"""
+    with open(filename, 'rb') as datafile:
+        datafile.seek(start)
+        while datafile.tell() < end:
+            line = datafile.readline()
+            if not line:
+                break
+            yield line
@@ -0,0 +1,104 @@
+import hashlib
+import os
+
+from django.test import TestCase
+from mock import patch
+
+from dataload import parallel, pgcopy
+from dataload.manifest import Source
+from dataload.models import StateLoad
+from hmda.models import HMDARecord
+from respondants.models import Lender
+
+
+class PGCopyTest(TestCase):
+    fixtures = ['dummy_tracts']
+
+    def test_copy_rows(self):
+        table, columns = pgcopy.model_columns(
+            HMDARecord, ('as_of_year', 'respondent_id', 'agency_code',
+                         'loan_amount_000s', 'action_taken', 'statefp',
+                         'countyfp', 'lender', 'geoid'))
+        self.assertEqual(table, 'hmda_hmdarecord')
+        self.assertEqual(columns[-1], 'geoid_id')
+
+        lenders = Lender.objects.ids(['10000000001', '20000000002'])
+        count = pgcopy.copy_rows(table, columns, [
+            (2012, '0000000001', '1', 100, 1, '11', '222',
+             lenders['10000000001'], '1122233300'),
+            (2012, '0000000002', '2', 200, 6, '11', '222',
+             lenders['20000000002'], '1122233400')])
+        self.assertEqual(2, count)
+        self.assertEqual(2, HMDARecord.objects.count())
+        record = HMDARecord.objects.get(respondent_id='0000000002')
+        self.assertEqual(record.loan_amount_000s, 200)
+        self.assertEqual(record.geoid_id, '1122233400')
+        self.assertEqual(record.lender.code, '20000000002')
+
+        HMDARecord.objects.all().delete()
+
+    @patch('dataload.pgcopy.copy_rows')
+    def test_copy_in_chunks(self, copy_rows):
+        copy_rows.side_effect = lambda table, columns, rows, using: len(rows)
+        counts = list(pgcopy.copy_in_chunks('table', ['col'],
+                                            ((i,) for i in range(7)),
+                                            chunk_size=3))
+        self.assertEqual([3, 3, 1], counts)
+        self.assertEqual([(0,), (1,), (2,)], copy_rows.call_args_list[0][0][2])
+
+    @patch('dataload.pgcopy.copy_rows')
+    def test_copy_writer(self, copy_rows):
+        copy_rows.side_effect = lambda table, columns, rows, using: len(rows)
+        writer = pgcopy.CopyWriter(HMDARecord, ('as_of_year', 'geoid'),
+                                   chunk_size=2)
+        self.assertEqual(['as_of_year', 'geoid_id'], writer.columns)
+        for i in range(5):
+            writer.write((2012, str(i)))
+        self.assertEqual(2, copy_rows.call_count)
+        writer.flush()
+        writer.flush()
+        self.assertEqual(3, copy_rows.call_count)
+        self.assertEqual(5, writer.count)
+        self.assertEqual([(2012, '4')], copy_rows.call_args[0][2])
+
+
+class ParallelTest(TestCase):
+    def test_line_ranges(self):
+        filename = os.path.join("hmda", "tests", "mock_2014.csv")
+        with open(filename, 'rb') as datafile:
+            lines = datafile.readlines()
+        for parts in (1, 3, 4, 50):
+            ranges = parallel.line_ranges(filename, parts)
+            self.assertTrue(len(ranges) <= parts)
+            self.assertEqual(0, ranges[0][0])
+            self.assertEqual(os.path.getsize(filename), ranges[-1][1])
+            read = []
+            for start, end in ranges:
+                read.extend(parallel.read_lines(filename, start, end))
+            self.assertEqual(lines, read)
+
+
+class ManifestTest(TestCase):
+    def test_source(self):
+        filename = os.path.join("hmda", "tests", "mock_2014.csv")
+        source = Source.from_files(filename)
+        self.assertEqual('mock_2014.csv', source.path)
+        self.assertEqual(os.path.getsize(filename), source.size)
+        with open(filename, 'rb') as datafile:
+            self.assertEqual(hashlib.sha1(datafile.read()).hexdigest(),
+                             source.checksum)
+        both = Source.from_files(filename, filename)
+        self.assertEqual(2 * source.size, both.size)
+        self.assertNotEqual(source.checksum, both.checksum)
+
+    def test_state_load(self):
+        source = Source('file.csv', 100, 'a' * 40)
+        self.assertEqual(set(), StateLoad.current_states('ds', 2012, source))
+        StateLoad.mark_completed('ds', 2012, '11', 5, source)
+        StateLoad.mark_completed('ds', 2012, '12', 5,
+                                 Source('file.csv', 100, 'b' * 40))
+        self.assertEqual(set(['11']),
+                         StateLoad.current_states('ds', 2012, source))
+        self.assertTrue(StateLoad.is_current('ds', 2012, '11', source))
+        self.assertFalse(StateLoad.is_current('ds', 2012, '12', source))
+        self.assertFalse(StateLoad.is_current('ds', 2013, '11', source))
@@ -0,0 +1,43 @@
+"""Several endpoints return data for every census tract in an area. The area
+may be a county (state_fips + county_fips), a metro area (cbsa) or a bounding
+box (bbox=minlon,minlat,maxlon,maxlat)."""
+from django.contrib.gis.geos import Polygon
+
+from geo.models import Geo
+
+
+AREA_PARAMS = "state_fips and county_fips, cbsa, or bbox"
+
+
+def parse_bbox(value):
+    """Raises ValueError if the bbox is malformed"""
+    minlon, minlat, maxlon, maxlat = [float(part)
+                                      for part in value.split(',')]
+    if minlon >= maxlon or minlat >= maxlat:
+        raise ValueError("Empty bbox: " + value)
+    bbox = Polygon.from_bbox((minlon, minlat, maxlon, maxlat))
+    bbox.srid = 4269
+    return bbox
+
+
+def tract_filters(params, prefix='geoid__'):
+    """Filter() kwargs selecting the census tracts in the requested area.
+    `prefix` is the path from the queried model to Geo. Returns None if no
+    area was requested; raises ValueError for a bad bbox"""
+    state_fips = params.get('state_fips', '')
+    county_fips = params.get('county_fips', '')
+    if state_fips and county_fips:
+        return {prefix + 'state': state_fips, prefix + 'county': county_fips}
+    if params.get('cbsa'):
+        return {prefix + 'cbsa': params['cbsa'],
+                prefix + 'geo_type': Geo.TRACT_TYPE}
+    if params.get('bbox'):
+        return {prefix + 'geom__intersects': parse_bbox(params['bbox']),
+                prefix + 'geo_type': Geo.TRACT_TYPE}
+
+
+def area_states(params):
+    """The states the requested area lies in, if known. Metro areas and
+    bounding boxes may cross state lines, so give None"""
+    if params.get('state_fips') and params.get('county_fips'):
+        return [params['state_fips']]
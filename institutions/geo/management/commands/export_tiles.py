@@ -0,0 +1,157 @@
+import json
+from multiprocessing import cpu_count, Pool
+from optparse import make_option
+import os
+import sqlite3
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from batch.compression import brotli, brotli_compress, gzip_compress
+from dataload.parallel import init_worker
+from geo.views import TILE_RENDERERS, tiles_covering
+
+
+EXTENSIONS = {'geojson': 'json', 'mvt': 'mvt', 'topojson': 'topojson'}
+MBTILES_FORMATS = {'geojson': 'application/json', 'mvt': 'pbf',
+                   'topojson': 'application/json'}
+
+
+def render(args):
+    """Render a single tile. Runs in a worker process"""
+    zoom, xtile, ytile, geo_types, fmt = args
+    content = TILE_RENDERERS[fmt](zoom, xtile, ytile, geo_types)
+    if isinstance(content, unicode):
+        content = content.encode('utf-8')
+    return zoom, xtile, ytile, content
+
+
+#   File suffix and compression function
+COMPRESSORS = {'gzip': ('gz', gzip_compress),
+               'brotli': ('br', brotli_compress)}
+
+
+class DirectoryWriter(object):
+    """Writes z/x/y.ext files, plus z/x/y.ext.gz (or .br) if compressing, as
+    expected by nginx's gzip_static/brotli_static"""
+    def __init__(self, path, fmt, compress):
+        self.path, self.compress = path, compress
+        self.extension = EXTENSIONS[fmt]
+
+    def write(self, zoom, xtile, ytile, content):
+        dirname = os.path.join(self.path, str(zoom), str(xtile))
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        filename = os.path.join(dirname, '%d.%s' % (ytile, self.extension))
+        with open(filename, 'wb') as f:
+            f.write(content)
+        for compression in self.compress:
+            suffix, compressor = COMPRESSORS[compression]
+            with open(filename + '.' + suffix, 'wb') as f:
+                f.write(compressor(content))
+
+    def close(self):
+        pass
+
+
+class MBTilesWriter(object):
+    """Writes a single MBTiles (sqlite) file. See
+    https://github.com/mapbox/mbtiles-spec/blob/master/1.3/spec.md
+    Tile data is stored compressed if requested (only one compression)"""
+    def __init__(self, path, fmt, compress, min_zoom, max_zoom):
+        if len(compress) > 1:
+            raise CommandError("MBTiles can only hold one compression")
+        self.compressor = compress and COMPRESSORS[compress[0]][1]
+        if os.path.exists(path):
+            os.remove(path)
+        self.db = sqlite3.connect(path)
+        self.db.executescript("""
+            CREATE TABLE metadata (name TEXT, value TEXT);
+            CREATE TABLE tiles (zoom_level INTEGER, tile_column INTEGER,
+                                tile_row INTEGER, tile_data BLOB);
+            CREATE UNIQUE INDEX tile_index
+                ON tiles (zoom_level, tile_column, tile_row);""")
+        metadata = {'name': 'mapusaurus', 'type': 'overlay',
+                    'format': MBTILES_FORMATS[fmt],
+                    'minzoom': str(min_zoom), 'maxzoom': str(max_zoom)}
+        if fmt == 'mvt':
+            metadata['json'] = json.dumps({'vector_layers': [
+                {'id': 'geos', 'minzoom': min_zoom, 'maxzoom': max_zoom,
+                 'fields': {}}]})
+        self.db.executemany("INSERT INTO metadata VALUES (?, ?)",
+                            metadata.items())
+
+    def write(self, zoom, xtile, ytile, content):
+        if self.compressor:
+            content = self.compressor(content)
+        # MBTiles rows count up from the south (TMS)
+        self.db.execute("INSERT INTO tiles VALUES (?, ?, ?, ?)",
+                        (zoom, xtile, 2 ** zoom - 1 - ytile,
+                         sqlite3.Binary(content)))
+
+    def close(self):
+        self.db.commit()
+        self.db.close()
+
+
+class Command(BaseCommand):
+    """Render the whole tile pyramid to static files so that tiles can be
+    served by nginx or a CDN without involving Django. Output is either a
+    z/x/y directory tree or, if the path ends in .mbtiles, an MBTiles
+    file."""
+    args = "<path/to/output/dir or path/to/tiles.mbtiles>"
+    help = "Export census tract and county shape tiles as static files"
+
+    option_list = BaseCommand.option_list + (
+        make_option('--min-zoom', type='int', default=7),
+        make_option('--max-zoom', type='int', default=12),
+        make_option('--geo-types', default='2,3,4',
+                    help='Comma separated, as in the tile API'),
+        make_option('--format', default='geojson',
+                    choices=['geojson', 'mvt', 'topojson']),
+        make_option('--compress', action='append', default=[],
+                    choices=['gzip', 'brotli'],
+                    help='Precompress tiles; may be repeated'),
+        make_option('--processes', type='int', default=cpu_count(),
+                    help='Number of worker processes; 1 to run inline'),
+    )
+
+    def handle(self, *args, **options):
+        if not args:
+            raise CommandError("Needs a first argument, " + Command.args)
+        if 'brotli' in options['compress'] and brotli is None:
+            raise CommandError("Brotli compression requires the brotli "
+                               "package")
+        geo_types = [int(t) for t in options['geo_types'].split(',')]
+        zooms = range(options['min_zoom'], options['max_zoom'] + 1)
+
+        if args[0].endswith('.mbtiles'):
+            writer = MBTilesWriter(args[0], options['format'],
+                                   options['compress'], options['min_zoom'],
+                                   options['max_zoom'])
+        else:
+            writer = DirectoryWriter(args[0], options['format'],
+                                     options['compress'])
+
+        pending = ((zoom, xtile, ytile, geo_types, options['format'])
+                   for zoom in zooms
+                   for xtile, ytile in tiles_covering(zoom, geo_types))
+        if options['processes'] > 1:
+            connection.close()      # don't hand the connection to workers
+            pool = Pool(options['processes'], init_worker)
+            rendered = pool.imap_unordered(render, pending, chunksize=16)
+        else:
+            pool, rendered = None, (render(args) for args in pending)
+
+        count = 0
+        try:
+            for zoom, xtile, ytile, content in rendered:
+                writer.write(zoom, xtile, ytile, content)
+                count += 1
+                if count % 1000 == 0:
+                    self.stdout.write('Exported %d tiles' % count)
+        finally:
+            writer.close()
+            if pool:
+                pool.terminate()
+        self.stdout.write('Exported %d tiles' % count)
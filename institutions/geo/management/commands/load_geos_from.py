@@ -1,9 +1,23 @@
 import itertools
+import os
+import re
 
 from django.core.management.base import BaseCommand
+from django.db import connection, transaction
 from django.contrib.gis.gdal import DataSource
 from django.contrib.gis.geos import MultiPolygon, Polygon
-from geo.models import Geo
+from batch import versions
+from dataload.manifest import Source
+from dataload.models import StateLoad
+from geo.models import Geo, SimplifiedGeo
+
+
+#   TIGER file names, e.g. tl_2013_17_tract or tl_2013_us_county
+TIGER_NAME = re.compile(r'^tl_(?P<year>\d{4})_(?P<state>\w{2})_(?P<kind>\w+)$')
+#   Fields compared when deciding whether a shape has changed. Tracts get
+#   their cbsa/csa from their county (see fill_tract_metros)
+COMPARED_FIELDS = ('geo_type', 'name', 'state', 'county', 'tract', 'minlat',
+                   'maxlat', 'minlon', 'maxlon', 'centlat', 'centlon')
 
 
 class Command(BaseCommand):
@@ -47,19 +61,96 @@ class Command(BaseCommand):
             centlon=float(row_dict['INTPTLON']),
             geom=geom)
 
+    def manifest_key(self, shapefile_name):
+        """(dataset, year, state) for the load manifest, if this is a TIGER
+        shape file"""
+        name = os.path.splitext(os.path.basename(shapefile_name))[0]
+        match = TIGER_NAME.match(name)
+        if match:
+            return ('geo_' + match.group('kind'), int(match.group('year')),
+                    match.group('state'))
+
+    def changed(self, old, new):
+        fields = COMPARED_FIELDS
+        if new.geo_type != Geo.TRACT_TYPE:
+            fields += ('cbsa', 'csa')
+        return (any(getattr(old, field) != getattr(new, field)
+                    for field in fields)
+                or not old.geom.equals_exact(new.geom))
+
+    def save_batch(self, batch):
+        """Insert new shapes and update those which have changed. Returns the
+        shapes which were inserted or updated"""
+        existing = Geo.objects.in_bulk([geo.geoid for geo in batch])
+        Geo.objects.bulk_create([geo for geo in batch
+                                 if geo.geoid not in existing])
+        changed = [geo for geo in batch if geo.geoid in existing
+                   and self.changed(existing[geo.geoid], geo)]
+        for geo in changed:
+            geo.save()
+        # Simplified shapes for changed geos must be regenerated
+        SimplifiedGeo.objects.filter(
+            geo__in=[geo.geoid for geo in changed]).delete()
+        return [geo for geo in batch
+                if geo.geoid not in existing] + changed
+
     def handle(self, *args, **options):
         shapefile_name = args[0]
+        key = self.manifest_key(shapefile_name)
+        source = Source.from_files(*[
+            path for path in (shapefile_name,
+                              os.path.splitext(shapefile_name)[0] + '.dbf')
+            if os.path.exists(path)])
+        if key and StateLoad.is_current(*(key + (source,))):
+            self.stdout.write('Unchanged since last load; skipping')
+            return
+
         ds = DataSource(shapefile_name, encoding='iso-8859-1')
         layer = ds[0]
         columns = [layer.get_fields(field) for field in layer.fields]
         columns.append(layer.get_geoms(True))
         rows = itertools.izip(*columns)
-        batch, batch_count = [], 0
-        for row in rows:
-            batch.append(self.process_row(row, layer.fields))
-            if len(batch) == 100:
-                batch_count += 1
-                self.stdout.write('Saving batch %d' % batch_count)
-                Geo.objects.bulk_create(batch)
-                batch = []
-        Geo.objects.bulk_create(batch)      # last batch
+        batch, batch_count, row_count, saved = [], 0, 0, 0
+        states = set()      # of the shapes saved
+        with transaction.atomic():
+            for row in rows:
+                batch.append(self.process_row(row, layer.fields))
+                row_count += 1
+                if len(batch) == 100:
+                    batch_count += 1
+                    self.stdout.write('Saving batch %d' % batch_count)
+                    saved += self.save_changed(batch, states)
+                    batch = []
+            saved += self.save_changed(batch, states)      # last batch
+            self.fill_tract_metros()
+            if key:
+                StateLoad.mark_completed(*(key + (row_count, source)))
+        self.stdout.write('%d of %d shapes new or changed'
+                          % (saved, row_count))
+        if None in states:      # e.g. metro areas
+            versions.bump(versions.GEO)
+        elif states:
+            versions.bump(versions.GEO, states)
+
+    def save_changed(self, batch, states):
+        """Save a batch, noting the states of the shapes which changed (so
+        that only their tiles become stale). Returns the number changed"""
+        saved = self.save_batch(batch)
+        states.update(geo.state for geo in saved)
+        return len(saved)
+
+    def fill_tract_metros(self):
+        """Tract shape files don't say which metro area a tract is in, but
+        county shape files do. Copy it over (in whichever order the files
+        were loaded) so that tracts can be selected by cbsa directly"""
+        cursor = connection.cursor()
+        cursor.execute("""
+            UPDATE geo_geo AS tract
+            SET cbsa = county.cbsa, csa = county.csa
+            FROM geo_geo AS county
+            WHERE tract.geo_type = %s AND county.geo_type = %s
+              AND tract.state = county.state
+              AND tract.county = county.county
+              AND (tract.cbsa IS DISTINCT FROM county.cbsa
+                   OR tract.csa IS DISTINCT FROM county.csa)""",
+                       [Geo.TRACT_TYPE, Geo.COUNTY_TYPE])
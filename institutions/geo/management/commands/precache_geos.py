@@ -1,48 +1,116 @@
-from django.core import urlresolvers
-from django.core.management.base import BaseCommand
-from django.test import Client
+from multiprocessing import cpu_count, Pool
+from optparse import make_option
+import os
 
-from geo.views import to_lat, to_lon
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from dataload.parallel import init_worker
+from geo.tilecache import tile_cache
+from geo.views import cache_tile, tile_url_version, tiles_covering
+
+
+def checkpoint_header(fmt, geo_types):
+    """The first line of a checkpoint file, naming the tiles it lists. A
+    checkpoint for another format or geo types, or for shapes which have
+    since been reloaded, doesn't apply"""
+    return '# %s %s shapes:%s' % (
+        fmt, ','.join(str(t) for t in sorted(set(geo_types))),
+        tile_url_version())
+
+
+def prewarm(args):
+    """Render a single tile into the tile cache. Runs in a worker process"""
+    zoom, xtile, ytile, geo_types, fmt = args
+    cache_tile(zoom, xtile, ytile, geo_types, fmt)
+    return zoom, xtile, ytile
 
 
 class Command(BaseCommand):
-    """Precache all of the geojson tiles in the continental US. Optionally,
-    split the workload across multiple process, e.g. by calling with 0 5, 1 5,
-    2 5, 3 5, 4 5 separately"""
-    args = "<identifier> <out-of>"
+    """Precache the tiles of every zoom level which overlap loaded shapes.
+    Tiles are rendered directly (i.e. not through HTTP) by a pool of worker
+    processes. If a checkpoint file is given, finished tiles are recorded
+    there so that an interrupted run can pick up where it left off.
+
+    The tiles go into the tile cache, so this is only useful if that cache
+    is shared with the web processes (see SHARED_CACHE_LOCATION)."""
     help = "Precache census tract and county shape tiles"
 
-    urls = {
-        'geo:tiles': range(7, 13),
-    }
-    #   Roughly the bounds of the continental US
-    min_lat = -125
-    max_lat = -66
-    min_lon = 26
-    max_lon = 49
-
-    def per_zoom_level(self, url_name, zoom, identifier, max_procs):
-        """Iterates through x and y tiles, hitting the ones we care about"""
-        for xtile, ytile in ((x, y)
-                             for x in range(2**zoom)
-                             for y in range(2**zoom)
-                             if y % max_procs == identifier):
-            lat, lon = to_lat(zoom, ytile), to_lon(zoom, xtile)
-            if (Command.min_lat < lat and lat < Command.max_lat
-                    and Command.min_lon < lon and lon < Command.max_lon):
-                url = urlresolvers.reverse(
-                    url_name, kwargs={'zoom': zoom, 'xtile': xtile,
-                                      'ytile': ytile})
-                Client().get(url)
+    option_list = BaseCommand.option_list + (
+        make_option('--min-zoom', type='int', default=7),
+        make_option('--max-zoom', type='int', default=12),
+        make_option('--geo-types', default='2,3,4',
+                    help='Comma separated, as in the tile API'),
+        make_option('--format', default='geojson',
+                    choices=['geojson', 'mvt', 'topojson']),
+        make_option('--processes', type='int', default=cpu_count(),
+                    help='Number of worker processes; 1 to run inline'),
+        make_option('--checkpoint',
+                    help='File in which to record (and resume) progress'),
+    )
+
+    def read_checkpoint(self, path, header):
+        """Tiles which a previous run has already finished, or None if there
+        is no checkpoint for these tiles"""
+        if not path or not os.path.exists(path):
+            return None
+        with open(path) as checkpoint:
+            if checkpoint.readline().strip() != header:
+                self.stdout.write('Checkpoint is for other tiles (format, '
+                                  'geo types, or shapes); starting over')
+                return None
+            return set(line.strip() for line in checkpoint if line.strip())
+
+    def pending_tiles(self, zooms, geo_types, fmt, finished):
+        for zoom in zooms:
+            tiles = sorted(tiles_covering(zoom, geo_types))
+            self.stdout.write('Zoom %d: %d tiles' % (zoom, len(tiles)))
+            for xtile, ytile in tiles:
+                if '%d/%d/%d' % (zoom, xtile, ytile) not in finished:
+                    yield zoom, xtile, ytile, geo_types, fmt
 
     def handle(self, *args, **options):
         """Main entry point"""
-        if len(args) >= 2:
-            identifier, max_processes = map(int, args[:2])
+        if isinstance(tile_cache(), LocMemCache):
+            raise CommandError("The tile cache isn't shared with the web "
+                               "processes; set SHARED_CACHE_LOCATION")
+        geo_types = [int(t) for t in options['geo_types'].split(',')]
+        zooms = range(options['min_zoom'], options['max_zoom'] + 1)
+        header = checkpoint_header(options['format'], geo_types)
+        finished = self.read_checkpoint(options['checkpoint'], header)
+        if finished:
+            self.stdout.write('Resuming; %d tiles already done'
+                              % len(finished))
+        pending = self.pending_tiles(zooms, geo_types, options['format'],
+                                     finished or set())
+
+        if options['processes'] > 1:
+            connection.close()      # don't hand the connection to workers
+            pool = Pool(options['processes'], init_worker)
+            done = pool.imap_unordered(prewarm, pending, chunksize=16)
         else:
-            identifier, max_processes = 0, 1
+            pool, done = None, (prewarm(args) for args in pending)
 
-        for name, zoom in ((name, zoom)
-                           for name in Command.urls
-                           for zoom in Command.urls[name]):
-            self.per_zoom_level(name, zoom, identifier, max_processes)
+        checkpoint = None
+        if options['checkpoint'] and finished is not None:
+            checkpoint = open(options['checkpoint'], 'a')
+        elif options['checkpoint']:
+            checkpoint = open(options['checkpoint'], 'w')
+            checkpoint.write(header + '\n')
+        count = 0
+        try:
+            for zoom, xtile, ytile in done:
+                count += 1
+                if checkpoint:
+                    checkpoint.write('%d/%d/%d\n' % (zoom, xtile, ytile))
+                if count % 1000 == 0:
+                    self.stdout.write('Cached %d tiles' % count)
+                    if checkpoint:
+                        checkpoint.flush()
+        finally:
+            if checkpoint:
+                checkpoint.close()
+            if pool:
+                pool.terminate()
+        self.stdout.write('Cached %d tiles' % count)
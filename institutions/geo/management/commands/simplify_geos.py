@@ -0,0 +1,44 @@
+from django.contrib.gis.geos import MultiPolygon, Polygon
+from django.core.management.base import BaseCommand
+
+from geo.models import Geo, rounded_geojson, SimplifiedGeo
+
+
+class Command(BaseCommand):
+    """Simplify and serialize every Geo's shape once per zoom band, so that
+    tiles can be served without touching GEOS. Re-run after loading new
+    shapes."""
+    args = "[<geo_type> ...]"
+    help = "Precompute simplified tile geometries for all (or some) geos"
+
+    batch_size = 100
+
+    def simplify(self, geo, band):
+        """Returns a SimplifiedGeo for this geo and zoom band. Its GeoJSON
+        keeps only as many decimal places as the band can show"""
+        geom = geo.geom.simplify(SimplifiedGeo.tolerance_for(band),
+                                 preserve_topology=True)
+        if isinstance(geom, Polygon):
+            geom = MultiPolygon(geom)
+        return SimplifiedGeo(
+            geo=geo, min_zoom=band, geom=geom,
+            geojson=rounded_geojson(geom, SimplifiedGeo.precision_for(band)))
+
+    def handle(self, *args, **options):
+        query = Geo.objects.order_by('geoid')
+        if args:
+            query = query.filter(geo_type__in=[int(arg) for arg in args])
+
+        # Page by geoid rather than loading every shape at once
+        last_geoid, batch_count = '', 0
+        while True:
+            geos = list(query.filter(geoid__gt=last_geoid)[:self.batch_size])
+            if not geos:
+                break
+            batch_count += 1
+            self.stdout.write('Simplifying batch %d' % batch_count)
+            SimplifiedGeo.objects.filter(geo__in=geos).delete()
+            SimplifiedGeo.objects.bulk_create([
+                self.simplify(geo, band) for geo in geos
+                for band in SimplifiedGeo.ZOOM_BANDS])
+            last_geoid = geos[-1].geoid
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+from south.utils import datetime_utils as datetime
+from south.db import db
+from south.v2 import SchemaMigration
+from django.db import models
+
+
+class Migration(SchemaMigration):
+
+    def forwards(self, orm):
+        # Adding model 'SimplifiedGeo'
+        db.create_table(u'geo_simplifiedgeo', (
+            (u'id', self.gf('django.db.models.fields.AutoField')(primary_key=True)),
+            ('geo', self.gf('django.db.models.fields.related.ForeignKey')(related_name='simplified', to=orm['geo.Geo'])),
+            ('min_zoom', self.gf('django.db.models.fields.PositiveSmallIntegerField')()),
+            ('geom', self.gf('django.contrib.gis.db.models.fields.MultiPolygonField')(srid=4269)),
+            ('geojson', self.gf('django.db.models.fields.TextField')()),
+        ))
+        db.send_create_signal(u'geo', ['SimplifiedGeo'])
+
+        # Adding unique constraint on 'SimplifiedGeo', fields ['geo', 'min_zoom']
+        db.create_unique(u'geo_simplifiedgeo', ['geo_id', 'min_zoom'])
+
+
+    def backwards(self, orm):
+        # Removing unique constraint on 'SimplifiedGeo', fields ['geo', 'min_zoom']
+        db.delete_unique(u'geo_simplifiedgeo', ['geo_id', 'min_zoom'])
+
+        # Deleting model 'SimplifiedGeo'
+        db.delete_table(u'geo_simplifiedgeo')
+
+
+    models = {
+        u'geo.geo': {
+            'Meta': {'object_name': 'Geo', 'index_together': "[('geo_type', 'minlat', 'minlon'), ('geo_type', 'minlat', 'maxlon'), ('geo_type', 'maxlat', 'minlon'), ('geo_type', 'maxlat', 'maxlon'), ('geo_type', 'centlat', 'centlon')]"},
+            'cbsa': ('django.db.models.fields.CharField', [], {'max_length': '5', 'null': 'True'}),
+            'centlat': ('django.db.models.fields.FloatField', [], {}),
+            'centlon': ('django.db.models.fields.FloatField', [], {}),
+            'county': ('django.db.models.fields.CharField', [], {'max_length': '3', 'null': 'True'}),
+            'csa': ('django.db.models.fields.CharField', [], {'max_length': '3', 'null': 'True'}),
+            'geo_type': ('django.db.models.fields.PositiveIntegerField', [], {}),
+            'geoid': ('django.db.models.fields.CharField', [], {'max_length': '20', 'primary_key': 'True'}),
+            'geom': ('django.contrib.gis.db.models.fields.MultiPolygonField', [], {'srid': '4269'}),
+            'maxlat': ('django.db.models.fields.FloatField', [], {}),
+            'maxlon': ('django.db.models.fields.FloatField', [], {}),
+            'minlat': ('django.db.models.fields.FloatField', [], {}),
+            'minlon': ('django.db.models.fields.FloatField', [], {}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '50'}),
+            'state': ('django.db.models.fields.CharField', [], {'max_length': '2', 'null': 'True'}),
+            'tract': ('django.db.models.fields.CharField', [], {'max_length': '6', 'null': 'True'})
+        },
+        u'geo.simplifiedgeo': {
+            'Meta': {'unique_together': "(('geo', 'min_zoom'),)", 'object_name': 'SimplifiedGeo'},
+            'geo': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'simplified'", 'to': u"orm['geo.Geo']"}),
+            'geojson': ('django.db.models.fields.TextField', [], {}),
+            'geom': ('django.contrib.gis.db.models.fields.MultiPolygonField', [], {'srid': '4269'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'min_zoom': ('django.db.models.fields.PositiveSmallIntegerField', [], {})
+        }
+    }
+
+    complete_apps = ['geo']
\ No newline at end of file
@@ -1,4 +1,5 @@
 import json
+import math
 
 from django.contrib.gis.db import models
 
@@ -18,8 +19,9 @@ class Geo(models.Model):
     tract = models.CharField(max_length=6, null=True)
     csa = models.CharField(max_length=3, null=True,
                            help_text='Combined Statistical Area')
-    cbsa = models.CharField(max_length=5, null=True,
-                            help_text='Core Based Statistical Area')
+    cbsa = models.CharField(max_length=5, null=True, db_index=True,
+                            help_text=('Core Based Statistical Area. Census '
+                                       + 'tracts take their county\'s'))
 
     geom = models.MultiPolygonField(srid=4269)
 
@@ -32,18 +34,23 @@ class Geo(models.Model):
 
     objects = models.GeoManager()
 
-    class Meta:
-        index_together = [("geo_type", "minlat", "minlon"),
-                          ("geo_type", "minlat", "maxlon"),
-                          ("geo_type", "maxlat", "minlon"),
-                          ("geo_type", "maxlat", "maxlon"),
-                          ("geo_type", "centlat", "centlon")]
-
-    def as_geojson(self):
+    def as_geojson(self, geometry=None):
+        """Serialize as a GeoJSON Feature. If a pre-serialized geometry (e.g.
+        from SimplifiedGeo) is provided, use it rather than simplifying the
+        full geometry"""
         # geometry is a placeholder, as we'll be inserting a pre-serialized
         # json string
         geojson = {"type": "Feature", "geometry": "$_$"}
-        geojson['properties'] = {
+        geojson['properties'] = self.feature_properties()
+        if geometry is None:
+            geometry = self.geom.simplify(preserve_topology=True).geojson
+        geojson = json.dumps(geojson)
+        geojson = geojson.replace('"$_$"', geometry)
+        return geojson
+
+    def feature_properties(self):
+        """Properties describing this geo in tiles"""
+        return {
             'geoid': self.geoid,
             'geoType': Geo.TYPES[self.geo_type - 1],    # 1-indexed
             'name': self.name,
@@ -57,8 +64,64 @@ class Geo(models.Model):
             'centlat': self.centlat,
             'centlon': self.centlon
         }
-        geojson = json.dumps(geojson)
-        geojson = geojson.replace(
-            '"$_$"',
-            self.geom.simplify(preserve_topology=True).geojson)
-        return geojson
+
+
+class SimplifiedGeo(models.Model):
+    """A Geo's shape, simplified and serialized ahead of time for a band of
+    zoom levels, so that tiles needn't do either per request."""
+    # Each band covers zoom levels from its start up to the start of the
+    # next. Shapes are simplified to half a pixel at the most detailed zoom
+    # in the band; the last band keeps every vertex.
+    ZOOM_BANDS = (0, 9, 11, 13)
+    #   The most detailed zoom the map shows; only affects the precision of
+    #   the last band's GeoJSON
+    MAX_ZOOM = 18
+
+    geo = models.ForeignKey(Geo, related_name='simplified')
+    min_zoom = models.PositiveSmallIntegerField(
+        help_text='The least detailed zoom level of this band')
+    geom = models.MultiPolygonField(srid=4269)
+    geojson = models.TextField()
+
+    objects = models.GeoManager()
+
+    class Meta:
+        unique_together = ('geo', 'min_zoom')
+
+    @staticmethod
+    def band_for(zoom):
+        """The band (i.e. its min_zoom) which covers this zoom level"""
+        return max(band for band in SimplifiedGeo.ZOOM_BANDS if band <= zoom)
+
+    @staticmethod
+    def max_zoom_for(band):
+        """The most detailed zoom level in a band"""
+        idx = SimplifiedGeo.ZOOM_BANDS.index(band)
+        if idx == len(SimplifiedGeo.ZOOM_BANDS) - 1:
+            return SimplifiedGeo.MAX_ZOOM
+        return SimplifiedGeo.ZOOM_BANDS[idx + 1] - 1
+
+    @staticmethod
+    def tolerance_for(band):
+        """Simplification tolerance (in degrees) for a band. Tiles are 256
+        pixels wide, so one pixel spans 360 / (256 * 2^zoom) degrees"""
+        if band == SimplifiedGeo.ZOOM_BANDS[-1]:
+            return 0.0
+        return 360.0 / (256 * 2 ** SimplifiedGeo.max_zoom_for(band)) / 2
+
+    @staticmethod
+    def precision_for(band):
+        """Decimal places kept in a band's GeoJSON: enough to place each
+        vertex within an eighth of a pixel at the band's most detailed
+        zoom"""
+        pixels_per_degree = 256 * 2 ** SimplifiedGeo.max_zoom_for(band) / 360.0
+        return int(math.ceil(math.log10(8 * pixels_per_degree)))
+
+
+def rounded_geojson(geom, precision):
+    """Serialize a MultiPolygon as GeoJSON with coordinates rounded to some
+    decimal places. GEOS writes every digit it has, which is several times
+    more than a map can show"""
+    return json.dumps({'type': 'MultiPolygon', 'coordinates': [
+        [[[round(lon, precision), round(lat, precision)] for lon, lat in ring]
+         for ring in polygon] for polygon in geom.coords]})
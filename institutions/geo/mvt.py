@@ -0,0 +1,193 @@
+"""A small encoder for Mapbox Vector Tiles (version 2 of the spec). Only what
+we need to serve polygons is implemented. See
+https://github.com/mapbox/vector-tile-spec/tree/master/2.1"""
+import math
+import struct
+
+from django.contrib.gis.geos import Polygon
+
+
+EXTENT = 4096
+#   Shapes are clipped a little outside the tile so that borders don't show
+#   at tile edges
+BUFFER = 64
+
+#   Geometry commands
+MOVE_TO, LINE_TO, CLOSE_PATH = 1, 2, 7
+#   Protobuf wire types
+VARINT, FIXED64, LENGTH_DELIMITED = 0, 1, 2
+#   vector_tile.proto's GeomType
+POLYGON = 3
+
+
+def _varint(value):
+    buf = bytearray()
+    while value > 0x7f:
+        buf.append((value & 0x7f) | 0x80)
+        value >>= 7
+    buf.append(value)
+    return buf
+
+
+def _zigzag(value):
+    return (value << 1) ^ (value >> 63)
+
+
+def _field(number, wire_type, payload):
+    """Serialize a single protobuf field. Payload should already be encoded
+    (except for length-delimited fields, which receive a length prefix)"""
+    buf = _varint((number << 3) | wire_type)
+    if wire_type == LENGTH_DELIMITED:
+        buf += _varint(len(payload))
+    return buf + payload
+
+
+def _packed(number, values):
+    payload = bytearray()
+    for value in values:
+        payload += _varint(value)
+    return _field(number, LENGTH_DELIMITED, payload)
+
+
+def _value(value):
+    """Encode a property as a vector_tile.proto Value message"""
+    if isinstance(value, bool):
+        return _field(7, VARINT, _varint(int(value)))
+    if isinstance(value, (int, long)):
+        return _field(6, VARINT, _varint(_zigzag(value)))
+    if isinstance(value, float):
+        return _field(3, FIXED64, bytearray(struct.pack('<d', value)))
+    if not isinstance(value, unicode):
+        value = unicode(value)
+    return _field(1, LENGTH_DELIMITED, bytearray(value.encode('utf-8')))
+
+
+class TileProjection(object):
+    """Converts lon/lat into integer coordinates local to a single web
+    mercator tile"""
+    def __init__(self, zoom, xtile, ytile, extent=EXTENT):
+        self.scale = 2.0 ** zoom
+        self.xtile, self.ytile = xtile, ytile
+        self.extent = extent
+
+    def __call__(self, lon, lat):
+        x = (lon + 180.0) / 360.0 * self.scale
+        lat_rad = math.radians(lat)
+        y = (1 - math.log(math.tan(lat_rad) + 1 / math.cos(lat_rad))
+             / math.pi) / 2 * self.scale
+        return (int(round((x - self.xtile) * self.extent)),
+                int(round((y - self.ytile) * self.extent)))
+
+
+def clip_bounds(minlon, minlat, maxlon, maxlat, extent=EXTENT,
+                buffer=BUFFER):
+    """Tile bounds, grown by the buffer, as a polygon to clip with"""
+    lon_buffer = (maxlon - minlon) * buffer / extent
+    lat_buffer = (maxlat - minlat) * buffer / extent
+    bounds = Polygon.from_bbox((minlon - lon_buffer, minlat - lat_buffer,
+                                maxlon + lon_buffer, maxlat + lat_buffer))
+    bounds.srid = 4269
+    return bounds
+
+
+def polygons(geom):
+    """Flatten whatever an intersection returned into polygons"""
+    if geom.geom_type == 'Polygon':
+        return [geom]
+    if geom.geom_type in ('MultiPolygon', 'GeometryCollection'):
+        return [polygon for child in geom for polygon in polygons(child)]
+    return []       # points and lines from touching edges
+
+
+def _ring_area(ring):
+    """Twice the signed area, per the surveyor's formula"""
+    return sum(x0 * y1 - x1 * y0
+               for (x0, y0), (x1, y1) in zip(ring, ring[1:] + ring[:1]))
+
+
+def _project_ring(coords, project, exterior):
+    """Project a ring, dropping repeated points and the closing point. The
+    spec requires exterior rings have positive area, interiors negative.
+    Returns None if nothing is left of the ring"""
+    ring = []
+    for lon, lat in coords:
+        point = project(lon, lat)
+        if not ring or ring[-1] != point:
+            ring.append(point)
+    if len(ring) > 1 and ring[0] == ring[-1]:
+        ring.pop()
+    if len(ring) < 3:
+        return None
+    area = _ring_area(ring)
+    if area == 0:
+        return None
+    if (area > 0) != exterior:
+        ring.reverse()
+    return ring
+
+
+def encode_geometry(geom, project):
+    """Encode a (multi)polygon as a list of geometry command integers"""
+    commands = []
+    cursor = (0, 0)
+    for polygon in polygons(geom):
+        for idx, coords in enumerate(polygon.coords):
+            ring = _project_ring(coords, project, exterior=(idx == 0))
+            if ring is None:
+                if idx == 0:
+                    break       # without an exterior, holes are meaningless
+                continue
+            for point_idx, (x, y) in enumerate(ring):
+                if point_idx == 0:
+                    commands.append(MOVE_TO | (1 << 3))
+                elif point_idx == 1:
+                    commands.append(LINE_TO | ((len(ring) - 1) << 3))
+                commands.append(_zigzag(x - cursor[0]))
+                commands.append(_zigzag(y - cursor[1]))
+                cursor = (x, y)
+            commands.append(CLOSE_PATH | (1 << 3))
+    return commands
+
+
+def encode_layer(name, features, extent=EXTENT):
+    """Encode a single Layer message. Features should be (geometry commands,
+    properties dict) pairs; None-valued properties are left out as the spec
+    has no null"""
+    keys, values = [], []
+    key_idx, value_idx = {}, {}
+    layer = _field(15, VARINT, _varint(2))      # version
+    layer += _field(1, LENGTH_DELIMITED, bytearray(name.encode('utf-8')))
+    for commands, properties in features:
+        if not commands:
+            continue
+        tags = []
+        for key in sorted(properties):
+            value = properties[key]
+            if value is None:
+                continue
+            if key not in key_idx:
+                key_idx[key] = len(keys)
+                keys.append(key)
+            value_key = (type(value), value)
+            if value_key not in value_idx:
+                value_idx[value_key] = len(values)
+                values.append(value)
+            tags.extend([key_idx[key], value_idx[value_key]])
+        feature = _packed(2, tags)
+        feature += _field(3, VARINT, _varint(POLYGON))
+        feature += _packed(4, commands)
+        layer += _field(2, LENGTH_DELIMITED, feature)
+    for key in keys:
+        layer += _field(3, LENGTH_DELIMITED, bytearray(key.encode('utf-8')))
+    for value in values:
+        layer += _field(4, LENGTH_DELIMITED, _value(value))
+    layer += _field(5, VARINT, _varint(extent))
+    return layer
+
+
+def encode_tile(layers):
+    """Encode a Tile message from a dict of layer name -> features"""
+    tile = bytearray()
+    for name in sorted(layers):
+        tile += _field(3, LENGTH_DELIMITED, encode_layer(name, layers[name]))
+    return bytes(tile)
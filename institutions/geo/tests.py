@@ -1,18 +1,35 @@
+import gzip
 import json
+import os
+import shutil
+import sqlite3
+import tempfile
 
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management import call_command
+from django.core.management.base import CommandError
 from django.core.urlresolvers import reverse
 from django.contrib.gis.geos import MultiPolygon, Polygon
 from django.test import TestCase
 from mock import Mock, patch
 
+from batch import compression, versions
+from batch.coalesce import results_cache
+from geo import filters, mvt, tilecache, topojson
 from geo.management.commands.load_geos_from import Command as LoadGeos
-from geo.management.commands.precache_geos import Command as Precache
-from geo.models import Geo
+from geo.management.commands.precache_geos import checkpoint_header
+from geo.management.commands.simplify_geos import Command as Simplify
+from geo.models import Geo, rounded_geojson, SimplifiedGeo
+from geo.views import (
+    tile_url_version, tiles_covering, to_lat, to_lon, to_xtile, to_ytile)
 
 
 class ViewTest(TestCase):
     fixtures = ['many_tracts', 'test_counties']
 
+    def setUp(self):
+        results_cache().clear()
+
     def test_tract_tiles(self):
         # lat/lon roughly: 0 to 0.17
         resp = self.client.get(reverse(
@@ -53,7 +70,7 @@ class ViewTest(TestCase):
         self.assertEqual(resp['features'][0]['properties']['name'],
                          'Negative County')
 
-        # lat/lon roughly: -3.1 to -2.9; Testing that the centroid is checked
+        # lat/lon roughly: -3.1 to -2.9; the county covers the whole tile
         resp = self.client.get(reverse(
             'geo:tiles',
             kwargs={'zoom': 11, 'xtile': 1006, 'ytile': 1041}),
@@ -80,6 +97,124 @@ class ViewTest(TestCase):
             resp = json.loads(resp.content)
             self.assertEqual(len(resp['features']), 3)
 
+    def test_tiles_simplified(self):
+        geo = Geo.objects.get(geoid='1122233300')
+        SimplifiedGeo.objects.create(
+            geo=geo, min_zoom=SimplifiedGeo.band_for(11), geom=geo.geom,
+            geojson='{"type": "Point", "coordinates": [1, 2]}')
+        resp = self.client.get(reverse(
+            'geo:tiles',
+            kwargs={'zoom': 11, 'xtile': 1024, 'ytile': 1024}),
+            data={'geo_types': '3'})
+        resp = json.loads(resp.content)
+        self.assertEqual(len(resp['features']), 3)
+        geometries = dict((f['properties']['geoid'], f['geometry'])
+                          for f in resp['features'])
+        # Only the one shape was precomputed; the others are simplified live
+        self.assertEqual(geometries['1122233300']['type'], 'Point')
+        self.assertEqual(geometries['1122233400']['type'], 'MultiPolygon')
+
+    def test_vector_tiles(self):
+        # lat/lon roughly: -4 to -3.8
+        kwargs = {'zoom': 11, 'xtile': 1001, 'ytile': 1046}
+        resp = self.client.get(reverse('geo:vector_tiles', kwargs=kwargs),
+                               data={'geo_types': '2'})
+        self.assertEqual(resp['Content-Type'],
+                         'application/vnd.mapbox-vector-tile')
+        self.assertTrue('Negative County' in resp.content)
+        self.assertFalse('Positive County' in resp.content)
+
+        # Sent compressed, if the client accepts it
+        resp = self.client.get(reverse('geo:vector_tiles', kwargs=kwargs),
+                               data={'geo_types': '2'},
+                               HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(resp['Content-Encoding'], 'gzip')
+        self.assertTrue('Negative County'
+                        in compression.gzip_decompress(resp.content))
+
+        # Also available via the Accept header
+        resp = self.client.get(
+            reverse('geo:tiles', kwargs=kwargs), data={'geo_types': '2'},
+            HTTP_ACCEPT='application/vnd.mapbox-vector-tile')
+        self.assertEqual(resp['Content-Type'],
+                         'application/vnd.mapbox-vector-tile')
+        self.assertTrue('Negative County' in resp.content)
+
+    def test_tile_etag(self):
+        url = reverse('geo:tiles',
+                      kwargs={'zoom': 11, 'xtile': 1024, 'ytile': 1024})
+        etag = self.client.get(url, {'geo_types': '3'})['ETag']
+        resp = self.client.get(url, {'geo_types': '3'},
+                               HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(304, resp.status_code)
+        self.assertNotEqual(
+            etag, self.client.get(url, {'geo_types': '2'})['ETag'])
+
+        versions.bump(versions.GEO, ['11'])
+        resp = self.client.get(url, {'geo_types': '3'},
+                               HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(200, resp.status_code)
+
+    def test_tile_etag_encoding(self):
+        """Gzipped and uncompressed tiles are different representations"""
+        url = reverse('geo:tiles',
+                      kwargs={'zoom': 11, 'xtile': 1024, 'ytile': 1024})
+        plain = self.client.get(url)
+        gzipped = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual('gzip', gzipped['Content-Encoding'])
+        self.assertNotEqual(plain['ETag'], gzipped['ETag'])
+
+        resp = self.client.get(url, HTTP_IF_NONE_MATCH=gzipped['ETag'])
+        self.assertEqual(200, resp.status_code)
+        resp = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip',
+                               HTTP_IF_NONE_MATCH=gzipped['ETag'])
+        self.assertEqual(304, resp.status_code)
+
+    def test_versioned_tiles(self):
+        kwargs = {'zoom': 11, 'xtile': 1024, 'ytile': 1024}
+        resp = self.client.get(reverse('geo:tiles', kwargs=kwargs))
+        self.assertEqual(resp['Cache-Control'], 'max-age=0, must-revalidate')
+
+        kwargs['version'] = tile_url_version()
+        resp = self.client.get(reverse('geo:versioned_tiles',
+                                       kwargs=kwargs), {'geo_types': '3'})
+        self.assertTrue('immutable' in resp['Cache-Control'])
+        self.assertEqual(len(json.loads(resp.content)['features']), 3)
+
+        # Still served under an out of date version, but not for keeps
+        versions.bump(versions.GEO, ['11'])
+        resp = self.client.get(reverse('geo:versioned_vector_tiles',
+                                       kwargs=kwargs))
+        self.assertEqual(resp['Content-Type'],
+                         'application/vnd.mapbox-vector-tile')
+        self.assertFalse('immutable' in resp['Cache-Control'])
+
+    @patch('django.middleware.cache.learn_cache_key')
+    def test_tiles_not_site_cached(self, learn_cache_key):
+        """Tiles have their own cache, so skip the site-wide one"""
+        kwargs = {'zoom': 11, 'xtile': 1024, 'ytile': 1024,
+                  'version': tile_url_version()}
+        resp = self.client.get(reverse('geo:versioned_tiles', kwargs=kwargs))
+        self.assertTrue('immutable' in resp['Cache-Control'])
+        self.assertFalse(learn_cache_key.called)
+
+    def test_topojson_tiles(self):
+        # lat/lon roughly: 0 to 0.17
+        resp = self.client.get(reverse(
+            'geo:topojson_tiles',
+            kwargs={'zoom': 11, 'xtile': 1024, 'ytile': 1024}),
+            data={'geo_types': '3'})
+        self.assertEqual(resp['Content-Type'], 'application/json')
+        resp = json.loads(resp.content)
+        self.assertEqual(resp['type'], 'Topology')
+        self.assertEqual(len(resp['objects']['geos']['geometries']), 3)
+        # Clipped to the tile, plus a buffer
+        for arc in resp['arcs']:
+            x = y = 0
+            for dx, dy in arc:
+                x, y = x + dx, y + dy
+                self.assertTrue(-64 <= x <= 4160 and -64 <= y <= 4160)
+
     @patch('geo.views.SearchQuerySet')
     def test_search_name(self, SQS):
         SQS = SQS.return_value.models.return_value.load_all.return_value
@@ -113,27 +248,342 @@ class ViewTest(TestCase):
         self.assertTrue('text_auto' in str(SQS.filter.call_args))
 
 
+class MVTTest(TestCase):
+    def test_encode_geometry(self):
+        # A square covering the top-left quarter of tile 0/0/0, wound the
+        # wrong way; it should be reversed
+        project = mvt.TileProjection(0, 0, 0, extent=4)
+        square = Polygon(((-180, 0), (0, 0), (0, 85), (-180, 85),
+                          (-180, 0)))
+        commands = mvt.encode_geometry(MultiPolygon(square), project)
+        self.assertEqual(commands, [
+            9, 0, 0,            # MoveTo(0, 0)
+            26, 4, 0, 0, 4,     # LineTo(2, 0), (2, 2)
+            3, 0,               # ...(0, 2)
+            15])                # ClosePath
+        self.assertEqual(mvt._ring_area([(0, 2), (2, 2), (2, 0), (0, 0)]),
+                         -8)
+
+    def test_collapsed_rings(self):
+        # Too small to appear in a tile
+        project = mvt.TileProjection(0, 0, 0)
+        sliver = Polygon(((0, 0), (0.001, 0), (0.001, 0.001), (0, 0)))
+        self.assertEqual(mvt.encode_geometry(sliver, project), [])
+
+    def test_encode_tile(self):
+        tile = mvt.encode_tile({'geos': [
+            ([9, 0, 0, 26, 2, 0, 0, 2, 1, 0, 15],
+             {'name': 'Some County', 'geoType': 2, 'maxlat': 4.5,
+              'tract': None})]})
+        self.assertTrue('geos' in tile)
+        self.assertTrue('Some County' in tile)
+        self.assertTrue('maxlat' in tile)
+        self.assertFalse('tract' in tile)
+
+
+class TopoJSONTest(TestCase):
+    def test_find_junctions(self):
+        # Two squares sharing an edge; the edge's ends are junctions
+        left = [(0, 0), (1, 0), (1, 1), (0, 1), (0, 0)]
+        right = [(1, 0), (2, 0), (2, 1), (1, 1), (1, 0)]
+        self.assertEqual(topojson.find_junctions([left, right]),
+                         set([(1, 0), (1, 1)]))
+        self.assertEqual(topojson.cut(left, set([(1, 0), (1, 1)])),
+                         [[(1, 0), (1, 1)], [(1, 1), (0, 1), (0, 0), (1, 0)]])
+        # No junctions; starts from the least point
+        self.assertEqual(topojson.cut(right, set()),
+                         [[(1, 0), (2, 0), (2, 1), (1, 1), (1, 0)]])
+
+    def test_encode_tile(self):
+        left = MultiPolygon(Polygon(((0, 0), (1, 0), (1, 1), (0, 1),
+                                     (0, 0))))
+        right = MultiPolygon(Polygon(((1, 0), (2, 0), (2, 1), (1, 1),
+                                      (1, 0))))
+        sliver = MultiPolygon(Polygon(((3, 3), (3.0001, 3), (3, 3.0001),
+                                       (3, 3))))
+        tile = json.loads(topojson.encode_tile(
+            [(left, {'name': 'Left'}), (right, {'name': 'Right'}),
+             (sliver, {'name': 'Sliver'})], (0, 0, 4, 4)))
+        self.assertEqual(tile['transform'], {'scale': [4 / 4096.0] * 2,
+                                             'translate': [0, 0]})
+        # The shared edge is stored once, and used backwards by the right
+        self.assertEqual(3, len(tile['arcs']))
+        self.assertEqual(tile['arcs'][0], [[1024, 0], [0, 1024]])
+        left, right, sliver = tile['objects']['geos']['geometries']
+        self.assertEqual(left['arcs'], [[[0, 1]]])
+        self.assertEqual(right['arcs'], [[[2, ~0]]])
+        self.assertEqual(right['properties'], {'name': 'Right'})
+        self.assertEqual(sliver['type'], None)
+
+
+class TileCacheTest(TestCase):
+    fixtures = ['many_tracts']
+
+    def setUp(self):
+        results_cache().clear()
+
+    def test_states_within(self):
+        self.assertEqual(['11'], tilecache.states_within((0.5, 0.5, 2, 2)))
+        self.assertEqual([], tilecache.states_within((2, 2, 3, 3)))
+
+    def test_tile_key(self):
+        key = tilecache.tile_key(9, 10, 11, [3, 2, 3], 'mvt', version=4)
+        self.assertEqual(key, 'tile:4:mvt:9/10/11:2,3')
+
+    @patch('geo.tilecache.tile_cache')
+    def test_set_tile(self, tile_cache):
+        variants = tilecache.set_tile('key', u'{"geos": []}')
+        tile_cache.return_value.set.assert_called_with('key', variants)
+        self.assertEqual(compression.gzip_decompress(variants['gzip']),
+                         '{"geos": []}')
+
+
 class PrecacheTest(TestCase):
+    fixtures = ['many_tracts', 'test_counties']
+
+    def setUp(self):
+        results_cache().clear()
+        self.tempdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    @patch('geo.management.commands.precache_geos.cache_tile')
+    def test_handle(self, cache_tile):
+        call_command('precache_geos', min_zoom=9, max_zoom=9,
+                     geo_types='3', processes=1, stdout=Mock())
+        # Only tiles overlapping the tracts
+        self.assertEqual(15, cache_tile.call_count)
+        self.assertTrue(((9, 256, 256, [3], 'geojson'), {})
+                        in cache_tile.call_args_list)
+
+        # Tracts aren't shown at zoom 8
+        cache_tile.reset_mock()
+        call_command('precache_geos', min_zoom=8, max_zoom=8,
+                     geo_types='3', processes=1, stdout=Mock())
+        self.assertEqual(0, cache_tile.call_count)
+
+    @patch('geo.management.commands.precache_geos.cache_tile')
+    def test_handle_checkpoint(self, cache_tile):
+        checkpoint = os.path.join(self.tempdir, 'checkpoint')
+        with open(checkpoint, 'w') as f:
+            f.write(checkpoint_header('geojson', [3]) + '\n')
+            f.write('9/256/256\n9/257/256\n')
+        call_command('precache_geos', min_zoom=9, max_zoom=9,
+                     geo_types='3', processes=1, checkpoint=checkpoint,
+                     stdout=Mock())
+        self.assertEqual(13, cache_tile.call_count)
+        self.assertFalse(((9, 256, 256, [3], 'geojson'), {})
+                         in cache_tile.call_args_list)
+        with open(checkpoint) as f:
+            self.assertEqual(16, len(f.readlines()))
+
+        # Other formats, or reloaded shapes, start over
+        cache_tile.reset_mock()
+        call_command('precache_geos', min_zoom=9, max_zoom=9,
+                     geo_types='3', format='mvt', processes=1,
+                     checkpoint=checkpoint, stdout=Mock())
+        self.assertEqual(15, cache_tile.call_count)
+        cache_tile.reset_mock()
+        versions.bump(versions.GEO, ['11'])
+        call_command('precache_geos', min_zoom=9, max_zoom=9,
+                     geo_types='3', format='mvt', processes=1,
+                     checkpoint=checkpoint, stdout=Mock())
+        self.assertEqual(15, cache_tile.call_count)
+        with open(checkpoint) as f:
+            self.assertEqual(checkpoint_header('mvt', [3]), f.readline()[:-1])
+            self.assertEqual(15, len(f.readlines()))
+
+    @patch('geo.management.commands.precache_geos.tile_cache')
+    def test_handle_unshared(self, tile_cache):
+        tile_cache.return_value = LocMemCache('tiles', {})
+        self.assertRaises(CommandError, call_command, 'precache_geos',
+                          processes=1, stdout=Mock())
+
+    def test_tiles_covering(self):
+        self.assertEqual(39, len(tiles_covering(9, [2, 3, 4])))
+        self.assertEqual(set(), tiles_covering(8, [2, 3]))
+
+    def test_to_tile(self):
+        self.assertEqual((256, 256), (to_xtile(9, 0.1), to_ytile(9, -0.1)))
+        self.assertEqual((0, 0), (to_xtile(3, -200), to_ytile(3, 89)))
+        for zoom, xtile, ytile in ((11, 1001, 1046), (12, 1000, 1600)):
+            lon, lat = to_lon(zoom, xtile + .5), to_lat(zoom, ytile + .5)
+            self.assertEqual((xtile, ytile),
+                             (to_xtile(zoom, lon), to_ytile(zoom, lat)))
+
+
+class ExportTilesTest(TestCase):
+    fixtures = ['many_tracts', 'test_counties']
+
     def setUp(self):
-        self.original_urls = Precache.urls
+        self.tempdir = tempfile.mkdtemp()
 
     def tearDown(self):
-        Precache.urls = self.original_urls
+        shutil.rmtree(self.tempdir)
+
+    def test_directory(self):
+        call_command('export_tiles', self.tempdir, min_zoom=9, max_zoom=9,
+                     geo_types='3', processes=1, compress=['gzip'],
+                     stdout=Mock())
+        path = os.path.join(self.tempdir, '9', '256', '256.json')
+        with open(path) as f:
+            self.assertEqual(3, len(json.load(f)['features']))
+        with gzip.open(path + '.gz') as f:
+            self.assertEqual(3, len(json.load(f)['features']))
+        self.assertFalse(os.path.exists(
+            os.path.join(self.tempdir, '9', '200')))
+
+    def test_mbtiles(self):
+        path = os.path.join(self.tempdir, 'tiles.mbtiles')
+        call_command('export_tiles', path, min_zoom=9, max_zoom=9,
+                     geo_types='3', processes=1, format='mvt', stdout=Mock())
+        db = sqlite3.connect(path)
+        metadata = dict(db.execute("SELECT name, value FROM metadata"))
+        self.assertEqual('pbf', metadata['format'])
+        self.assertEqual(
+            15, db.execute("SELECT COUNT(*) FROM tiles").fetchone()[0])
+        # Rows are flipped
+        tile_data = db.execute(
+            "SELECT tile_data FROM tiles WHERE zoom_level = 9 "
+            "AND tile_column = 256 AND tile_row = 255").fetchone()[0]
+        self.assertTrue('1122233300' in str(tile_data))
+        db.close()
+
+
+class SimplifiedGeoTest(TestCase):
+    def test_band_for(self):
+        self.assertEqual(0, SimplifiedGeo.band_for(7))
+        self.assertEqual(9, SimplifiedGeo.band_for(9))
+        self.assertEqual(9, SimplifiedGeo.band_for(10))
+        self.assertEqual(11, SimplifiedGeo.band_for(12))
+        self.assertEqual(13, SimplifiedGeo.band_for(18))
 
-    @patch('geo.management.commands.precache_geos.Client')
-    def test_handle_with_args(self, client):
-        Precache.urls['geo:tiles'] = range(3, 6)
-        Precache().handle('3', '5')
-        self.assertEqual(3, client.return_value.get.call_count)
+    def test_tolerance_for(self):
+        # More detailed bands have lower tolerances; the last keeps all
+        tolerances = [SimplifiedGeo.tolerance_for(band)
+                      for band in SimplifiedGeo.ZOOM_BANDS]
+        self.assertEqual(tolerances, sorted(tolerances, reverse=True))
+        self.assertEqual(0.0, tolerances[-1])
 
-    @patch('geo.management.commands.precache_geos.Client')
-    def test_handle_no_args(self, client):
-        Precache.urls['geo:tiles'] = range(3, 6)
-        Precache().handle()
-        self.assertEqual(22, client.return_value.get.call_count)
+    def test_precision_for(self):
+        # Zoom 10: 256 * 1024 / 360 ~= 728 pixels per degree
+        self.assertEqual(4, SimplifiedGeo.precision_for(9))
+        precisions = [SimplifiedGeo.precision_for(band)
+                      for band in SimplifiedGeo.ZOOM_BANDS]
+        self.assertEqual(precisions, sorted(precisions))
+
+    def test_rounded_geojson(self):
+        square = MultiPolygon(Polygon(((0, 0), (0, 1.23456789),
+                                       (1, 1.23456789), (0, 0))))
+        self.assertEqual(json.loads(rounded_geojson(square, 3)), {
+            'type': 'MultiPolygon',
+            'coordinates': [[[[0, 0], [0, 1.235], [1, 1.235], [0, 0]]]]})
+
+
+class SimplifyGeosTest(TestCase):
+    fixtures = ['many_tracts', 'test_counties']
+
+    def test_handle(self):
+        command = Simplify()
+        command.stdout = Mock()
+        command.handle()
+        self.assertEqual(SimplifiedGeo.objects.count(),
+                         6 * len(SimplifiedGeo.ZOOM_BANDS))
+        simplified = SimplifiedGeo.objects.get(geo_id='11222', min_zoom=13)
+        self.assertEqual(json.loads(simplified.geojson)['type'],
+                         'MultiPolygon')
+
+        # Running again replaces rather than duplicates
+        command.handle()
+        self.assertEqual(SimplifiedGeo.objects.count(),
+                         6 * len(SimplifiedGeo.ZOOM_BANDS))
+
+    def test_handle_geo_types(self):
+        command = Simplify()
+        command.stdout = Mock()
+        command.handle('2')
+        self.assertEqual(SimplifiedGeo.objects.count(),
+                         2 * len(SimplifiedGeo.ZOOM_BANDS))
+
+
+class FiltersTest(TestCase):
+    def test_parse_bbox(self):
+        bbox = filters.parse_bbox('-1,2.5,3,4')
+        self.assertEqual((-1, 2.5, 3, 4), bbox.extent)
+        self.assertEqual(4269, bbox.srid)
+        self.assertRaises(ValueError, filters.parse_bbox, '1,2,3')
+        self.assertRaises(ValueError, filters.parse_bbox, '1,2,3,a')
+        self.assertRaises(ValueError, filters.parse_bbox, '3,2,1,4')
+
+    def test_tract_filters(self):
+        self.assertEqual(None, filters.tract_filters({}))
+        self.assertEqual(None, filters.tract_filters({'state_fips': '11'}))
+        self.assertEqual(
+            {'geoid__state': '11', 'geoid__county': '222'},
+            filters.tract_filters({'state_fips': '11', 'county_fips': '222',
+                                   'cbsa': '12345'}))
+        self.assertEqual(
+            {'cbsa': '12345', 'geo_type': Geo.TRACT_TYPE},
+            filters.tract_filters({'cbsa': '12345'}, prefix=''))
+        area = filters.tract_filters({'bbox': '0,0,1,1'})
+        self.assertEqual(Geo.TRACT_TYPE, area['geoid__geo_type'])
+        self.assertEqual((0, 0, 1, 1),
+                         area['geoid__geom__intersects'].extent)
 
 
 class LoadGeosFromTest(TestCase):
+    fixtures = ['many_tracts', 'test_counties']
+
+    def test_manifest_key(self):
+        command = LoadGeos()
+        self.assertEqual(('geo_tract', 2013, '17'), command.manifest_key(
+            '/tmp/tl_2013_17_tract.shp'))
+        self.assertEqual(('geo_county', 2013, 'us'), command.manifest_key(
+            'tl_2013_us_county.shp'))
+        self.assertEqual(None, command.manifest_key('/tmp/shapes.shp'))
+
+    def test_save_batch(self):
+        command = LoadGeos()
+        field_names = ('GEOID', 'NAME', 'STATEFP', 'COUNTYFP', 'TRACTCE',
+                       'INTPTLAT', 'INTPTLON')
+        square = Polygon(((0, 0), (0, 1), (1, 1), (0, 0)))
+        unchanged = command.process_row(
+            ('1122233300', '333', '11', '222', '33300', '0.5', '0.5',
+             square), field_names)
+        renamed = command.process_row(
+            ('1122233400', 'Renamed', '11', '222', '33400', '0.5', '0.5',
+             square), field_names)
+        new = command.process_row(
+            ('1122233700', '337', '11', '222', '33700', '0.5', '0.5',
+             square), field_names)
+        SimplifiedGeo.objects.create(
+            geo_id='1122233300', min_zoom=0, geojson='{}',
+            geom=MultiPolygon(square))
+        SimplifiedGeo.objects.create(
+            geo_id='1122233400', min_zoom=0, geojson='{}',
+            geom=MultiPolygon(square))
+
+        self.assertEqual([new, renamed],
+                         command.save_batch([unchanged, renamed, new]))
+        self.assertEqual('Renamed', Geo.objects.get(pk='1122233400').name)
+        self.assertTrue(Geo.objects.filter(pk='1122233700').exists())
+        # Only the changed shape's simplifications are dropped
+        self.assertEqual(['1122233300'], list(
+            SimplifiedGeo.objects.values_list('geo_id', flat=True)))
+        self.assertEqual([], command.save_batch([unchanged, renamed, new]))
+
+    def test_fill_tract_metros(self):
+        Geo.objects.filter(geoid='11222').update(cbsa='12345', csa='090')
+        LoadGeos().fill_tract_metros()
+        tracts = Geo.objects.filter(geo_type=Geo.TRACT_TYPE)
+        self.assertTrue(tracts.filter(state='11', county='222').exists())
+        for tract in tracts:
+            if (tract.state, tract.county) == ('11', '222'):
+                self.assertEqual(('12345', '090'), (tract.cbsa, tract.csa))
+            else:
+                self.assertEqual((None, None), (tract.cbsa, tract.csa))
+
     def test_census_tract(self):
         row = ('1122233333', 'Tract 33333', '11', '222', '33333', '-45',
                '45', Polygon(((0, 0), (0, 2), (-1, 2), (0, 0))))
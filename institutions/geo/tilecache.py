@@ -0,0 +1,64 @@
+"""The tile cache. Tiles are stored compressed (gzip, and brotli if
+available; see batch.compression), as raw bytes rather than as pickled
+responses, so a shared cache (memcached, redis) holds several times as many
+of them and they can be sent to clients as-is. Keys name the versions of the
+states' shapes the tile covers, format, z/x/y and geo types; reloading a
+state's shapes changes its version, so its stale tiles are simply never read
+again and age out of the cache (see batch.versions)."""
+from django.core.cache import get_cache
+from django.db.models import Max, Min
+
+from batch import compression, versions
+from batch.coalesce import results_cache
+from geo.models import Geo
+
+
+def tile_cache():
+    return get_cache('long_term_geos')
+
+
+def state_extents():
+    """(minlon, minlat, maxlon, maxlat) of each state's loaded shapes. One
+    aggregate query, cached until any shapes are loaded"""
+    key = 'geo:state_extents:%s' % versions.versions(versions.GEO)
+    cache = results_cache()
+    extents = cache.get(key)
+    if extents is None:
+        extents = dict(
+            (row['state'], (row['minlon'], row['minlat'], row['maxlon'],
+                            row['maxlat']))
+            for row in Geo.objects.exclude(state=None).values('state')
+            .annotate(minlon=Min('minlon'), minlat=Min('minlat'),
+                      maxlon=Max('maxlon'), maxlat=Max('maxlat')))
+        cache.set(key, extents)
+    return extents
+
+
+def states_within(bounds):
+    """States with shapes which may overlap the (minlon, minlat, maxlon,
+    maxlat) bounds"""
+    minlon, minlat, maxlon, maxlat = bounds
+    return [state for state, extent in state_extents().items()
+            if extent[0] <= maxlon and extent[2] >= minlon
+            and extent[1] <= maxlat and extent[3] >= minlat]
+
+
+def tile_key(zoom, xtile, ytile, geo_types, fmt, version):
+    """geo_types should already exclude types which won't be shown at this
+    zoom level (see geo.views.tile_geo_types), as they don't affect the
+    tile. version is that of the shapes the tile covers"""
+    return 'tile:%s:%s:%d/%d/%d:%s' % (
+        version, fmt, zoom, xtile, ytile,
+        ','.join(str(t) for t in sorted(set(geo_types))))
+
+
+def get_tile(key):
+    """The tile's compressed variants ({encoding: bytes}), or None"""
+    return tile_cache().get(key)
+
+
+def set_tile(key, content):
+    """Store a rendered tile, returning its compressed variants"""
+    variants = compression.compress(content)
+    tile_cache().set(key, variants)
+    return variants
@@ -0,0 +1,149 @@
+"""A small TopoJSON encoder for tiles. Coordinates are quantized to a grid
+over the tile, then each ring is cut into arcs wherever it meets (or parts
+from) another ring, so a boundary shared by neighbouring tracts or counties
+is stored once. Arcs are simplified after being cut, so neighbours still meet
+exactly. See https://github.com/topojson/topojson-specification"""
+import json
+
+from django.contrib.gis.geos import LineString
+
+from geo import mvt
+
+
+#   Grid cells per tile side; plenty for a 256 pixel tile
+QUANTIZATION = 4096
+
+
+class Quantizer(object):
+    """Converts lon/lat into integer positions on a grid over the bounds"""
+    def __init__(self, bounds, quantization=QUANTIZATION):
+        minlon, minlat, maxlon, maxlat = bounds
+        self.translate = (minlon, minlat)
+        self.scale = ((maxlon - minlon) / float(quantization),
+                      (maxlat - minlat) / float(quantization))
+
+    def __call__(self, lon, lat):
+        return (int(round((lon - self.translate[0]) / self.scale[0])),
+                int(round((lat - self.translate[1]) / self.scale[1])))
+
+    def transform(self):
+        return {'scale': list(self.scale), 'translate': list(self.translate)}
+
+
+def quantize_ring(ring, quantize):
+    """The ring's grid points, dropping those which land on the previous
+    one. The ring stays closed (last point == first)"""
+    points = []
+    for lon, lat in ring:
+        point = quantize(lon, lat)
+        if not points or points[-1] != point:
+            points.append(point)
+    return points
+
+
+def find_junctions(rings):
+    """Points where rings meet or part, i.e. which are reached from
+    different neighbours in different places. Arcs start and end at these"""
+    neighbours, junctions = {}, set()
+    for ring in rings:
+        last = len(ring) - 1    # ring[last] repeats ring[0]
+        for idx in range(last):
+            pair = frozenset((ring[idx - 1 if idx else last - 1],
+                              ring[idx + 1]))
+            seen = neighbours.setdefault(ring[idx], pair)
+            if seen != pair:
+                junctions.add(ring[idx])
+    return junctions
+
+
+def cut(ring, junctions):
+    """Split a closed ring into arcs at its junctions. A ring without any is
+    a single arc, rotated to start at its least point so that the same ring
+    elsewhere (e.g. an island and the hole it fills) produces the same arc"""
+    points = ring[:-1]
+    starts = [idx for idx, point in enumerate(points) if point in junctions]
+    if not starts:
+        start = points.index(min(points))
+        points = points[start:] + points[:start]
+        return [points + points[:1]]
+    count = len(points)
+    return [[points[idx % count] for idx in range(start, end + 1)]
+            for start, end in zip(starts, starts[1:] + [starts[0] + count])]
+
+
+class Arcs(object):
+    """Each distinct arc, stored once. An arc which is the reverse of one
+    already seen is referred to by the ones' complement of its index"""
+    def __init__(self):
+        self.arcs, self.index = [], {}
+
+    def add(self, arc):
+        key = tuple(arc)
+        if key in self.index:
+            return self.index[key]
+        reverse = tuple(reversed(arc))
+        if reverse in self.index:
+            return ~self.index[reverse]
+        self.index[key] = len(self.arcs)
+        self.arcs.append(arc)
+        return self.index[key]
+
+
+def simplify(arc, tolerance):
+    """Douglas-Peucker, in grid units. Endpoints are kept, so arcs still
+    join; closed arcs (whole rings) which would collapse are left alone"""
+    if tolerance <= 0 or len(arc) <= 2:
+        return arc
+    simplified = [(int(x), int(y)) for x, y in
+                  LineString(arc).simplify(tolerance).coords]
+    if arc[0] == arc[-1] and len(simplified) < 4:
+        return arc
+    return simplified
+
+
+def delta_encode(arc):
+    """Each position after the first is relative to the one before it"""
+    encoded, last_x, last_y = [], 0, 0
+    for x, y in arc:
+        encoded.append([x - last_x, y - last_y])
+        last_x, last_y = x, y
+    return encoded
+
+
+def encode_tile(shapes, bounds, tolerance=0.0):
+    """Encode (geometry, properties) pairs as a topology with a single
+    "geos" object. Geometries are (multi)polygons in lon/lat, or whatever
+    clipping them produced; tolerance is (roughly) in degrees. Shapes which
+    are too small to appear keep their properties but have no geometry"""
+    quantize = Quantizer(bounds)
+    quantized = []
+    for geom, properties in shapes:
+        rings_per_polygon = []
+        for polygon in mvt.polygons(geom):
+            rings = [quantize_ring(ring, quantize)
+                     for ring in polygon.coords]
+            if len(rings[0]) >= 4:      # else the exterior collapsed
+                rings_per_polygon.append(
+                    [ring for ring in rings if len(ring) >= 4])
+        quantized.append((rings_per_polygon, properties))
+
+    junctions = find_junctions(ring for polygons, _ in quantized
+                               for rings in polygons for ring in rings)
+    arcs, geometries = Arcs(), []
+    for polygons, properties in quantized:
+        geometry = {'type': None, 'properties': properties}
+        if polygons:
+            geometry['type'] = 'MultiPolygon'
+            geometry['arcs'] = [
+                [[arcs.add(arc) for arc in cut(ring, junctions)]
+                 for ring in rings] for rings in polygons]
+        geometries.append(geometry)
+
+    grid_tolerance = tolerance / quantize.scale[0]
+    return json.dumps({
+        'type': 'Topology',
+        'transform': quantize.transform(),
+        'objects': {'geos': {'type': 'GeometryCollection',
+                             'geometries': geometries}},
+        'arcs': [delta_encode(simplify(arc, grid_tolerance))
+                 for arc in arcs.arcs]})
@@ -4,5 +4,20 @@ urlpatterns = patterns(
     '',
     url(r'tiles/(?P<zoom>\d+)/(?P<xtile>\d+)/(?P<ytile>\d+)$',
         'geo.views.tile', name='tiles'),
+    url(r'tiles/(?P<zoom>\d+)/(?P<xtile>\d+)/(?P<ytile>\d+)\.mvt$',
+        'geo.views.tile', {'fmt': 'mvt'}, name='vector_tiles'),
+    url(r'tiles/(?P<zoom>\d+)/(?P<xtile>\d+)/(?P<ytile>\d+)\.topojson$',
+        'geo.views.tile', {'fmt': 'topojson'}, name='topojson_tiles'),
+    #   Versioned (see geo.views.tile_url_version), so cacheable forever
+    url(r'tiles/v(?P<version>\d+)/(?P<zoom>\d+)/(?P<xtile>\d+)/'
+        + r'(?P<ytile>\d+)$',
+        'geo.views.tile', name='versioned_tiles'),
+    url(r'tiles/v(?P<version>\d+)/(?P<zoom>\d+)/(?P<xtile>\d+)/'
+        + r'(?P<ytile>\d+)\.mvt$',
+        'geo.views.tile', {'fmt': 'mvt'}, name='versioned_vector_tiles'),
+    url(r'tiles/v(?P<version>\d+)/(?P<zoom>\d+)/(?P<xtile>\d+)/'
+        + r'(?P<ytile>\d+)\.topojson$',
+        'geo.views.tile', {'fmt': 'topojson'},
+        name='versioned_topojson_tiles'),
     url(r'search/?$', 'geo.views.search', name='search'),
 )
@@ -1,9 +1,8 @@
 import math
 
-from django.conf import settings
-from django.db.models import Q
-from django.http import HttpResponse, HttpResponseBadRequest
-from django.views.decorators.cache import cache_page
+from django.contrib.gis.geos import Polygon
+from django.views.decorators.http import condition
+from django.views.decorators.vary import vary_on_headers
 from haystack.inputs import AutoQuery
 from haystack.query import SearchQuerySet
 from rest_framework import serializers
@@ -11,7 +10,17 @@ from rest_framework.decorators import api_view, renderer_classes
 from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 
-from geo.models import Geo
+from batch import versions
+from batch.compression import encoded_response, encoding_etag
+from geo import mvt, tilecache, topojson
+from geo.models import Geo, SimplifiedGeo
+
+
+MVT_CONTENT_TYPE = 'application/vnd.mapbox-vector-tile'
+#   Web mercator can't represent the poles
+MAX_LAT = 85.0511
+#   How long browsers and CDNs may keep tiles fetched by versioned URL
+IMMUTABLE_MAX_AGE = 60*60*24*365     # 1 year
 
 
 def to_lat(zoom, ytile):
@@ -27,10 +36,203 @@ def to_lon(zoom, xtile):
     return xtile / n * 360.0 - 180.0
 
 
-@cache_page(settings.LONGTERM_CACHE_TIMEOUT, cache='long_term_geos')
-def tile(request, zoom, xtile, ytile):
+def to_xtile(zoom, lon):
+    """The x index of the tile containing this longitude"""
+    n = 2 ** zoom
+    return min(n - 1, max(0, int((lon + 180.0) / 360.0 * n)))
+
+
+def to_ytile(zoom, lat):
+    """The y index of the tile containing this latitude"""
+    n = 2 ** zoom
+    lat_rad = math.radians(max(-MAX_LAT, min(MAX_LAT, lat)))
+    ytile = (1 - math.log(math.tan(lat_rad) + 1 / math.cos(lat_rad))
+             / math.pi) / 2 * n
+    return min(n - 1, max(0, int(ytile)))
+
+
+def tile_bounds(zoom, xtile, ytile):
+    """The (minlon, minlat, maxlon, maxlat) of a /z/x/y tile"""
+    return (to_lon(zoom, xtile), to_lat(zoom, ytile + 1),
+            to_lon(zoom, xtile + 1), to_lat(zoom, ytile))
+
+
+def tile_geo_types(geo_types, zoom):
+    """Remove census tracts and counties from high zoom levels"""
+    if zoom <= 6:
+        return []
+    if zoom <= 8:
+        return [t for t in geo_types if t not in (2, 3)]
+    return geo_types
+
+
+def tile_shapes(zoom, xtile, ytile, geo_types):
+    """All shapes of the requested types which touch the tile, including
+    those which cover it entirely. The spatial (GiST) index on geom makes
+    this a single scan. Full geometries are deferred, as they are only needed
+    for shapes which haven't been simplified ahead of time (see the
+    simplify_geos command)"""
+    bounds = Polygon.from_bbox(tile_bounds(zoom, xtile, ytile))
+    bounds.srid = 4269
+    return list(Geo.objects.filter(
+        geo_type__in=tile_geo_types(geo_types, zoom),
+        geom__intersects=bounds).defer('geom'))
+
+
+def simplified_for(shapes, zoom, field):
+    """Look up the precomputed field (geojson or geom) for each shape"""
+    return dict(SimplifiedGeo.objects.filter(
+        min_zoom=SimplifiedGeo.band_for(zoom),
+        geo__in=[shape.geoid for shape in shapes]
+    ).values_list('geo_id', field))
+
+
+def geojson_tile(zoom, xtile, ytile, geo_types):
+    """Render a tile as a GeoJSON FeatureCollection string"""
+    shapes = tile_shapes(zoom, xtile, ytile, geo_types)
+    simplified = simplified_for(shapes, zoom, 'geojson')
+
+    # We already have the json strings per model pre-computed, so just place
+    # them inside a static response
+    response = '{"crs": {"type": "link", "properties": {"href": '
+    response += '"http://spatialreference.org/ref/epsg/4326/", "type": '
+    response += '"proj4"}}, "type": "FeatureCollection", "features": [%s]}'
+    return response % ', '.join(
+        shape.as_geojson(simplified.get(shape.geoid)) for shape in shapes)
+
+
+def vector_tile(zoom, xtile, ytile, geo_types):
+    """Render a tile as a Mapbox Vector Tile, with a single "geos" layer.
+    Vector tiles have no list values, so geoType is just the type's id"""
+    shapes = tile_shapes(zoom, xtile, ytile, geo_types)
+    simplified = simplified_for(shapes, zoom, 'geom')
+    clip = mvt.clip_bounds(*tile_bounds(zoom, xtile, ytile))
+    project = mvt.TileProjection(zoom, xtile, ytile)
+
+    features = []
+    for shape in shapes:
+        geom = simplified.get(shape.geoid)
+        if geom is None:
+            geom = shape.geom.simplify(preserve_topology=True)
+        properties = shape.feature_properties()
+        properties['geoType'] = shape.geo_type
+        geometry = mvt.encode_geometry(geom.intersection(clip), project)
+        features.append((geometry, properties))
+    return mvt.encode_tile({'geos': features})
+
+
+def topojson_tile(zoom, xtile, ytile, geo_types):
+    """Render a tile as TopoJSON, with a single "geos" object. Boundaries
+    shared by neighbouring shapes are stored (and simplified) once, so the
+    topology is built from the full shapes rather than their independently
+    simplified versions. The database clips those to the tile (plus a
+    buffer), so only the part of each shape inside it is loaded"""
+    bounds = tile_bounds(zoom, xtile, ytile)
+    clip = mvt.clip_bounds(*bounds)
+    shapes = Geo.objects.filter(
+        geo_type__in=tile_geo_types(geo_types, zoom),
+        geom__intersects=clip).defer('geom').intersection(clip)
+    tolerance = SimplifiedGeo.tolerance_for(SimplifiedGeo.band_for(zoom))
+    return topojson.encode_tile(
+        [(shape.intersection, shape.feature_properties())
+         for shape in shapes], bounds, tolerance)
+
+
+def tiles_covering(zoom, geo_types):
+    """All (x, y) tiles at this zoom level which overlap the extent of some
+    loaded geo of the requested types. Tiles with nothing in them needn't be
+    rendered ahead of time"""
+    tiles = set()
+    geo_types = tile_geo_types(geo_types, zoom)
+    extents = Geo.objects.filter(geo_type__in=geo_types).values_list(
+        'minlon', 'minlat', 'maxlon', 'maxlat')
+    for minlon, minlat, maxlon, maxlat in extents:
+        for xtile in range(to_xtile(zoom, minlon),
+                           to_xtile(zoom, maxlon) + 1):
+            # y tiles count down from the north
+            for ytile in range(to_ytile(zoom, maxlat),
+                               to_ytile(zoom, minlat) + 1):
+                tiles.add((xtile, ytile))
+    return tiles
+
+
+TILE_RENDERERS = {'geojson': geojson_tile, 'mvt': vector_tile,
+                  'topojson': topojson_tile}
+TILE_CONTENT_TYPES = {'geojson': 'application/json', 'mvt': MVT_CONTENT_TYPE,
+                      'topojson': 'application/json'}
+
+
+def tile_cache_key(zoom, xtile, ytile, geo_types, fmt):
+    """Geo types which won't be shown at this zoom level don't affect the
+    tile, so leave them out of the key. The tile is stale once shapes in any
+    state it covers are reloaded"""
+    geo_types = tile_geo_types(geo_types, zoom)
+    states = []
+    if geo_types:
+        states = tilecache.states_within(tile_bounds(zoom, xtile, ytile))
+    return tilecache.tile_key(zoom, xtile, ytile, geo_types, fmt,
+                              versions.versions(versions.GEO, states))
+
+
+def cache_tile(zoom, xtile, ytile, geo_types, fmt='geojson'):
+    """Render a tile and store it in the tile cache, replacing whatever was
+    there. Used when pre-warming the cache. Returns the compressed variants
+    (see batch.compression)"""
+    content = TILE_RENDERERS[fmt](zoom, xtile, ytile, geo_types)
+    return tilecache.set_tile(
+        tile_cache_key(zoom, xtile, ytile, geo_types, fmt), content)
+
+
+def cached_tile(zoom, xtile, ytile, geo_types, fmt='geojson'):
+    """Fetch a tile's compressed variants from the tile cache, rendering it
+    if needed"""
+    variants = tilecache.get_tile(
+        tile_cache_key(zoom, xtile, ytile, geo_types, fmt))
+    if variants is None:
+        return cache_tile(zoom, xtile, ytile, geo_types, fmt)
+    return variants
+
+
+def tile_url_version():
+    """Tile URLs may include this version of the shapes, which changes
+    whenever any are loaded. The tiles under the current version won't
+    change, so they may be cached forever"""
+    return versions.versions(versions.GEO)
+
+
+def request_geo_types(request):
+    """Defaults to county, tract, and metro"""
+    geo_types_str = request.GET.get('geo_types', '2,3,4').split(',')
+    return [int(s.strip()) for s in geo_types_str if s.strip().isdigit()]
+
+
+def request_format(request, fmt):
+    """As named by the url's extension (.mvt, .topojson). Otherwise, vector
+    tiles if they are the accepted type, else GeoJSON"""
+    if fmt:
+        return fmt
+    if MVT_CONTENT_TYPE in request.META.get('HTTP_ACCEPT', ''):
+        return 'mvt'
+    return 'geojson'
+
+
+def tile_etag(request, zoom, xtile, ytile, fmt=None, version=None):
+    """Changes along with the tile's cache key (and differs per encoding),
+    so unchanged tiles can be confirmed (304) without fetching them from the
+    cache"""
+    return encoding_etag(request, versions.etag(tile_cache_key(
+        int(zoom), int(xtile), int(ytile), request_geo_types(request),
+        request_format(request, fmt))))
+
+
+@vary_on_headers('Accept')
+@condition(etag_func=tile_etag)
+def tile(request, zoom, xtile, ytile, fmt=None, version=None):
     """A geojson tile which will load the types of geos requested, defaulting
-    to county, tract, and metro.
+    to county, tract, and metro. Vector tiles (protobuf) are returned instead
+    if the url ends in .mvt or they are the accepted type, and TopoJSON if
+    the url ends in .topojson. If the url names the current version of the
+    shapes (see tile_url_version), the tile may be cached forever.
 
     Much of the conversion logic is based on
     http://wiki.openstreetmap.org/wiki/Slippy_map_tilenames#Tile_numbers_to_lon..2Flat.
@@ -38,47 +240,25 @@ def tile(request, zoom, xtile, ytile):
     @todo: does it make sense to extend the bounds by a half/quarter in each
     direction?
     """
-    geo_types_str = request.GET.get('geo_types', '2,3,4').split(',')
-    geo_types = [int(s.strip()) for s in geo_types_str if s.strip().isdigit()]
+    geo_types = request_geo_types(request)
     #   Safe, due to reges
     zoom, xtile, ytile = int(zoom), int(xtile), int(ytile)
-    #   Remove census tracts and counties from high zoom levels
-    if zoom <= 8:
-        geo_types = [t for t in geo_types if t not in (2, 3)]
-    if zoom <= 6:
-        geo_types = []
-
-    minlon, maxlon = to_lon(zoom, xtile), to_lon(zoom, xtile + 1)
-    minlat, maxlat = to_lat(zoom, ytile + 1), to_lat(zoom, ytile)
-
-    try:
-        minlat, maxlat = float(minlat), float(maxlat)
-        minlon, maxlon = float(minlon), float(maxlon)
-    except ValueError:
-        return HttpResponseBadRequest(
-            "Bad or missing: one of minlat, maxlat, minlon, maxlon")
-
-    # check that any of the four points or center are inside the boundary
-    query = Q(minlat__gte=minlat, minlat__lte=maxlat,
-              minlon__gte=minlon, minlon__lte=maxlon)
-    query = query | Q(minlat__gte=minlat, minlat__lte=maxlat,
-                      maxlon__gte=minlon, maxlon__lte=maxlon)
-    query = query | Q(maxlat__gte=minlat, maxlat__lte=maxlat,
-                      minlon__gte=minlon, minlon__lte=maxlon)
-    query = query | Q(maxlat__gte=minlat, maxlat__lte=maxlat,
-                      maxlon__gte=minlon, maxlon__lte=maxlon)
-    query = query | Q(centlat__gte=minlat, centlat__lte=maxlat,
-                      centlon__gte=minlon, centlon__lte=maxlon)
-
-    shapes = Geo.objects.filter(geo_type__in=geo_types).filter(query)
 
-    # We already have the json strings per model pre-computed, so just place
-    # them inside a static response
-    response = '{"crs": {"type": "link", "properties": {"href": '
-    response += '"http://spatialreference.org/ref/epsg/4326/", "type": '
-    response += '"proj4"}}, "type": "FeatureCollection", "features": [%s]}'
-    response = response % ', '.join(shape.as_geojson() for shape in shapes)
-    return HttpResponse(response, content_type='application/json')
+    fmt = request_format(request, fmt)
+    # Tiles have their own cache (see geo.tilecache); keep them out of the
+    # site-wide one, which would store each for a year per request header
+    request._cache_update_cache = False
+    response = encoded_response(
+        request, cached_tile(zoom, xtile, ytile, geo_types, fmt),
+        TILE_CONTENT_TYPES[fmt])
+    if version is not None and version == tile_url_version():
+        response['Cache-Control'] = ('public, max-age=%d, immutable'
+                                     % IMMUTABLE_MAX_AGE)
+    else:
+        # Revalidated (see tile_etag) rather than kept for a fixed time, by
+        # browsers and the cache middleware alike
+        response['Cache-Control'] = 'max-age=0, must-revalidate'
+    return response
 
 
 class GeoSerializer(serializers.ModelSerializer):
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from batch import versions
+from dataload.models import StateLoad
+from hmda import partitions
+from hmda.management.commands.load_hmda import DATASET
+from hmda.models import HMDARecord, HMDARollup
+from respondants.models import Institution
+
+
+class Command(BaseCommand):
+    args = "<year> [year ...]"
+    help = """ Remove all HMDA records (and their aggregates) for some years.
+               Cheap when the table is partitioned by year."""
+
+    def handle(self, *args, **options):
+        if not args:
+            raise CommandError("Needs a first argument, " + Command.args)
+        for year in [int(year) for year in args]:
+            with transaction.atomic():
+                if not (partitions.is_partitioned()
+                        and partitions.drop_partition(year)):
+                    HMDARecord.objects.filter(as_of_year=year).delete()
+                HMDARollup.objects.filter(as_of_year=year).delete()
+                Institution.objects.count_loans(year)
+                StateLoad.objects.filter(dataset=DATASET, year=year).delete()
+            self.stdout.write("Dropped %d" % year)
+        versions.bump(versions.HMDA)
@@ -1,60 +1,288 @@
-from csv import reader
+from csv import reader, writer
+from multiprocessing import cpu_count, Pool
+from optparse import make_option
+import os
+import shutil
+import tempfile
+import time
 
 from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
 
+from batch import versions
+from dataload.manifest import Source
+from dataload.models import StateLoad
+from dataload.parallel import init_worker, line_ranges, read_lines
+from dataload.pgcopy import copy_in_chunks, model_columns
 from geo import errors
 from geo.models import Geo
-from hmda.models import HMDARecord
+from hmda import partitions
+from hmda.models import HMDARecord, HMDARollup
+from respondants.models import Institution, Lender
+
+
+#   Fields, in order, of the tuples produced by parse_row()
+FIELDS = ('as_of_year', 'respondent_id', 'agency_code', 'loan_amount_000s',
+          'action_taken', 'statefp', 'countyfp', 'lender', 'geoid')
+LENDER = FIELDS.index('lender')
+DATASET = 'hmda'
+
+
+def parse_row(row):
+    """Convert a LAR row into a tuple ordered as FIELDS, though with the
+    lender's code rather than its id (see with_lender_ids). Returns None if
+    the row's census tract can't be determined"""
+    statefp = row[11]
+    censustract = statefp + row[12] + row[13].replace('.', '')
+    geoid = errors.in_2010.get(censustract, censustract)
+    if geoid is None or 'NA' in geoid:
+        return None
+    return (int(row[0]), row[1], row[2], int(row[7]), int(row[9]), statefp,
+            row[12], row[2] + row[1], geoid)
+
+
+def with_lender_ids(rows, lender_ids):
+    """Replace each row's lender code with the lender's id, looking up (and
+    adding to lender_ids) any lenders which aren't already in it"""
+    for row in rows:
+        row = list(row)
+        code = row[LENDER]
+        if code not in lender_ids:
+            lender_ids.update(Lender.objects.ids([code]))
+        row[LENDER] = lender_ids[code]
+        yield row
+
+
+def spool_range(args):
+    """Parse one byte range of the LAR file, writing the records we want into
+    one CSV file per state. Runs in a worker process. Returns the number of
+    records spooled for each state, and the codes of the lenders seen"""
+    filename, index, start, end, states, spool_dir = args
+    spools, writers, counts, lenders = {}, {}, {}, set()
+    try:
+        for row in reader(read_lines(filename, start, end)):
+            statefp = row[11]
+            if statefp not in states:
+                continue
+            record = parse_row(row)
+            if record is None:
+                continue
+            if statefp not in spools:
+                path = os.path.join(spool_dir, '%s.%d.csv' % (statefp, index))
+                spools[statefp] = open(path, 'wb')
+                writers[statefp] = writer(spools[statefp])
+                counts[statefp] = 0
+            writers[statefp].writerow(record)
+            counts[statefp] += 1
+            lenders.add(record[LENDER])
+    finally:
+        for spool in spools.values():
+            spool.close()
+    return counts, lenders
+
+
+def load_state(args):
+    """Replace a state's records with those in its spool files, marking the
+    state complete in the same transaction. Runs in a worker process. Lender
+    ids have already been assigned, as workers adding lenders at once would
+    conflict"""
+    year, statefp, paths, row_count, source, lender_ids = args
+    table, columns = model_columns(HMDARecord, FIELDS)
+    with transaction.atomic():
+        # Clear out the old data, or anything left by a failed run
+        HMDARecord.objects.filter(as_of_year=year, statefp=statefp).delete()
+        for path in paths:
+            with open(path, 'rb') as spool:
+                for _ in copy_in_chunks(table, columns, with_lender_ids(
+                        reader(spool), lender_ids)):
+                    pass
+        HMDARollup.objects.rebuild(year, [statefp])
+        StateLoad.mark_completed(DATASET, year, statefp, row_count, source)
+    return statefp, row_count
 
 
 class Command(BaseCommand):
     args = "<path/to/20XXHMDALAR - National.csv>"
     help = """ Load HMDA data (for all states)."""
 
-    def handle(self, *args, **options):
-        if not args:
-            raise CommandError("Needs a first argument, " + Command.args)
+    window_size = 1000      # records per bulk_create
 
-        geo_states = set(
-            row['state'] for row in
-            Geo.objects.values('state').distinct())
-        self.stdout.write("Filtering by states "
-                          + ", ".join(list(sorted(geo_states))))
-        known_hmda = set(
-            row['statefp'] for row in
-            HMDARecord.objects.values('statefp').distinct())
-        self.stdout.write("Already have data for "
-                          + ", ".join(list(sorted(known_hmda))))
-
-        def records():
-            """A generator returning a new Record with each call. Required as
-            there are too many to instantiate in memory at once"""
-            datafile = open(args[0], 'r')
-            i = 0
-            for row in reader(datafile):
+    option_list = BaseCommand.option_list + (
+        make_option('--copy', action='store_true', default=False,
+                    help=('Stream rows with PostgreSQL COPY rather than '
+                          + 'creating models. Much faster')),
+        make_option('--partitioned', action='store_true', default=False,
+                    help=('Split the file between worker processes and '
+                          + 'load (and track) each state separately')),
+        make_option('--processes', type='int', default=cpu_count(),
+                    help=('Number of worker processes for --partitioned; '
+                          + '1 to run inline')),
+        make_option('--detached', action='store_true', default=False,
+                    help=('Load the whole year into a new table, then swap '
+                          + 'it in for the year\'s partition. Needs '
+                          + 'PostgreSQL 11 (see hmda migration 0008)')),
+    )
+
+    def rows(self, filename, states, counts):
+        """A generator returning a tuple (ordered as FIELDS) for each record
+        we should load. Required as there are too many to hold in memory at
+        once. Records per state are tallied in counts"""
+        with open(filename, 'r') as datafile:
+            for i, row in enumerate(reader(datafile)):
                 if i % 1000000 == 0:
                     self.stdout.write("Record %d 000,000" % (i // 1000000))
-                record = HMDARecord(
-                    as_of_year=int(row[0]), respondent_id=row[1],
-                    agency_code=row[2], loan_amount_000s=int(row[7]),
-                    action_taken=row[9], statefp=row[11], countyfp=row[12])
-                censustract = row[11] + row[12] + row[13].replace('.', '')
-                record.geoid_id = errors.in_2010.get(censustract, censustract)
-                record.auto_fields()
-                if (row[11] not in known_hmda and row[11] in geo_states
-                        and 'NA' not in record.geoid_id):
+                statefp = row[11]
+                if statefp not in states:
+                    continue
+                record = parse_row(row)
+                if record is not None:
+                    counts[statefp] = counts.get(statefp, 0) + 1
                     yield record
-                i += 1
-            datafile.close()
 
+    def bulk_create(self, rows):
+        """Save records via the ORM, a window at a time"""
         window = []         # Need to materialize records for bulk_create
-        until_insert = 1000
-        for record in records():
-            if until_insert > 0:
-                until_insert -= 1
-                window.append(record)
-            else:
+        for row in rows:
+            values = dict(zip(FIELDS, row))
+            values['lender_id'] = values.pop('lender')
+            values['geoid_id'] = values.pop('geoid')
+            window.append(HMDARecord(**values))
+            if len(window) == self.window_size:
                 HMDARecord.objects.bulk_create(window)
-                until_insert = 1000
                 window = []
         HMDARecord.objects.bulk_create(window)
+
+    def copy(self, rows, table=None):
+        """Stream rows straight into the table (or another table with the
+        same columns) via COPY"""
+        default_table, columns = model_columns(HMDARecord, FIELDS)
+        table = table or default_table
+        start, total = time.time(), 0
+        for count in copy_in_chunks(table, columns, rows):
+            total += count
+            elapsed = max(time.time() - start, 0.001)
+            self.stdout.write("Copied %d records (%d per second)"
+                              % (total, total / elapsed))
+
+    def map(self, pool, fn, work):
+        if pool:
+            return pool.imap_unordered(fn, work)
+        return (fn(args) for args in work)
+
+    def year(self, filename):
+        """The file's reporting year, according to its first record"""
+        with open(filename, 'r') as datafile:
+            return int(next(reader(datafile))[0])
+
+    def partitioned(self, filename, states, year, source, processes):
+        """Parse byte ranges of the file in parallel, spooling records by
+        state, then load each state in parallel, each in its own
+        transaction"""
+        spool_dir = tempfile.mkdtemp(prefix='load_hmda')
+        pool = None
+        if processes > 1:
+            connection.close()      # don't hand the connection to workers
+            pool = Pool(processes, init_worker)
+        try:
+            start = time.time()
+            ranges = line_ranges(filename, processes * 4)
+            counts, lenders = {}, set()
+            work = [(filename, index, range_start, range_end, states,
+                     spool_dir)
+                    for index, (range_start, range_end) in enumerate(ranges)]
+            for range_counts, range_lenders in self.map(pool, spool_range,
+                                                        work):
+                for statefp, count in range_counts.items():
+                    counts[statefp] = counts.get(statefp, 0) + count
+                lenders.update(range_lenders)
+            self.stdout.write("Parsed %d records in %d seconds" % (
+                sum(counts.values()), time.time() - start))
+            lender_ids = Lender.objects.ids(lenders)
+
+            spools = {}
+            for spool in sorted(os.listdir(spool_dir)):
+                spools.setdefault(spool.split('.')[0], []).append(
+                    os.path.join(spool_dir, spool))
+            # States with no records are still replaced (i.e. emptied)
+            work = [(year, statefp, spools.get(statefp, []),
+                     counts.get(statefp, 0), source, lender_ids)
+                    for statefp in sorted(states)]
+            for statefp, count in self.map(pool, load_state, work):
+                self.stdout.write("Loaded %d records for state %s"
+                                  % (count, statefp))
+        finally:
+            if pool:
+                pool.terminate()
+            shutil.rmtree(spool_dir)
+
+    def detached(self, filename, states, year, source):
+        """Load every state's records for the year into a staging table,
+        index it, then attach it in place of the year's partition. Readers
+        see the previous records for the year until the (brief) swap"""
+        staging = partitions.create_staging(year)
+        try:
+            counts = {}
+            self.copy(with_lender_ids(self.rows(filename, states, counts), {}),
+                      staging)
+            partitions.index_staging(staging)
+            with transaction.atomic():
+                partitions.attach(year, staging)
+                HMDARollup.objects.rebuild(year)
+                for statefp in states:
+                    StateLoad.mark_completed(DATASET, year, statefp,
+                                             counts.get(statefp, 0), source)
+        except:
+            partitions.drop_staging(year)
+            raise
+
+    def handle(self, *args, **options):
+        if not args:
+            raise CommandError("Needs a first argument, " + Command.args)
+
+        geo_states = set(
+            row['state'] for row in
+            Geo.objects.values('state').distinct() if row['state'])
+        self.stdout.write("Filtering by states "
+                          + ", ".join(list(sorted(geo_states))))
+
+        source = Source.from_files(args[0])
+        year = self.year(args[0])
+        current = StateLoad.current_states(DATASET, year, source)
+        self.stdout.write("Unchanged since last load: "
+                          + ", ".join(list(sorted(current))))
+        states = loaded = geo_states - current
+        latest = HMDARollup.objects.latest_year()
+
+        if options.get('detached'):
+            if not partitions.is_partitioned():
+                raise CommandError("--detached needs the HMDA table to be "
+                                   + "partitioned by year (PostgreSQL 11+)")
+            # The year's partition is replaced, so every state is loaded
+            self.detached(args[0], geo_states, year, source)
+            states, loaded = None, geo_states
+        elif states and partitions.is_partitioned():
+            partitions.create_partition(year)
+
+        if states and options.get('partitioned'):
+            self.partitioned(args[0], states, year, source,
+                             options.get('processes', cpu_count()))
+        elif states:
+            with transaction.atomic():
+                HMDARecord.objects.filter(
+                    as_of_year=year, statefp__in=states).delete()
+                counts = {}
+                rows = with_lender_ids(self.rows(args[0], states, counts), {})
+                if options.get('copy'):
+                    self.copy(rows)
+                else:
+                    self.bulk_create(rows)
+                HMDARollup.objects.rebuild(year, sorted(states))
+                for statefp in states:
+                    StateLoad.mark_completed(DATASET, year, statefp,
+                                             counts.get(statefp, 0), source)
+        Institution.objects.count_loans(year)
+        if loaded and (latest is None or year > latest):
+            # Requests default to the latest year, so all of them change
+            versions.bump(versions.HMDA)
+        elif loaded:
+            versions.bump(versions.HMDA, loaded)
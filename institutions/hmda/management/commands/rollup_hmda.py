@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from batch import versions
+from hmda.models import HMDARecord, HMDARollup
+from respondants.models import Institution
+
+
+class Command(BaseCommand):
+    args = "[year year ...]"
+    help = """ Rebuild the aggregated HMDA table (for all years by default).
+               Also recounts each institution's loans. load_hmda does this
+               automatically."""
+
+    def handle(self, *args, **options):
+        years = [int(year) for year in args]
+        if not years:
+            years = HMDARecord.objects.values_list(
+                'as_of_year', flat=True).distinct().order_by('as_of_year')
+        for year in years:
+            HMDARollup.objects.rebuild(year)
+            Institution.objects.count_loans(year)
+            self.stdout.write("Rebuilt %d: %d rows" % (
+                year, HMDARollup.objects.filter(as_of_year=year).count()))
+        versions.bump(versions.HMDA)
@@ -0,0 +1,38 @@
+from django.db import connection, models, transaction
+from django.db.models import Max
+
+
+class HMDARollupManager(models.Manager):
+    def latest_year(self):
+        """The most recent year with aggregated records, or None"""
+        return self.aggregate(latest=Max('as_of_year'))['latest']
+
+    def rebuild(self, year, states=None):
+        """Replace the rollup rows for a year (optionally only for some
+        states) by aggregating the raw HMDA records. Done entirely within the
+        database, in one transaction. A record's tract may have been
+        corrected (see geo.errors), so take the state and county from the
+        tract rather than from the record"""
+        from hmda.models import HMDARecord
+        where, params = 'as_of_year = %s', [year]
+        if states:
+            where += ' AND statefp IN (%s)' % ', '.join(['%s'] * len(states))
+            params.extend(states)
+        with transaction.atomic():
+            rollups = self.filter(as_of_year=year)
+            if states:
+                rollups = rollups.filter(statefp__in=states)
+            rollups.delete()
+            cursor = connection.cursor()
+            cursor.execute("""
+                INSERT INTO %s (lender_id, geoid_id, as_of_year, statefp,
+                                countyfp, action_taken, num_loans,
+                                loan_amount_000s)
+                SELECT lender_id, geoid_id, as_of_year,
+                       substr(geoid_id, 1, 2), substr(geoid_id, 3, 3),
+                       action_taken, COUNT(*), SUM(loan_amount_000s)
+                FROM %s
+                WHERE %s
+                GROUP BY lender_id, geoid_id, as_of_year, action_taken""" % (
+                self.model._meta.db_table, HMDARecord._meta.db_table,
+                where), params)
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+from south.utils import datetime_utils as datetime
+from south.db import db
+from south.v2 import SchemaMigration
+from django.db import models
+
+
+class Migration(SchemaMigration):
+
+    def forwards(self, orm):
+        # Adding model 'HMDARollup'
+        db.create_table(u'hmda_hmdarollup', (
+            (u'id', self.gf('django.db.models.fields.AutoField')(primary_key=True)),
+            ('lender', self.gf('django.db.models.fields.CharField')(max_length=11)),
+            ('geoid', self.gf('django.db.models.fields.related.ForeignKey')(to=orm['geo.Geo'], db_index=False)),
+            ('as_of_year', self.gf('django.db.models.fields.PositiveIntegerField')()),
+            ('statefp', self.gf('django.db.models.fields.CharField')(max_length=2)),
+            ('countyfp', self.gf('django.db.models.fields.CharField')(max_length=3)),
+            ('action_taken', self.gf('django.db.models.fields.PositiveIntegerField')()),
+            ('num_loans', self.gf('django.db.models.fields.PositiveIntegerField')()),
+            ('loan_amount_000s', self.gf('django.db.models.fields.PositiveIntegerField')()),
+        ))
+        db.send_create_signal(u'hmda', ['HMDARollup'])
+
+        # Adding unique constraint on 'HMDARollup', fields ['lender', 'geoid', 'as_of_year', 'action_taken']
+        db.create_unique(u'hmda_hmdarollup', ['lender', 'geoid_id', 'as_of_year', 'action_taken'])
+
+        # Adding index on 'HMDARollup', fields ['statefp', 'countyfp', 'lender']
+        db.create_index(u'hmda_hmdarollup', ['statefp', 'countyfp', 'lender'])
+
+
+    def backwards(self, orm):
+        # Removing index on 'HMDARollup', fields ['statefp', 'countyfp', 'lender']
+        db.delete_index(u'hmda_hmdarollup', ['statefp', 'countyfp', 'lender'])
+
+        # Removing unique constraint on 'HMDARollup', fields ['lender', 'geoid', 'as_of_year', 'action_taken']
+        db.delete_unique(u'hmda_hmdarollup', ['lender', 'geoid_id', 'as_of_year', 'action_taken'])
+
+        # Deleting model 'HMDARollup'
+        db.delete_table(u'hmda_hmdarollup')
+
+
+    models = {
+        u'geo.geo': {
+            'Meta': {'object_name': 'Geo'},
+            'cbsa': ('django.db.models.fields.CharField', [], {'max_length': '5', 'null': 'True'}),
+            'centlat': ('django.db.models.fields.FloatField', [], {}),
+            'centlon': ('django.db.models.fields.FloatField', [], {}),
+            'county': ('django.db.models.fields.CharField', [], {'max_length': '3', 'null': 'True'}),
+            'csa': ('django.db.models.fields.CharField', [], {'max_length': '3', 'null': 'True'}),
+            'geo_type': ('django.db.models.fields.PositiveIntegerField', [], {}),
+            'geoid': ('django.db.models.fields.CharField', [], {'max_length': '20', 'primary_key': 'True'}),
+            'geom': ('django.contrib.gis.db.models.fields.MultiPolygonField', [], {'srid': '4269'}),
+            'maxlat': ('django.db.models.fields.FloatField', [], {}),
+            'maxlon': ('django.db.models.fields.FloatField', [], {}),
+            'minlat': ('django.db.models.fields.FloatField', [], {}),
+            'minlon': ('django.db.models.fields.FloatField', [], {}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '50'}),
+            'state': ('django.db.models.fields.CharField', [], {'max_length': '2', 'null': 'True'}),
+            'tract': ('django.db.models.fields.CharField', [], {'max_length': '6', 'null': 'True'})
+        },
+        u'hmda.hmdarecord': {
+            'Meta': {'object_name': 'HMDARecord', 'index_together': "[('statefp', 'countyfp'), ('statefp', 'countyfp', 'lender'), ('statefp', 'countyfp', 'action_taken', 'lender')]"},
+            'action_taken': ('django.db.models.fields.PositiveIntegerField', [], {'db_index': 'True'}),
+            'agency_code': ('django.db.models.fields.CharField', [], {'max_length': '1'}),
+            'as_of_year': ('django.db.models.fields.PositiveIntegerField', [], {}),
+            'countyfp': ('django.db.models.fields.CharField', [], {'max_length': '3'}),
+            'geoid': ('django.db.models.fields.related.ForeignKey', [], {'to': u"orm['geo.Geo']"}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'lender': ('django.db.models.fields.CharField', [], {'max_length': '11', 'db_index': 'True'}),
+            'loan_amount_000s': ('django.db.models.fields.PositiveIntegerField', [], {}),
+            'respondent_id': ('django.db.models.fields.CharField', [], {'max_length': '10'}),
+            'statefp': ('django.db.models.fields.CharField', [], {'max_length': '2', 'db_index': 'True'})
+        },
+        u'hmda.hmdarollup': {
+            'Meta': {'unique_together': "(('lender', 'geoid', 'as_of_year', 'action_taken'),)", 'object_name': 'HMDARollup', 'index_together': "[('statefp', 'countyfp', 'lender')]"},
+            'action_taken': ('django.db.models.fields.PositiveIntegerField', [], {}),
+            'as_of_year': ('django.db.models.fields.PositiveIntegerField', [], {}),
+            'countyfp': ('django.db.models.fields.CharField', [], {'max_length': '3'}),
+            'geoid': ('django.db.models.fields.related.ForeignKey', [], {'to': u"orm['geo.Geo']", 'db_index': 'False'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'lender': ('django.db.models.fields.CharField', [], {'max_length': '11'}),
+            'loan_amount_000s': ('django.db.models.fields.PositiveIntegerField', [], {}),
+            'num_loans': ('django.db.models.fields.PositiveIntegerField', [], {}),
+            'statefp': ('django.db.models.fields.CharField', [], {'max_length': '2'})
+        }
+    }
+
+    complete_apps = ['hmda']
\ No newline at end of file
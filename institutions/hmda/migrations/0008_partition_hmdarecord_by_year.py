@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+from south.utils import datetime_utils as datetime
+from south.db import db
+from south.v2 import SchemaMigration
+from django.db import models
+
+
+TABLE = 'hmda_hmdarecord'
+OLD_TABLE = 'hmda_hmdarecord_unpartitioned'
+INDEXES = (['action_taken'], ['lender'], ['geoid_id'],
+           ['statefp', 'countyfp', 'lender'],
+           ['statefp', 'countyfp', 'action_taken', 'lender'])
+
+
+def partitioning_supported():
+    return int(db.execute("SHOW server_version_num")[0][0]) >= 110000
+
+
+def is_partitioned():
+    return bool(db.execute(
+        "SELECT 1 FROM pg_class WHERE relname = %s AND relkind = 'p'",
+        [TABLE]))
+
+
+def set_aside(table):
+    """Rename a table and its indexes so that their names can be reused"""
+    db.execute('ALTER TABLE "%s" RENAME TO "%s"' % (TABLE, table))
+    indexes = db.execute(
+        "SELECT indexname FROM pg_indexes WHERE tablename = %s", [table])
+    for idx, (index,) in enumerate(indexes):
+        db.execute('ALTER INDEX "%s" RENAME TO "%s_%d"' % (index, table, idx))
+
+
+def add_constraints():
+    db.execute('ALTER TABLE "%s" ADD CONSTRAINT "geoid_id_refs_geo_geoid" '
+               'FOREIGN KEY ("geoid_id") REFERENCES "geo_geo" ("geoid") '
+               'DEFERRABLE INITIALLY DEFERRED' % TABLE)
+    for columns in INDEXES:
+        db.create_index(TABLE, columns)
+
+
+class Migration(SchemaMigration):
+    """Partition HMDA records by year. Requires PostgreSQL 11; on older
+    servers the table is left as it is (and load_hmda --detached is
+    unavailable)"""
+
+    def forwards(self, orm):
+        if not partitioning_supported():
+            print (" ! PostgreSQL 11 or later is needed to partition "
+                   + TABLE + "; leaving it unpartitioned")
+            return
+        set_aside(OLD_TABLE)
+        db.execute('CREATE TABLE "%s" (LIKE "%s" INCLUDING DEFAULTS) '
+                   'PARTITION BY LIST (as_of_year)' % (TABLE, OLD_TABLE))
+        db.execute('ALTER SEQUENCE "%s_id_seq" OWNED BY "%s".id'
+                   % (TABLE, TABLE))
+        # The partition key must be part of the primary key
+        db.execute('ALTER TABLE "%s" ADD PRIMARY KEY (id, as_of_year)'
+                   % TABLE)
+        add_constraints()
+        years = db.execute('SELECT DISTINCT as_of_year FROM "%s"'
+                           % OLD_TABLE)
+        for (year,) in years:
+            db.execute('CREATE TABLE "%s_%d" PARTITION OF "%s" '
+                       'FOR VALUES IN (%d)' % (TABLE, year, TABLE, year))
+        db.execute('CREATE TABLE "%s_default" PARTITION OF "%s" DEFAULT'
+                   % (TABLE, TABLE))
+        db.execute('INSERT INTO "%s" SELECT * FROM "%s"'
+                   % (TABLE, OLD_TABLE))
+        db.execute('DROP TABLE "%s"' % OLD_TABLE)
+
+    def backwards(self, orm):
+        if not is_partitioned():
+            return
+        partitioned = TABLE + '_partitioned'
+        set_aside(partitioned)
+        db.execute('CREATE TABLE "%s" (LIKE "%s" INCLUDING DEFAULTS)'
+                   % (TABLE, partitioned))
+        db.execute('ALTER SEQUENCE "%s_id_seq" OWNED BY "%s".id'
+                   % (TABLE, TABLE))
+        db.execute('INSERT INTO "%s" SELECT * FROM "%s"'
+                   % (TABLE, partitioned))
+        # Also drops each year's partition
+        db.execute('DROP TABLE "%s"' % partitioned)
+        db.execute('ALTER TABLE "%s" ADD PRIMARY KEY (id)' % TABLE)
+        add_constraints()
+
+    models = {
+        u'geo.geo': {
+            'Meta': {'object_name': 'Geo'},
+            'cbsa': ('django.db.models.fields.CharField', [], {'max_length': '5', 'null': 'True', 'db_index': 'True'}),
+            'centlat': ('django.db.models.fields.FloatField', [], {}),
+            'centlon': ('django.db.models.fields.FloatField', [], {}),
+            'county': ('django.db.models.fields.CharField', [], {'max_length': '3', 'null': 'True'}),
+            'csa': ('django.db.models.fields.CharField', [], {'max_length': '3', 'null': 'True'}),
+            'geo_type': ('django.db.models.fields.PositiveIntegerField', [], {}),
+            'geoid': ('django.db.models.fields.CharField', [], {'max_length': '20', 'primary_key': 'True'}),
+            'geom': ('django.contrib.gis.db.models.fields.MultiPolygonField', [], {'srid': '4269'}),
+            'maxlat': ('django.db.models.fields.FloatField', [], {}),
+            'maxlon': ('django.db.models.fields.FloatField', [], {}),
+            'minlat': ('django.db.models.fields.FloatField', [], {}),
+            'minlon': ('django.db.models.fields.FloatField', [], {}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '50'}),
+            'state': ('django.db.models.fields.CharField', [], {'max_length': '2', 'null': 'True'}),
+            'tract': ('django.db.models.fields.CharField', [], {'max_length': '6', 'null': 'True'})
+        },
+        u'hmda.hmdarecord': {
+            'Meta': {'object_name': 'HMDARecord', 'index_together': "[('statefp', 'countyfp', 'lender'), ('statefp', 'countyfp', 'action_taken', 'lender')]"},
+            'action_taken': ('django.db.models.fields.PositiveIntegerField', [], {'db_index': 'True'}),
+            'agency_code': ('django.db.models.fields.CharField', [], {'max_length': '1'}),
+            'as_of_year': ('django.db.models.fields.PositiveIntegerField', [], {}),
+            'countyfp': ('django.db.models.fields.CharField', [], {'max_length': '3'}),
+            'geoid': ('django.db.models.fields.related.ForeignKey', [], {'to': u"orm['geo.Geo']"}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'lender': ('django.db.models.fields.CharField', [], {'max_length': '11', 'db_index': 'True'}),
+            'loan_amount_000s': ('django.db.models.fields.PositiveIntegerField', [], {}),
+            'respondent_id': ('django.db.models.fields.CharField', [], {'max_length': '10'}),
+            'statefp': ('django.db.models.fields.CharField', [], {'max_length': '2'})
+        },
+        u'hmda.hmdarollup': {
+            'Meta': {'unique_together': "(('lender', 'geoid', 'as_of_year', 'action_taken'),)", 'object_name': 'HMDARollup', 'index_together': "[('statefp', 'countyfp', 'lender')]"},
+            'action_taken': ('django.db.models.fields.PositiveIntegerField', [], {}),
+            'as_of_year': ('django.db.models.fields.PositiveIntegerField', [], {}),
+            'countyfp': ('django.db.models.fields.CharField', [], {'max_length': '3'}),
+            'geoid': ('django.db.models.fields.related.ForeignKey', [], {'to': u"orm['geo.Geo']", 'db_index': 'False'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'lender': ('django.db.models.fields.CharField', [], {'max_length': '11'}),
+            'loan_amount_000s': ('django.db.models.fields.PositiveIntegerField', [], {}),
+            'num_loans': ('django.db.models.fields.PositiveIntegerField', [], {}),
+            'statefp': ('django.db.models.fields.CharField', [], {'max_length': '2'})
+        }
+    }
+
+    complete_apps = ['hmda']
\ No newline at end of file
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+from south.utils import datetime_utils as datetime
+from south.db import db
+from south.v2 import SchemaMigration
+from django.db import models
+
+
+RECORD, ROLLUP = u'hmda_hmdarecord', u'hmda_hmdarollup'
+RECORD_INDEXES = (['statefp', 'countyfp', '%s'],
+                  ['statefp', 'countyfp', 'action_taken', '%s'],
+                  ['%s', 'as_of_year', 'statefp', 'countyfp'])
+ROLLUP_UNIQUE = ['%s', 'geoid_id', 'as_of_year', 'action_taken']
+ROLLUP_INDEX = ['%s', 'as_of_year', 'statefp', 'countyfp']
+
+
+def with_column(columns, column):
+    return [name % column if '%' in name else name for name in columns]
+
+
+def drop_indexes(column):
+    for columns in RECORD_INDEXES:
+        db.delete_index(RECORD, with_column(columns, column))
+    db.delete_unique(ROLLUP, with_column(ROLLUP_UNIQUE, column))
+    db.delete_index(ROLLUP, with_column(ROLLUP_INDEX, column))
+
+
+def create_indexes(column):
+    for columns in RECORD_INDEXES:
+        db.create_index(RECORD, with_column(columns, column))
+    db.create_unique(ROLLUP, with_column(ROLLUP_UNIQUE, column))
+    db.create_index(ROLLUP, with_column(ROLLUP_INDEX, column))
+
+
+class Migration(SchemaMigration):
+    """Replace the lender strings with references to respondants.Lender,
+    adding any lenders it doesn't have"""
+
+    depends_on = (
+        ('respondants', '0010_auto__add_lender__add_field_institution_lender'),
+    )
+
+    def forwards(self, orm):
+        drop_indexes('lender')
+        for table in (RECORD, ROLLUP):
+            db.execute("""
+                INSERT INTO respondants_lender (code)
+                SELECT DISTINCT lender FROM %s
+                WHERE lender NOT IN (SELECT code FROM respondants_lender)"""
+                       % table)
+            db.add_column(table, 'lender', self.gf(
+                'django.db.models.fields.related.ForeignKey')(
+                    to=orm['respondants.Lender'], null=True, db_index=False),
+                keep_default=False)
+            db.execute("""
+                UPDATE %s SET lender_id = known.id
+                FROM respondants_lender AS known
+                WHERE known.code = %s.lender""" % (table, table))
+            db.delete_column(table, 'lender')
+            db.execute("ALTER TABLE %s ALTER COLUMN lender_id SET NOT NULL"
+                       % table)
+        create_indexes('lender_id')
+
+    def backwards(self, orm):
+        drop_indexes('lender_id')
+        for table in (RECORD, ROLLUP):
+            db.add_column(table, 'lender', self.gf(
+                'django.db.models.fields.CharField')(
+                    max_length=11, null=True),
+                keep_default=False)
+            db.execute("""
+                UPDATE %s SET lender = known.code
+                FROM respondants_lender AS known
+                WHERE known.id = %s.lender_id""" % (table, table))
+            db.delete_column(table, 'lender_id')
+            db.execute("ALTER TABLE %s ALTER COLUMN lender SET NOT NULL"
+                       % table)
+        create_indexes('lender')
+
+    models = {
+        u'geo.geo': {
+            'Meta': {'object_name': 'Geo'},
+            'cbsa': ('django.db.models.fields.CharField', [], {'max_length': '5', 'null': 'True', 'db_index': 'True'}),
+            'centlat': ('django.db.models.fields.FloatField', [], {}),
+            'centlon': ('django.db.models.fields.FloatField', [], {}),
+            'county': ('django.db.models.fields.CharField', [], {'max_length': '3', 'null': 'True'}),
+            'csa': ('django.db.models.fields.CharField', [], {'max_length': '3', 'null': 'True'}),
+            'geo_type': ('django.db.models.fields.PositiveIntegerField', [], {}),
+            'geoid': ('django.db.models.fields.CharField', [], {'max_length': '20', 'primary_key': 'True'}),
+            'geom': ('django.contrib.gis.db.models.fields.MultiPolygonField', [], {'srid': '4269'}),
+            'maxlat': ('django.db.models.fields.FloatField', [], {}),
+            'maxlon': ('django.db.models.fields.FloatField', [], {}),
+            'minlat': ('django.db.models.fields.FloatField', [], {}),
+            'minlon': ('django.db.models.fields.FloatField', [], {}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '50'}),
+            'state': ('django.db.models.fields.CharField', [], {'max_length': '2', 'null': 'True'}),
+            'tract': ('django.db.models.fields.CharField', [], {'max_length': '6', 'null': 'True'})
+        },
+        u'hmda.hmdarecord': {
+            'Meta': {'object_name': 'HMDARecord', 'index_together': "[('statefp', 'countyfp', 'lender'), ('statefp', 'countyfp', 'action_taken', 'lender'), ('lender', 'as_of_year', 'statefp', 'countyfp')]"},
+            'action_taken': ('django.db.models.fields.PositiveIntegerField', [], {'db_index': 'True'}),
+            'agency_code': ('django.db.models.fields.CharField', [], {'max_length': '1'}),
+            'as_of_year': ('django.db.models.fields.PositiveIntegerField', [], {}),
+            'countyfp': ('django.db.models.fields.CharField', [], {'max_length': '3'}),
+            'geoid': ('django.db.models.fields.related.ForeignKey', [], {'to': u"orm['geo.Geo']"}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'lender': ('django.db.models.fields.related.ForeignKey', [], {'to': u"orm['respondants.Lender']", 'db_index': 'False'}),
+            'loan_amount_000s': ('django.db.models.fields.PositiveIntegerField', [], {}),
+            'respondent_id': ('django.db.models.fields.CharField', [], {'max_length': '10'}),
+            'statefp': ('django.db.models.fields.CharField', [], {'max_length': '2'})
+        },
+        u'hmda.hmdarollup': {
+            'Meta': {'unique_together': "(('lender', 'geoid', 'as_of_year', 'action_taken'),)", 'object_name': 'HMDARollup', 'index_together': "[('lender', 'as_of_year', 'statefp', 'countyfp')]"},
+            'action_taken': ('django.db.models.fields.PositiveIntegerField', [], {}),
+            'as_of_year': ('django.db.models.fields.PositiveIntegerField', [], {}),
+            'countyfp': ('django.db.models.fields.CharField', [], {'max_length': '3'}),
+            'geoid': ('django.db.models.fields.related.ForeignKey', [], {'to': u"orm['geo.Geo']", 'db_index': 'False'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'lender': ('django.db.models.fields.related.ForeignKey', [], {'to': u"orm['respondants.Lender']", 'db_index': 'False'}),
+            'loan_amount_000s': ('django.db.models.fields.PositiveIntegerField', [], {}),
+            'num_loans': ('django.db.models.fields.PositiveIntegerField', [], {}),
+            'statefp': ('django.db.models.fields.CharField', [], {'max_length': '2'})
+        },
+        u'respondants.lender': {
+            'Meta': {'object_name': 'Lender'},
+            'code': ('django.db.models.fields.CharField', [], {'unique': 'True', 'max_length': '11'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'})
+        }
+    }
+
+    complete_apps = ['hmda']
\ No newline at end of file
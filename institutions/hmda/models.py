@@ -1,5 +1,8 @@
 from django.db import models
 
+from hmda.managers import HMDARollupManager
+from respondants.models import Lender
+
 
 AGENCY_CHOICES = (
     (1, 'Office of the Comptroller of the Currency (OCC)'),
@@ -50,7 +53,7 @@ class HMDARecord(models.Model):
                    + "means that the lender bought the loan on the "
                    + "secondary market."))
     statefp = models.CharField(
-        max_length=2, db_index=True,
+        max_length=2,
         help_text=("A two-digit code representing the state the property is "
                    + " located in."))
     countyfp = models.CharField(
@@ -59,18 +62,45 @@ class HMDARecord(models.Model):
                    + "property. This code is only unique when combined with "
                    + "the state code."))
 
-    lender = models.CharField(max_length=11, db_index=True)
+    lender = models.ForeignKey('respondants.Lender', db_index=False)
     geoid = models.ForeignKey('geo.Geo', to_field='geoid',
                               db_index=True)
 
     class Meta:
-        index_together = [("statefp", "countyfp"),
-                          ("statefp", "countyfp", "lender"),
-                          ("statefp", "countyfp", "action_taken", "lender")]
+        # Queries on statefp or (statefp, countyfp) use the first index's
+        # prefix; queries on lender (and year) use the last's
+        index_together = [("statefp", "countyfp", "lender"),
+                          ("statefp", "countyfp", "action_taken", "lender"),
+                          ("lender", "as_of_year", "statefp", "countyfp")]
 
     def auto_fields(self):
-        self.lender = self.agency_code + self.respondent_id
+        code = self.agency_code + self.respondent_id
+        self.lender_id = Lender.objects.ids([code])[code]
 
     def save(self, *args, **kwargs):
         self.auto_fields()
         super(HMDARecord, self).save(*args, **kwargs)
+
+
+class HMDARollup(models.Model):
+    """HMDA records, aggregated by lender, census tract, year and action
+    taken. Counting loans per tract from the raw records means scanning
+    (potentially) millions of rows per request; this table is rebuilt after
+    each load instead. See HMDARollupManager.rebuild"""
+    lender = models.ForeignKey('respondants.Lender', db_index=False)
+    geoid = models.ForeignKey('geo.Geo', to_field='geoid', db_index=False)
+    as_of_year = models.PositiveIntegerField()
+    statefp = models.CharField(max_length=2)
+    countyfp = models.CharField(max_length=3)
+    action_taken = models.PositiveIntegerField(choices=ACTION_TAKEN_CHOICES)
+    num_loans = models.PositiveIntegerField(
+        help_text="Number of records with these characteristics")
+    loan_amount_000s = models.PositiveIntegerField(
+        help_text=("Sum of the amounts of those loans, in thousands of "
+                   + "dollars."))
+
+    objects = HMDARollupManager()
+
+    class Meta:
+        unique_together = ('lender', 'geoid', 'as_of_year', 'action_taken')
+        index_together = [('lender', 'as_of_year', 'statefp', 'countyfp')]
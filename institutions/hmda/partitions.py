@@ -0,0 +1,132 @@
+"""HMDA records are stored in a table partitioned by as_of_year, one
+partition per year (PostgreSQL 11 or later; see migration 0008). Queries
+which filter on as_of_year only touch that year's partition, dropping a year
+is a matter of dropping its table, and a year can be loaded into a separate
+table and swapped in all at once (see load_hmda --detached)."""
+from django.db import connections, transaction
+
+from hmda.models import HMDARecord
+
+
+TABLE = HMDARecord._meta.db_table
+
+
+def partition_name(year):
+    return '%s_%d' % (TABLE, year)
+
+
+def staging_name(year):
+    return partition_name(year) + '_staging'
+
+
+def is_partitioned(using='default'):
+    """False if the migration skipped partitioning (older PostgreSQL) or the
+    table was created without migrations (e.g. in tests)"""
+    cursor = connections[using].cursor()
+    cursor.execute("SELECT relkind FROM pg_class WHERE relname = %s",
+                   [TABLE])
+    row = cursor.fetchone()
+    return bool(row) and row[0] == 'p'
+
+
+def partitions(using='default'):
+    """Names of the tables currently attached as partitions"""
+    cursor = connections[using].cursor()
+    cursor.execute("""
+        SELECT child.relname
+        FROM pg_inherits
+        JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE parent.relname = %s""", [TABLE])
+    return set(row[0] for row in cursor.fetchall())
+
+
+def index_columns():
+    """Column lists for each of the model's indexes, which every partition
+    needs (so that attaching it doesn't have to build them)"""
+    opts = HMDARecord._meta
+    indexes = [[field.column] for field in opts.fields
+               if field.db_index and not field.primary_key]
+    for names in opts.index_together:
+        indexes.append([opts.get_field(name).column for name in names])
+    return indexes
+
+
+def create_partition(year, using='default'):
+    """Ensure the year has its own partition, so that its records don't land
+    in the default one"""
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    connection.cursor().execute(
+        "CREATE TABLE IF NOT EXISTS %s PARTITION OF %s FOR VALUES IN (%d)"
+        % (qn(partition_name(year)), qn(TABLE), year))
+
+
+def create_staging(year, using='default'):
+    """A fresh, empty, unindexed table shaped like the partitions, which will
+    only accept records for the given year. Records are numbered from the
+    same sequence as the main table's"""
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    name = staging_name(year)
+    cursor = connection.cursor()
+    cursor.execute("DROP TABLE IF EXISTS %s" % qn(name))
+    cursor.execute(
+        "CREATE TABLE %s (LIKE %s INCLUDING DEFAULTS, "
+        "CHECK (as_of_year = %d))" % (qn(name), qn(TABLE), year))
+    return name
+
+
+def index_staging(name, using='default'):
+    """Indexes are built after loading, which is much faster than
+    maintaining them row by row"""
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    cursor = connection.cursor()
+    cursor.execute("ALTER TABLE %s ADD PRIMARY KEY (id, as_of_year)"
+                   % qn(name))
+    for columns in index_columns():
+        cursor.execute("CREATE INDEX ON %s (%s)" % (
+            qn(name), ', '.join(qn(column) for column in columns)))
+    cursor.execute("ANALYZE %s" % qn(name))
+
+
+def attach(year, name, using='default'):
+    """Swap a loaded staging table in as the year's partition, replacing (and
+    dropping) any existing one, in one transaction"""
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    partition = partition_name(year)
+    with transaction.atomic(using=using):
+        cursor = connection.cursor()
+        if partition in partitions(using):
+            cursor.execute("ALTER TABLE %s DETACH PARTITION %s"
+                           % (qn(TABLE), qn(partition)))
+            cursor.execute("DROP TABLE %s" % qn(partition))
+        cursor.execute("ALTER TABLE %s RENAME TO %s"
+                       % (qn(name), qn(partition)))
+        cursor.execute("ALTER TABLE %s ATTACH PARTITION %s FOR VALUES IN (%d)"
+                       % (qn(TABLE), qn(partition), year))
+
+
+def drop_staging(year, using='default'):
+    connection = connections[using]
+    connection.cursor().execute(
+        "DROP TABLE IF EXISTS %s"
+        % connection.ops.quote_name(staging_name(year)))
+
+
+def drop_partition(year, using='default'):
+    """Remove a year's records without scanning (or deleting) them
+    row by row. Returns False if the year had no partition"""
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    partition = partition_name(year)
+    with transaction.atomic(using=using):
+        if partition not in partitions(using):
+            return False
+        cursor = connection.cursor()
+        cursor.execute("ALTER TABLE %s DETACH PARTITION %s"
+                       % (qn(TABLE), qn(partition)))
+        cursor.execute("DROP TABLE %s" % qn(partition))
+    return True
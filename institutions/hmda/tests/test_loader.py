@@ -1,14 +1,20 @@
 import os
+import shutil
+import tempfile
 
+from django.core.management.base import CommandError
 from django.test import TestCase
 from mock import Mock, patch
 
+from dataload.manifest import Source
+from dataload.models import StateLoad
 from hmda.management.commands.load_hmda import Command
-from hmda.models import HMDARecord
+from hmda.models import HMDARecord, HMDARollup
 
 
 class LoadHmdaTest(TestCase):
     fixtures = ['dummy_tracts']
+    mock_file = os.path.join("hmda", "tests", "mock_2014.csv")
 
     def test_handle(self):
         command = Command()
@@ -17,7 +23,7 @@ class LoadHmdaTest(TestCase):
 
         # The mock data file contains 10 records, 8 for known states
         self.assertEqual(8, HMDARecord.objects.count())
-        lenders = set(r.lender for r in HMDARecord.objects.all())
+        lenders = set(r.lender.code for r in HMDARecord.objects.all())
         geos = set(r.geoid_id for r in HMDARecord.objects.all())
         self.assertEqual(3, len(lenders))
         self.assertTrue(('5' + '0000000319') in lenders)
@@ -29,7 +35,161 @@ class LoadHmdaTest(TestCase):
         self.assertTrue('1122333300' in geos)
         self.assertTrue('1222233300' in geos)
 
+        # Aggregates were built, too
+        rollup = HMDARollup.objects.get(
+            lender__code='50000000319', geoid='1122233300',
+            action_taken=5)
+        self.assertEqual(2, rollup.num_loans)
+        self.assertEqual(106, rollup.loan_amount_000s)
+
+        HMDARecord.objects.all().delete()
+        HMDARollup.objects.all().delete()
+
+    def test_handle_windows(self):
+        # No records are lost at the window boundaries
+        command = Command()
+        command.stdout = Mock()
+        command.window_size = 3
+        command.handle(os.path.join("hmda", "tests", "mock_2014.csv"))
+        self.assertEqual(8, HMDARecord.objects.count())
+
+        HMDARecord.objects.all().delete()
+
+    def test_handle_copy(self):
+        command = Command()
+        command.stdout = Mock()
+        command.handle(os.path.join("hmda", "tests", "mock_2014.csv"),
+                       copy=True)
+
+        self.assertEqual(8, HMDARecord.objects.count())
+        record = HMDARecord.objects.get(respondent_id='0000000435')
+        self.assertEqual(record.lender.code, '50000000435')
+        self.assertEqual(record.geoid_id, '1122233400')
+        self.assertEqual(record.action_taken, 1)
+        self.assertEqual(record.loan_amount_000s, 253)
+
+        HMDARecord.objects.all().delete()
+
+    def test_handle_partitioned(self):
+        command = Command()
+        command.stdout = Mock()
+        command.handle(os.path.join("hmda", "tests", "mock_2014.csv"),
+                       partitioned=True, processes=1)
+
+        self.assertEqual(8, HMDARecord.objects.count())
+        self.assertEqual(5, HMDARecord.objects.filter(statefp='11').count())
+        progress = dict((load.state, load.row_count) for load in
+                        StateLoad.objects.filter(dataset='hmda', year=2012,
+                                                 completed=True))
+        self.assertEqual({'11': 5, '12': 3}, progress)
+        self.assertEqual(8, sum(HMDARollup.objects.values_list(
+            'num_loans', flat=True)))
+
+        HMDARecord.objects.all().delete()
+        StateLoad.objects.all().delete()
+        HMDARollup.objects.all().delete()
+
+    def test_handle_partitioned_resume(self):
+        # State 11 finished; state 12 has partial data from a failed run
+        StateLoad.mark_completed('hmda', 2012, '11', 5,
+                                 Source.from_files(self.mock_file))
+        HMDARecord.objects.create(
+            as_of_year=2012, respondent_id='0000001281', agency_code='3',
+            loan_amount_000s=333, action_taken=1, statefp='12',
+            countyfp='222', geoid_id='1222233300')
+        command = Command()
+        command.stdout = Mock()
+        command.handle(self.mock_file, partitioned=True, processes=1)
+
+        self.assertEqual(0, HMDARecord.objects.filter(statefp='11').count())
+        self.assertEqual(3, HMDARecord.objects.filter(statefp='12').count())
+        self.assertTrue(StateLoad.objects.get(state='12').completed)
+
+        HMDARecord.objects.all().delete()
+        StateLoad.objects.all().delete()
+        HMDARollup.objects.all().delete()
+
+    def test_handle_detached_unpartitioned(self):
+        # Test databases are created without migrations, so unpartitioned
+        command = Command()
+        command.stdout = Mock()
+        self.assertRaises(CommandError, command.handle, self.mock_file,
+                          detached=True)
+        self.assertEqual(0, HMDARecord.objects.count())
+
+    @patch('hmda.management.commands.load_hmda.partitions')
+    def test_handle_detached(self, partitions):
+        partitions.is_partitioned.return_value = True
+        # "Stage" into the real table, so the load can be checked
+        partitions.create_staging.return_value = HMDARecord._meta.db_table
+        command = Command()
+        command.stdout = Mock()
+        command.handle(self.mock_file, detached=True)
+
+        partitions.create_staging.assert_called_with(2012)
+        partitions.index_staging.assert_called_with('hmda_hmdarecord')
+        partitions.attach.assert_called_with(2012, 'hmda_hmdarecord')
+        self.assertFalse(partitions.drop_staging.called)
+        self.assertEqual(8, HMDARecord.objects.count())
+        self.assertEqual(8, sum(HMDARollup.objects.values_list(
+            'num_loans', flat=True)))
+        self.assertEqual(2, StateLoad.objects.filter(
+            dataset='hmda', year=2012, completed=True).count())
+
+        # A failed swap leaves nothing behind
+        partitions.attach.side_effect = ValueError
+        self.assertRaises(ValueError, command.handle, self.mock_file,
+                          detached=True)
+        partitions.drop_staging.assert_called_with(2012)
+
+        HMDARecord.objects.all().delete()
+        StateLoad.objects.all().delete()
+        HMDARollup.objects.all().delete()
+
+    def test_handle_unchanged(self):
+        command = Command()
+        command.stdout = Mock()
+        command.handle(self.mock_file, copy=True)
+        load = StateLoad.objects.get(dataset='hmda', year=2012, state='11')
+        self.assertEqual(5, load.row_count)
+        self.assertEqual(os.path.getsize(self.mock_file), load.size)
+        self.assertEqual(40, len(load.checksum))
+
+        # Nothing changed, so nothing is reloaded
+        HMDARecord.objects.filter(statefp='11').delete()
+        command.handle(self.mock_file, copy=True)
+        self.assertEqual(0, HMDARecord.objects.filter(statefp='11').count())
+        self.assertEqual(3, HMDARecord.objects.filter(statefp='12').count())
+
+        HMDARecord.objects.all().delete()
+        StateLoad.objects.all().delete()
+        HMDARollup.objects.all().delete()
+
+    def test_handle_changed(self):
+        command = Command()
+        command.stdout = Mock()
+        command.handle(self.mock_file)
+
+        # A new version of the file, with one state-12 record removed
+        tempdir = tempfile.mkdtemp()
+        changed = os.path.join(tempdir, 'changed.csv')
+        with open(self.mock_file) as original:
+            lines = original.readlines()
+        with open(changed, 'w') as new_version:
+            new_version.writelines(lines[:-1])
+        for partitioned in (False, True):
+            command.handle(changed, partitioned=partitioned, processes=1)
+            self.assertEqual(5, HMDARecord.objects.filter(
+                statefp='11').count())
+            self.assertEqual(2, HMDARecord.objects.filter(
+                statefp='12').count())
+            self.assertEqual(2, StateLoad.objects.get(state='12').row_count)
+            StateLoad.objects.all().delete()
+        shutil.rmtree(tempdir)
+
         HMDARecord.objects.all().delete()
+        StateLoad.objects.all().delete()
+        HMDARollup.objects.all().delete()
 
     @patch('hmda.management.commands.load_hmda.errors')
     def test_handle_errors_dict(self, errors):
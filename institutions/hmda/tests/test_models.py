@@ -1,6 +1,6 @@
 from django.test import TestCase
 
-from hmda.models import HMDARecord
+from hmda.models import HMDARecord, HMDARollup
 
 
 class HMDARecordTest(TestCase):
@@ -12,7 +12,7 @@ class HMDARecordTest(TestCase):
             loan_amount_000s=55, action_taken=1, statefp='11', countyfp='222')
         record.geoid_id = '11222333000'
         record.save()
-        self.assertEqual(record.lender, '30123456789')
+        self.assertEqual(record.lender.code, '30123456789')
         record.delete()
 
         record = HMDARecord(
@@ -20,4 +20,77 @@ class HMDARecordTest(TestCase):
             loan_amount_000s=55, action_taken=1, statefp='ST',
             countyfp='COU')
         record.auto_fields()
-        self.assertEqual(record.lender, '201-345-789')
+        self.assertEqual(record.lender.code, '201-345-789')
+
+
+class HMDARollupTest(TestCase):
+    fixtures = ['dummy_tracts']
+
+    def mkrecord(self, year, respondent_id, action_taken, amount, geoid,
+                 countyfp=None):
+        record = HMDARecord(
+            as_of_year=year, respondent_id=respondent_id, agency_code='1',
+            loan_amount_000s=amount, action_taken=action_taken,
+            statefp=geoid[:2], countyfp=countyfp or geoid[2:5])
+        record.geoid_id = geoid
+        record.save()
+
+    def test_rebuild(self):
+        self.mkrecord(2013, '1111111111', 1, 100, '1122233300')
+        self.mkrecord(2013, '1111111111', 1, 150, '1122233300')
+        self.mkrecord(2013, '1111111111', 3, 120, '1122233300')
+        self.mkrecord(2013, '2222222222', 1, 200, '1122233300')
+        self.mkrecord(2013, '1111111111', 1, 300, '1222233300')
+        self.mkrecord(2014, '1111111111', 1, 400, '1122233300')
+        HMDARollup.objects.rebuild(2013)
+
+        self.assertEqual(4, HMDARollup.objects.count())
+        rollup = HMDARollup.objects.get(lender__code='11111111111',
+                                        geoid='1122233300', action_taken=1)
+        self.assertEqual(2013, rollup.as_of_year)
+        self.assertEqual(('11', '222'), (rollup.statefp, rollup.countyfp))
+        self.assertEqual(2, rollup.num_loans)
+        self.assertEqual(250, rollup.loan_amount_000s)
+
+        # Only the requested states are replaced
+        self.mkrecord(2013, '1111111111', 1, 50, '1122233300')
+        self.mkrecord(2013, '1111111111', 1, 50, '1222233300')
+        HMDARollup.objects.rebuild(2013, ['11'])
+        self.assertEqual(3, HMDARollup.objects.get(
+            lender__code='11111111111', geoid='1122233300',
+            action_taken=1).num_loans)
+        self.assertEqual(1, HMDARollup.objects.get(
+            lender__code='11111111111', geoid='1222233300',
+            action_taken=1).num_loans)
+
+        HMDARollup.objects.rebuild(2014)
+        self.assertEqual(5, HMDARollup.objects.count())
+
+        HMDARollup.objects.all().delete()
+        HMDARecord.objects.all().delete()
+
+    def test_rebuild_corrected_tract(self):
+        """A record whose tract was corrected (see geo.errors) counts
+        towards the tract's county, not the one on the record"""
+        self.mkrecord(2013, '1111111111', 1, 100, '1122233300')
+        self.mkrecord(2013, '1111111111', 1, 150, '1122233300',
+                      countyfp='999')
+        HMDARollup.objects.rebuild(2013)
+        rollup = HMDARollup.objects.get()
+        self.assertEqual(('11', '222'), (rollup.statefp, rollup.countyfp))
+        self.assertEqual(2, rollup.num_loans)
+
+        HMDARollup.objects.all().delete()
+        HMDARecord.objects.all().delete()
+
+    def test_latest_year(self):
+        self.assertEqual(None, HMDARollup.objects.latest_year())
+        self.mkrecord(2013, '1111111111', 1, 100, '1122233300')
+        self.mkrecord(2014, '1111111111', 1, 100, '1122233300')
+        HMDARollup.objects.rebuild(2013)
+        self.assertEqual(2013, HMDARollup.objects.latest_year())
+        HMDARollup.objects.rebuild(2014)
+        self.assertEqual(2014, HMDARollup.objects.latest_year())
+
+        HMDARollup.objects.all().delete()
+        HMDARecord.objects.all().delete()
@@ -0,0 +1,54 @@
+from django.test import TestCase
+from mock import Mock
+
+from dataload.manifest import Source
+from dataload.models import StateLoad
+from hmda import partitions
+from hmda.management.commands.drop_hmda_year import Command
+from hmda.models import HMDARecord, HMDARollup
+
+
+class PartitionsTest(TestCase):
+    fixtures = ['dummy_tracts']
+
+    def test_names(self):
+        self.assertEqual('hmda_hmdarecord_2012',
+                         partitions.partition_name(2012))
+        self.assertEqual('hmda_hmdarecord_2012_staging',
+                         partitions.staging_name(2012))
+
+    def test_index_columns(self):
+        indexes = partitions.index_columns()
+        self.assertTrue(['lender_id', 'as_of_year', 'statefp', 'countyfp']
+                        in indexes)
+        self.assertTrue(['geoid_id'] in indexes)
+        self.assertTrue(['statefp', 'countyfp', 'lender_id'] in indexes)
+        # statefp queries use the composite indexes
+        self.assertFalse(['statefp'] in indexes)
+
+    def test_is_partitioned(self):
+        # Tests' tables are created without migrations
+        self.assertFalse(partitions.is_partitioned())
+        self.assertEqual(set(), partitions.partitions())
+
+    def test_drop_year(self):
+        for year in (2012, 2013):
+            record = HMDARecord(
+                as_of_year=year, respondent_id='1111111111', agency_code='1',
+                loan_amount_000s=100, action_taken=1, statefp='11',
+                countyfp='222')
+            record.geoid_id = '1122233300'
+            record.save()
+            HMDARollup.objects.rebuild(year)
+            StateLoad.mark_completed('hmda', year, '11', 1,
+                                     Source('lar.csv', 10, 'a' * 40))
+        command = Command()
+        command.stdout = Mock()
+        command.handle('2012')
+
+        self.assertEqual([2013], list(HMDARecord.objects.values_list(
+            'as_of_year', flat=True)))
+        self.assertEqual([2013], list(HMDARollup.objects.values_list(
+            'as_of_year', flat=True)))
+        self.assertEqual([2013], list(StateLoad.objects.values_list(
+            'year', flat=True)))
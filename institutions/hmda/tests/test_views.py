@@ -3,14 +3,18 @@ import json
 from django.core.urlresolvers import reverse
 from django.test import TestCase
 
+from batch import versions
+from batch.coalesce import results_cache
 from censusdata.models import Census2010Households
-from hmda.models import HMDARecord
+from geo.models import Geo
+from hmda.models import HMDARecord, HMDARollup
 
 
 class ViewsTest(TestCase):
     fixtures = ['dummy_tracts']
 
     def setUp(self):
+        results_cache().clear()
         stats = Census2010Households(
             None, 100, 80, 50, 30, 20, 10, 20, 15, 5)
         stats.geoid_id = '1122233300'
@@ -24,9 +28,10 @@ class ViewsTest(TestCase):
         stats.geoid_id = '1222233300'
         stats.save()
 
-        def mkrecord(action_taken, agency_code, countyfp, geoid):
+        def mkrecord(action_taken, agency_code, countyfp, geoid,
+                     year=2014):
             record = HMDARecord(
-                as_of_year=2014, respondent_id='1111111111',
+                as_of_year=year, respondent_id='1111111111',
                 agency_code=agency_code, loan_amount_000s=222,
                 action_taken=action_taken, statefp='11', countyfp=countyfp)
             record.geoid_id = geoid
@@ -38,10 +43,15 @@ class ViewsTest(TestCase):
         mkrecord(8, '1', '222', '1122233300')
         mkrecord(1, '2', '222', '1122233300')
         mkrecord(1, '1', '223', '1122333300')
+        mkrecord(1, '1', '222', '1122233400', 2013)
+        mkrecord(1, '1', '222', '1122233400', 2013)
+        HMDARollup.objects.rebuild(2013)
+        HMDARollup.objects.rebuild(2014)
 
     def tearDown(self):
         Census2010Households.objects.all().delete()
         HMDARecord.objects.all().delete()
+        HMDARollup.objects.all().delete()
 
     def test_volume_400(self):
         resp = self.client.get(reverse('hmda:volume'))
@@ -74,3 +84,73 @@ class ViewsTest(TestCase):
         self.assertTrue('1122233400' in resp)
         self.assertEqual(resp['1122233400']['volume'], 1)
         self.assertEqual(resp['1122233400']['volume_per_100_households'], 0.1)
+
+    def test_volume_year(self):
+        params = {'state_fips': '11', 'county_fips': '222',
+                  'lender': '11111111111'}
+        # Defaults to the latest year
+        resp = json.loads(self.client.get(reverse('hmda:volume'),
+                                          params).content)
+        self.assertEqual(resp['1122233400']['volume'], 1)
+
+        params['year'] = '2013'
+        resp = json.loads(self.client.get(reverse('hmda:volume'),
+                                          params).content)
+        self.assertEqual(resp.keys(), ['1122233400'])
+        self.assertEqual(resp['1122233400']['volume'], 2)
+
+        params['year'] = '2012'
+        resp = json.loads(self.client.get(reverse('hmda:volume'),
+                                          params).content)
+        self.assertEqual(resp, {})
+
+        params['year'] = 'last'
+        resp = self.client.get(reverse('hmda:volume'), params)
+        self.assertEqual(400, resp.status_code)
+
+    def test_volume_etag(self):
+        params = {'state_fips': '11', 'county_fips': '222',
+                  'lender': '11111111111'}
+        etag = self.client.get(reverse('hmda:volume'), params)['ETag']
+        resp = self.client.get(reverse('hmda:volume'), params,
+                               HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(304, resp.status_code)
+        # Unaffected by other states' data
+        versions.bump(versions.HMDA, ['12'])
+        resp = self.client.get(reverse('hmda:volume'), params,
+                               HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(304, resp.status_code)
+        versions.bump(versions.HMDA, ['11'])
+        resp = self.client.get(reverse('hmda:volume'), params,
+                               HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(200, resp.status_code)
+        self.assertNotEqual(etag, resp['ETag'])
+
+        gzipped = self.client.get(reverse('hmda:volume'), params,
+                                  HTTP_ACCEPT_ENCODING='gzip')
+        self.assertNotEqual(resp['ETag'], gzipped['ETag'])
+
+    def test_volume_cbsa(self):
+        Geo.objects.filter(geoid__in=['1122233300', '1122333300']).update(
+            cbsa='10000')
+        resp = self.client.get(reverse('hmda:volume'),
+                               {'cbsa': '10000', 'lender': '11111111111'})
+        resp = json.loads(resp.content)
+        # Two counties, but only the tracts in the metro area
+        self.assertEqual(sorted(resp.keys()), ['1122233300', '1122333300'])
+        self.assertEqual(resp['1122233300']['volume'], 2)
+        self.assertEqual(resp['1122333300']['volume'], 1)
+
+    def test_volume_bbox(self):
+        Geo.objects.filter(geoid='1122233400').update(
+            geom='MULTIPOLYGON (((10 10, 10 11, 11 11, 10 10)))')
+        resp = self.client.get(reverse('hmda:volume'),
+                               {'bbox': '9.5,9.5,12,12',
+                                'lender': '11111111111'})
+        resp = json.loads(resp.content)
+        self.assertEqual(resp.keys(), ['1122233400'])
+
+        resp = self.client.get(reverse('hmda:volume'),
+                               {'bbox': '12,9.5,9.5,12',
+                                'lender': '11111111111'})
+        self.assertEqual(400, resp.status_code)
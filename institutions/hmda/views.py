@@ -1,8 +1,18 @@
-from django.db.models import Count
+from django.db.models import Sum
 from django.http import HttpResponseBadRequest
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
 
-from batch.conversions import use_GET_in
-from hmda.models import HMDARecord
+from batch import versions
+from batch.coalesce import results_cache
+from batch.conversions import cached_GET_in, versioned_etag
+from geo.filters import AREA_PARAMS, tract_filters
+from hmda.models import HMDARollup
+
+
+#   The data loan_originations' results are computed from (households come
+#   from the census)
+LOAN_ORIGINATIONS_DATASETS = versions.DATASETS
 
 
 def volume_per_100_households(volume, num_households):
@@ -14,21 +24,45 @@ def volume_per_100_households(volume, num_households):
         return 0
 
 
+def latest_year():
+    """The year requests default to. Cached until more data is loaded"""
+    cache = results_cache()
+    key = 'hmda:latest_year:%s' % versions.versions(versions.HMDA)
+    year = cache.get(key)
+    if year is None:
+        year = HMDARollup.objects.latest_year()
+        cache.set(key, year)
+    return year
+
+
 def loan_originations(request_dict):
-    """Get loan originations for a given lender, county combination. This
-    ignores year for the moment."""
+    """Get loan originations for a given lender in a county, metro area or
+    bounding box (see geo.filters) for one year (by default, the latest
+    loaded). Reads from the pre-aggregated rollup table, so the raw records
+    are not touched."""
 
     state_fips = request_dict.get('state_fips', '')
     county_fips = request_dict.get('county_fips', '')
     lender = request_dict.get('lender', '')
+    try:
+        area = tract_filters(request_dict)
+    except ValueError:
+        return HttpResponseBadRequest("Invalid bbox")
+    try:
+        year = int(request_dict.get('year') or latest_year() or 0)
+    except ValueError:
+        return HttpResponseBadRequest("Invalid year")
 
-    if state_fips and county_fips and lender:
-        records = HMDARecord.objects.filter(
-            countyfp=county_fips, lender=lender, statefp=state_fips,
-            action_taken__lte=6)    # actions 7-8 are preapprovals to ignore
-        query = records.values(
+    if area and lender:
+        if state_fips and county_fips:     # denormalized; avoids a join
+            area = {'statefp': state_fips, 'countyfp': county_fips}
+        rollups = HMDARollup.objects.filter(
+            lender__code=lender, as_of_year=year,
+            action_taken__lte=6,  # 7-8 are preapprovals
+            **area)
+        query = rollups.values(
             'geoid', 'geoid__census2010households__total'
-        ).annotate(volume=Count('geoid'))
+        ).annotate(volume=Sum('num_loans'))
         data = {}
         for row in query:
             data[row['geoid']] = {
@@ -39,9 +73,12 @@ def loan_originations(request_dict):
             }
         return data
     else:
-        return HttpResponseBadRequest(
-            "Missing one of state_fips, county_fips, lender")
+        return HttpResponseBadRequest("Missing lender or " + AREA_PARAMS)
 
 
+@cache_control(max_age=0, must_revalidate=True)
+@condition(etag_func=versioned_etag('loanVolume',
+                                    LOAN_ORIGINATIONS_DATASETS))
 def loan_originations_http(request):
-    return use_GET_in(loan_originations, request)
+    return cached_GET_in('loanVolume', loan_originations, request,
+                         LOAN_ORIGINATIONS_DATASETS)
@@ -53,10 +53,13 @@ INSTALLED_APPS = (
     'censusdata',
     'hmda',
     'batch',
+    'dataload',
 )
 
 MIDDLEWARE_CLASSES = (
     'django.middleware.cache.UpdateCacheMiddleware',
+    #   Leaves responses which are already compressed (see batch.compression)
+    'django.middleware.gzip.GZipMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -118,20 +121,42 @@ REST_FRAMEWORK = {
 
 SOUTH_TESTS_MIGRATE = False
 
+BATCH_WORKERS = 8       # threads (and DB connections) serving batch requests
+BATCH_TIMEOUT = 10      # seconds
+
 LONGTERM_CACHE_TIMEOUT = 60*60*24   # 1 day
 
+#   Cached pages, tiles and batch results are shared by every worker process
+#   (and server) when SHARED_CACHE_LOCATION names a memcached server (or,
+#   with SHARED_CACHE_BACKEND, e.g. a redis one). Each cache gets its own key
+#   prefix. Without a location, e.g. in development and tests, each process
+#   keeps a bounded cache of its own
+SHARED_CACHE_BACKEND = os.environ.get(
+    'SHARED_CACHE_BACKEND',
+    'django.core.cache.backends.memcached.MemcachedCache')
+SHARED_CACHE_LOCATION = os.environ.get('SHARED_CACHE_LOCATION')
+if 'test' in sys.argv:
+    SHARED_CACHE_LOCATION = None
+
+
+def shared_cache(prefix, timeout, max_entries):
+    if SHARED_CACHE_LOCATION:
+        # memcached/redis evict (least recently used) entries themselves
+        return {'BACKEND': SHARED_CACHE_BACKEND,
+                'LOCATION': SHARED_CACHE_LOCATION,
+                'KEY_PREFIX': prefix, 'TIMEOUT': timeout}
+    return {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': prefix, 'TIMEOUT': timeout,
+            'OPTIONS': {'MAX_ENTRIES': max_entries}}
+
+
 CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    },
-    'long_term_geos': {
-        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
-        'LOCATION': '/tmp/long_term_geos',
-        'TIMEOUT': LONGTERM_CACHE_TIMEOUT,
-        'OPTIONS': {
-            'MAX_ENTRIES': 1000000
-        }
-    }
+    'default': shared_cache('default', 300, 1000),
+    #   Tiles; see geo.tilecache
+    'long_term_geos': shared_cache('tiles', LONGTERM_CACHE_TIMEOUT, 10000),
+    # Results of batch sub-requests; see batch.coalesce. Data loaders
+    # invalidate this
+    'batch_results': shared_cache('batch', LONGTERM_CACHE_TIMEOUT, 10000),
 }
 
 if 'test' in sys.argv:
@@ -54,12 +54,15 @@ var Mapusaurus = {
         var mainEl = $('main'),
             centLat = parseFloat(mainEl.data('cent-lat')) || 41.88,
             centLon = parseFloat(mainEl.data('cent-lon')) || -87.63,
+            tileVersion = mainEl.data('tile-version'),
             $enforceBoundsEl = $('#enforce-bounds-selector');
         map.setView([centLat, centLon], 12);
         Mapusaurus.map = map;
         Mapusaurus.addKey(map);
         Mapusaurus.layers.shapes = new L.TileLayer.HookableGeoJSON(
-            '/shapes/tiles/{z}/{x}/{y}', {
+            //  Versioned tile urls can be cached by the browser forever
+            (tileVersion ? '/shapes/tiles/v' + tileVersion
+                         : '/shapes/tiles') + '/{z}/{x}/{y}', {
                 afterTileLoaded: Mapusaurus.afterShapeTile
             }, {
                 // Don't redraw any tracts
@@ -330,6 +333,9 @@ var Mapusaurus = {
             if (Mapusaurus.urlParam('lender')) {
                 params['lender'] = Mapusaurus.urlParam('lender');
             }
+            if (Mapusaurus.urlParam('year')) {
+                params['year'] = Mapusaurus.urlParam('year');
+            }
             return {endpoint: triple[0], params: params};
         });
 
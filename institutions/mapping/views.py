@@ -1,6 +1,7 @@
 from django.shortcuts import render
 
 from geo.models import Geo
+from geo.views import tile_url_version
 from respondants.models import Institution
 
 
@@ -9,11 +10,11 @@ def home(request):
     template"""
     lender = request.GET.get('lender', '')
     metro = request.GET.get('metro')
-    context = {}
+    context = {'tile_version': tile_url_version()}
     if lender and len(lender) > 1 and lender[0].isdigit():
         query = Institution.objects.filter(agency_id=int(lender[0]))
         query = query.filter(ffiec_id=lender[1:])
-        query = query.select_related('agency', 'zip_code')
+        query = query.select_related('agency', 'zip_code').order_by('-year')
         lender = query.first()
         if lender:
             context['lender'] = lender
@@ -1,6 +1,7 @@
 import collections
 
 from django.core.management.base import BaseCommand
+from django.db import connection, transaction
 
 from respondants.models import Institution, ParentInstitution
 
@@ -67,37 +68,36 @@ def parse_line(line):
     return reporter
 
 
-def get_institution(reporter):
-    """ Get the Institution object that corresonds tot his ReporterRow. """
+def institution_key(year, agency_code, ffiec_id):
+    return (int(year), agency_code, ffiec_id)
 
-    institution = Institution.objects.get(
-        year=reporter.year,
-        agency__hmda_id=reporter.agency_code,
-        ffiec_id=reporter.respondant_id)
-    return institution
+
+def index_institutions(institutions):
+    """ Parents are found by HMDA ID (with state) or by RSSD ID. """
+    by_hmda_id, by_rssd_id = {}, {}
+    for institution in institutions:
+        year = institution.year
+        by_hmda_id.setdefault(
+            (year, institution.ffiec_id, institution.zip_code.state),
+            institution)
+        if institution.rssd_id:
+            by_rssd_id.setdefault((year, institution.rssd_id), institution)
+    return by_hmda_id, by_rssd_id
 
 
-def get_parent(reporter):
+def get_parent(reporter, by_hmda_id, by_rssd_id):
     """ Get the parent institution based on either the HMDA ID or the
     RSSD ID. """
-
-    parents = Institution.objects.filter(
-        year=reporter.year,
-        ffiec_id=reporter.parent_id,
-        zip_code__state=reporter.parent_state)
-    if len(parents) > 0:
-        return parents[0]
-    else:
+    year = int(reporter.year)
+    parent = by_hmda_id.get(
+        (year, reporter.parent_id, reporter.parent_state))
+    if parent is None:
         # Use the RSSD ID to look for the parent. There's at least one case
         # where the RSSD ID matches, but the FFIEC ID does not. Also, in cases
         # where the RSSD ID matches, the state does not. We'll go based on
         # RSSD ID - but that still indicates weirdness in the data.
-        parents = Institution.objects.filter(
-            year=reporter.year,
-            rssd_id=reporter.parent_rssd_id)
-
-        if len(parents) > 0:
-            return parents[0]
+        parent = by_rssd_id.get((year, reporter.parent_rssd_id))
+    return parent
 
 
 def create_top_holder(reporter):
@@ -113,7 +113,6 @@ def create_top_holder(reporter):
         parent.state = reporter.top_holder_state
     else:
         parent.state = None
-    parent.save()
     return parent
 
 
@@ -125,57 +124,124 @@ def create_parent_institution(reporter):
         state=reporter.parent_state,
         rssd_id=reporter.parent_rssd_id
     )
-    parent.save()
     return parent
 
 
-def get_or_create_parent_institution(creator, rssd_id, reporter):
-    try:
-        parent = ParentInstitution.objects.get(
-            rssd_id=rssd_id)
-    except ParentInstitution.DoesNotExist:
-        parent = creator(reporter)
-    return parent
+def get_or_create_parent_institution(creator, rssd_id, reporter, parents):
+    """ parents maps RSSD IDs to ParentInstitutions, including those not
+    saved yet. """
+    if rssd_id not in parents:
+        parents[rssd_id] = creator(reporter)
+    return parents[rssd_id]
 
 
-def assign_parent(bank, reporter):
+def assign_parent(bank, reporter, by_hmda_id, by_rssd_id, parents, links):
+    """ Non-reporting parents may not have been saved yet, so are recorded
+    in links, to be assigned once they have ids. """
     if reporter.parent_id == '':
         bank.parent = None
     else:
-        parent = get_parent(reporter)
+        parent = get_parent(reporter, by_hmda_id, by_rssd_id)
         if parent is None:
             parent = get_or_create_parent_institution(
-                create_parent_institution, reporter.parent_rssd_id, reporter)
-            bank.non_reporting_parent = parent
+                create_parent_institution, reporter.parent_rssd_id, reporter,
+                parents)
+            links.append((bank, 'non_reporting_parent', parent))
         else:
             bank.parent = parent
     return bank
 
 
-def assign_top_holder(bank, reporter):
+def assign_top_holder(bank, reporter, parents, links):
     """ Assign a top holder to a bank. """
     if reporter.top_holder_name == '':
         bank.top_holder = None
     else:
-        bank.top_holder = get_or_create_parent_institution(
-            create_top_holder, reporter.top_holder_rssd_id, reporter)
+        parent = get_or_create_parent_institution(
+            create_top_holder, reporter.top_holder_rssd_id, reporter, parents)
+        links.append((bank, 'top_holder', parent))
     return bank
 
 
+def save_parents(parents):
+    """ Create the new parent institutions in bulk, then look up their
+    ids. """
+    new = [parent for parent in parents.values() if parent.pk is None]
+    ParentInstitution.objects.bulk_create(new)
+    ids = dict(ParentInstitution.objects.filter(
+        rssd_id__in=[parent.rssd_id for parent in new]
+    ).values_list('rssd_id', 'id'))
+    for parent in new:
+        parent.pk = ids[parent.rssd_id]
+
+
+def update_institutions(banks, chunk_size=1000):
+    """ Write the resolved fields back with one UPDATE per chunk of banks
+    (Django has no bulk update). """
+    fields = ('rssd_id', 'parent_id', 'non_reporting_parent_id',
+              'top_holder_id')
+    cursor = connection.cursor()
+    for start in range(0, len(banks), chunk_size):
+        chunk = banks[start:start + chunk_size]
+        params = []
+        for bank in chunk:
+            params.append(bank.pk)
+            params.extend(getattr(bank, field) for field in fields)
+        # NULLs aren't typed within VALUES; hence the casts
+        cursor.execute("""
+            UPDATE %s AS institution
+            SET rssd_id = new.rssd_id,
+                parent_id = new.parent_id::integer,
+                non_reporting_parent_id = new.non_reporting_parent_id::integer,
+                top_holder_id = new.top_holder_id::integer
+            FROM (VALUES %s) AS new (id, %s)
+            WHERE institution.id = new.id""" % (
+            Institution._meta.db_table,
+            ', '.join(['(%s, %s, %s, %s, %s)'] * len(chunk)),
+            ', '.join(fields)), params)
+
+
 def process_reporter(reporters):
-    """ For each institution, add the National Information Center RSSD ID. """
+    """ For each institution, add the National Information Center RSSD ID
+    and link its parent and top holder. Institutions and parents are loaded
+    up front and resolved in memory, then written back in bulk, in one
+    transaction. """
+    years = set(int(reporter.year) for reporter in reporters)
+    institutions = list(Institution.objects.filter(
+        year__in=years).select_related('zip_code').order_by('id'))
+    by_key = dict((institution_key(inst.year, inst.agency_id,
+                                   inst.ffiec_id), inst)
+                  for inst in institutions)
+    parents = dict((parent.rssd_id, parent)
+                   for parent in ParentInstitution.objects.all())
+
+    banks = []
     for reporter in reporters:
-        bank = get_institution(reporter)
-
+        bank = by_key.get(institution_key(
+            reporter.year, reporter.agency_code, reporter.respondant_id))
+        if bank is None:
+            raise Institution.DoesNotExist(
+                "No institution %s (agency %d) for %s" % (
+                    reporter.respondant_id, reporter.agency_code,
+                    reporter.year))
         if reporter.respondant_rssd_id == '0000000000':
             bank.rssd_id = None
         else:
             bank.rssd_id = reporter.respondant_rssd_id
-
-        bank = assign_parent(bank, reporter)
-
-        assign_top_holder(bank, reporter)
-        bank.save()
+        banks.append((bank, reporter))
+
+    # All RSSD IDs are known before any parents are looked up
+    by_hmda_id, by_rssd_id = index_institutions(institutions)
+    links = []
+    for bank, reporter in banks:
+        assign_parent(bank, reporter, by_hmda_id, by_rssd_id, parents, links)
+        assign_top_holder(bank, reporter, parents, links)
+
+    with transaction.atomic():
+        save_parents(parents)
+        for bank, field, parent in links:
+            setattr(bank, field + '_id', parent.pk)
+        update_institutions([bank for bank, _ in banks])
 
 
 def parse_file(filename):
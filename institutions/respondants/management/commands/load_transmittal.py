@@ -1,7 +1,8 @@
 import csv
 from django.core.management.base import BaseCommand
-from respondants.models import Institution, Agency
-from respondants.zipcode_utils import create_zipcode
+from django.db import transaction
+from respondants.models import Institution, Agency, Lender
+from respondants.zipcode_utils import create_zipcodes
 
 
 class Command(BaseCommand):
@@ -15,12 +16,21 @@ class Command(BaseCommand):
 
         with open(transmittal_filename) as institutioncsv:
             transmittal_reader = csv.reader(institutioncsv, delimiter='\t')
+            inst_lines = list(transmittal_reader)
+
+        with transaction.atomic():
+            # zip code, city, state
+            zipcodes = create_zipcodes(
+                (inst_line[8], inst_line[6], inst_line[7])
+                for inst_line in inst_lines)
             institutions = []
-            for inst_line in transmittal_reader:
-                zip_code = inst_line[8]
-                state = inst_line[7]
-                city = inst_line[6]
-                zipcode_city = create_zipcode(zip_code, city, state)
+            for inst_line in inst_lines:
+                zipcode_city = zipcodes.get(
+                    (inst_line[8], inst_line[6], inst_line[7]))
+                if zipcode_city is None:
+                    self.stderr.write("Skipping %s: bad zip code %r"
+                                      % (inst_line[1], inst_line[8]))
+                    continue
 
                 agency = agencies[int(inst_line[2])]
 
@@ -36,4 +46,12 @@ class Command(BaseCommand):
                 )
 
                 institutions.append(inst)
+            # bulk_create skips save(), so look up lender ids all at once
+            lenders = Lender.objects.ids(
+                inst.lender_code() for inst in institutions)
+            for inst in institutions:
+                inst.lender_id = lenders[inst.lender_code()]
             Institution.objects.bulk_create(institutions)
+            # In case the year's HMDA records were loaded first
+            for year in set(int(inst.year) for inst in institutions):
+                Institution.objects.count_loans(year)
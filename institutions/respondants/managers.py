@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import connection, models, transaction
 
 class AgencyManager(models.Manager):
     def get_all_by_code(self):
@@ -8,3 +8,37 @@ class AgencyManager(models.Manager):
         for agency in agencies:
             agency_map[agency.pk] = agency
         return agency_map
+
+
+class InstitutionManager(models.Manager):
+    def count_loans(self, year):
+        """Store the number of HMDA records each of a year's institutions
+        reported that year, in one pass over the aggregated HMDA table"""
+        from hmda.models import HMDARollup
+        with transaction.atomic():
+            self.filter(year=year).update(num_loans=0)
+            cursor = connection.cursor()
+            cursor.execute("""
+                UPDATE %s AS institution SET num_loans = counts.num_loans
+                FROM (SELECT lender_id, SUM(num_loans) AS num_loans
+                      FROM %s
+                      WHERE as_of_year = %%s
+                      GROUP BY lender_id) AS counts
+                WHERE institution.year = %%s
+                  AND institution.lender_id = counts.lender_id""" % (
+                self.model._meta.db_table, HMDARollup._meta.db_table),
+                [year, year])
+
+
+class LenderManager(models.Manager):
+    def ids(self, codes):
+        """Map lender codes (agency code followed by respondent id) to their
+        integer ids, adding any we've not seen before"""
+        codes = set(codes)
+        ids = dict(self.filter(code__in=codes).values_list('code', 'id'))
+        missing = codes - set(ids)
+        if missing:
+            self.bulk_create([self.model(code=code) for code in missing])
+            ids.update(self.filter(code__in=missing).values_list('code',
+                                                                 'id'))
+        return ids
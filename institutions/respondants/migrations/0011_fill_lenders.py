@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+from south.utils import datetime_utils as datetime
+from south.db import db
+from south.v2 import DataMigration
+from django.db import models
+
+class Migration(DataMigration):
+
+    def forwards(self, orm):
+        "Give each institution's lender an integer id"
+        code = "CAST(agency_id AS VARCHAR) || ffiec_id"
+        db.execute("""
+            INSERT INTO respondants_lender (code)
+            SELECT DISTINCT %s FROM respondants_institution
+            WHERE %s NOT IN (SELECT code FROM respondants_lender)"""
+                   % (code, code))
+        db.execute("""
+            UPDATE respondants_institution SET lender_id = known.id
+            FROM respondants_lender AS known
+            WHERE known.code = %s""" % code)
+
+    def backwards(self, orm):
+        db.execute("UPDATE respondants_institution SET lender_id = NULL")
+
+    models = {
+        u'respondants.agency': {
+            'Meta': {'object_name': 'Agency'},
+            'acronym': ('django.db.models.fields.CharField', [], {'max_length': '10'}),
+            'full_name': ('django.db.models.fields.CharField', [], {'max_length': '50'}),
+            'hmda_id': ('django.db.models.fields.IntegerField', [], {'primary_key': 'True'})
+        },
+        u'respondants.institution': {
+            'Meta': {'unique_together': "(('ffiec_id', 'agency'),)", 'object_name': 'Institution', 'index_together': "[['ffiec_id', 'agency', 'year']]"},
+            'agency': ('django.db.models.fields.related.ForeignKey', [], {'to': u"orm['respondants.Agency']"}),
+            'assets': ('django.db.models.fields.PositiveIntegerField', [], {'default': '0'}),
+            'ffiec_id': ('django.db.models.fields.CharField', [], {'max_length': '10'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'lender': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'institutions'", 'null': 'True', 'to': u"orm['respondants.Lender']"}),
+            'mailing_address': ('django.db.models.fields.CharField', [], {'max_length': '40'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '30'}),
+            'non_reporting_parent': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'children'", 'null': 'True', 'to': u"orm['respondants.ParentInstitution']"}),
+            'parent': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'children'", 'null': 'True', 'to': u"orm['respondants.Institution']"}),
+            'rssd_id': ('django.db.models.fields.CharField', [], {'max_length': '10', 'null': 'True'}),
+            'tax_id': ('django.db.models.fields.CharField', [], {'max_length': '10'}),
+            'top_holder': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'descendants'", 'null': 'True', 'to': u"orm['respondants.ParentInstitution']"}),
+            'year': ('django.db.models.fields.SmallIntegerField', [], {}),
+            'zip_code': ('django.db.models.fields.related.ForeignKey', [], {'to': u"orm['respondants.ZipcodeCityState']"})
+        },
+        u'respondants.lender': {
+            'Meta': {'object_name': 'Lender'},
+            'code': ('django.db.models.fields.CharField', [], {'unique': 'True', 'max_length': '11'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'})
+        },
+        u'respondants.parentinstitution': {
+            'Meta': {'object_name': 'ParentInstitution'},
+            'city': ('django.db.models.fields.CharField', [], {'max_length': '25'}),
+            'country': ('django.db.models.fields.CharField', [], {'max_length': '40', 'null': 'True'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '30'}),
+            'rssd_id': ('django.db.models.fields.CharField', [], {'max_length': '10', 'unique': 'True', 'null': 'True'}),
+            'state': ('django.db.models.fields.CharField', [], {'max_length': '2', 'null': 'True'}),
+            'year': ('django.db.models.fields.SmallIntegerField', [], {})
+        },
+        u'respondants.zipcodecitystate': {
+            'Meta': {'unique_together': "(('zip_code', 'city'),)", 'object_name': 'ZipcodeCityState'},
+            'city': ('django.db.models.fields.CharField', [], {'max_length': '25'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'plus_four': ('django.db.models.fields.IntegerField', [], {'null': 'True'}),
+            'state': ('localflavor.us.models.USStateField', [], {'max_length': '2'}),
+            'zip_code': ('django.db.models.fields.IntegerField', [], {})
+        }
+    }
+
+    complete_apps = ['respondants']
+    symmetrical = True
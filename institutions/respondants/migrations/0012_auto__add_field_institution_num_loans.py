@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+from south.utils import datetime_utils as datetime
+from south.db import db
+from south.v2 import SchemaMigration
+from django.db import models
+
+
+class Migration(SchemaMigration):
+
+    depends_on = (
+        ('hmda', '0010_lender_ids'),
+    )
+
+    def forwards(self, orm):
+        # Adding field 'Institution.num_loans'
+        db.add_column(u'respondants_institution', 'num_loans',
+                      self.gf('django.db.models.fields.PositiveIntegerField')(default=0),
+                      keep_default=False)
+
+        # Count the loans already loaded (see InstitutionManager.count_loans)
+        db.execute("""
+            UPDATE respondants_institution AS institution
+            SET num_loans = counts.num_loans
+            FROM (SELECT lender_id, as_of_year, SUM(num_loans) AS num_loans
+                  FROM hmda_hmdarollup
+                  GROUP BY lender_id, as_of_year) AS counts
+            WHERE institution.year = counts.as_of_year
+              AND institution.lender_id = counts.lender_id""")
+
+
+    def backwards(self, orm):
+        # Deleting field 'Institution.num_loans'
+        db.delete_column(u'respondants_institution', 'num_loans')
+
+
+    models = {
+        u'respondants.agency': {
+            'Meta': {'object_name': 'Agency'},
+            'acronym': ('django.db.models.fields.CharField', [], {'max_length': '10'}),
+            'full_name': ('django.db.models.fields.CharField', [], {'max_length': '50'}),
+            'hmda_id': ('django.db.models.fields.IntegerField', [], {'primary_key': 'True'})
+        },
+        u'respondants.institution': {
+            'Meta': {'unique_together': "(('ffiec_id', 'agency'),)", 'object_name': 'Institution', 'index_together': "[['ffiec_id', 'agency', 'year']]"},
+            'agency': ('django.db.models.fields.related.ForeignKey', [], {'to': u"orm['respondants.Agency']"}),
+            'assets': ('django.db.models.fields.PositiveIntegerField', [], {'default': '0'}),
+            'ffiec_id': ('django.db.models.fields.CharField', [], {'max_length': '10'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'lender': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'institutions'", 'null': 'True', 'to': u"orm['respondants.Lender']"}),
+            'mailing_address': ('django.db.models.fields.CharField', [], {'max_length': '40'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '30'}),
+            'non_reporting_parent': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'children'", 'null': 'True', 'to': u"orm['respondants.ParentInstitution']"}),
+            'num_loans': ('django.db.models.fields.PositiveIntegerField', [], {'default': '0'}),
+            'parent': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'children'", 'null': 'True', 'to': u"orm['respondants.Institution']"}),
+            'rssd_id': ('django.db.models.fields.CharField', [], {'max_length': '10', 'null': 'True'}),
+            'tax_id': ('django.db.models.fields.CharField', [], {'max_length': '10'}),
+            'top_holder': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'descendants'", 'null': 'True', 'to': u"orm['respondants.ParentInstitution']"}),
+            'year': ('django.db.models.fields.SmallIntegerField', [], {}),
+            'zip_code': ('django.db.models.fields.related.ForeignKey', [], {'to': u"orm['respondants.ZipcodeCityState']"})
+        },
+        u'respondants.lender': {
+            'Meta': {'object_name': 'Lender'},
+            'code': ('django.db.models.fields.CharField', [], {'unique': 'True', 'max_length': '11'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'})
+        },
+        u'respondants.parentinstitution': {
+            'Meta': {'object_name': 'ParentInstitution'},
+            'city': ('django.db.models.fields.CharField', [], {'max_length': '25'}),
+            'country': ('django.db.models.fields.CharField', [], {'max_length': '40', 'null': 'True'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '30'}),
+            'rssd_id': ('django.db.models.fields.CharField', [], {'max_length': '10', 'unique': 'True', 'null': 'True'}),
+            'state': ('django.db.models.fields.CharField', [], {'max_length': '2', 'null': 'True'}),
+            'year': ('django.db.models.fields.SmallIntegerField', [], {})
+        },
+        u'respondants.zipcodecitystate': {
+            'Meta': {'unique_together': "(('zip_code', 'city'),)", 'object_name': 'ZipcodeCityState'},
+            'city': ('django.db.models.fields.CharField', [], {'max_length': '25'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'plus_four': ('django.db.models.fields.IntegerField', [], {'null': 'True'}),
+            'state': ('localflavor.us.models.USStateField', [], {'max_length': '2'}),
+            'zip_code': ('django.db.models.fields.IntegerField', [], {})
+        }
+    }
+
+    complete_apps = ['respondants']
\ No newline at end of file
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+from south.utils import datetime_utils as datetime
+from south.db import db
+from south.v2 import SchemaMigration
+from django.db import models
+
+
+class Migration(SchemaMigration):
+
+    def forwards(self, orm):
+        # Removing unique constraint on 'Institution', fields ['ffiec_id', 'agency']
+        db.delete_unique(u'respondants_institution', ['ffiec_id', 'agency_id'])
+
+        # Removing index on 'Institution', fields ['ffiec_id', 'agency', 'year']
+        db.delete_index(u'respondants_institution', ['ffiec_id', 'agency_id', 'year'])
+
+        # Adding unique constraint on 'Institution', fields ['ffiec_id', 'agency', 'year']
+        db.create_unique(u'respondants_institution', ['ffiec_id', 'agency_id', 'year'])
+
+
+    def backwards(self, orm):
+        # Removing unique constraint on 'Institution', fields ['ffiec_id', 'agency', 'year']
+        db.delete_unique(u'respondants_institution', ['ffiec_id', 'agency_id', 'year'])
+
+        # Adding index on 'Institution', fields ['ffiec_id', 'agency', 'year']
+        db.create_index(u'respondants_institution', ['ffiec_id', 'agency_id', 'year'])
+
+        # Adding unique constraint on 'Institution', fields ['ffiec_id', 'agency']
+        db.create_unique(u'respondants_institution', ['ffiec_id', 'agency_id'])
+
+
+    models = {
+        u'respondants.agency': {
+            'Meta': {'object_name': 'Agency'},
+            'acronym': ('django.db.models.fields.CharField', [], {'max_length': '10'}),
+            'full_name': ('django.db.models.fields.CharField', [], {'max_length': '50'}),
+            'hmda_id': ('django.db.models.fields.IntegerField', [], {'primary_key': 'True'})
+        },
+        u'respondants.institution': {
+            'Meta': {'unique_together': "(('ffiec_id', 'agency', 'year'),)", 'object_name': 'Institution'},
+            'agency': ('django.db.models.fields.related.ForeignKey', [], {'to': u"orm['respondants.Agency']"}),
+            'assets': ('django.db.models.fields.PositiveIntegerField', [], {'default': '0'}),
+            'ffiec_id': ('django.db.models.fields.CharField', [], {'max_length': '10'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'lender': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'institutions'", 'null': 'True', 'to': u"orm['respondants.Lender']"}),
+            'mailing_address': ('django.db.models.fields.CharField', [], {'max_length': '40'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '30'}),
+            'non_reporting_parent': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'children'", 'null': 'True', 'to': u"orm['respondants.ParentInstitution']"}),
+            'num_loans': ('django.db.models.fields.PositiveIntegerField', [], {'default': '0'}),
+            'parent': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'children'", 'null': 'True', 'to': u"orm['respondants.Institution']"}),
+            'rssd_id': ('django.db.models.fields.CharField', [], {'max_length': '10', 'null': 'True'}),
+            'tax_id': ('django.db.models.fields.CharField', [], {'max_length': '10'}),
+            'top_holder': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'descendants'", 'null': 'True', 'to': u"orm['respondants.ParentInstitution']"}),
+            'year': ('django.db.models.fields.SmallIntegerField', [], {}),
+            'zip_code': ('django.db.models.fields.related.ForeignKey', [], {'to': u"orm['respondants.ZipcodeCityState']"})
+        },
+        u'respondants.lender': {
+            'Meta': {'object_name': 'Lender'},
+            'code': ('django.db.models.fields.CharField', [], {'unique': 'True', 'max_length': '11'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'})
+        },
+        u'respondants.parentinstitution': {
+            'Meta': {'object_name': 'ParentInstitution'},
+            'city': ('django.db.models.fields.CharField', [], {'max_length': '25'}),
+            'country': ('django.db.models.fields.CharField', [], {'max_length': '40', 'null': 'True'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '30'}),
+            'rssd_id': ('django.db.models.fields.CharField', [], {'max_length': '10', 'unique': 'True', 'null': 'True'}),
+            'state': ('django.db.models.fields.CharField', [], {'max_length': '2', 'null': 'True'}),
+            'year': ('django.db.models.fields.SmallIntegerField', [], {})
+        },
+        u'respondants.zipcodecitystate': {
+            'Meta': {'unique_together': "(('zip_code', 'city'),)", 'object_name': 'ZipcodeCityState'},
+            'city': ('django.db.models.fields.CharField', [], {'max_length': '25'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'plus_four': ('django.db.models.fields.IntegerField', [], {'null': 'True'}),
+            'state': ('localflavor.us.models.USStateField', [], {'max_length': '2'}),
+            'zip_code': ('django.db.models.fields.IntegerField', [], {})
+        }
+    }
+
+    complete_apps = ['respondants']
\ No newline at end of file
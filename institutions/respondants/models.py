@@ -2,7 +2,8 @@ from django.db import models
 from django.template import defaultfilters
 from localflavor.us.models import USStateField
 
-from respondants.managers import AgencyManager
+from respondants.managers import (
+    AgencyManager, InstitutionManager, LenderManager)
 
 
 class ZipcodeCityState(models.Model):
@@ -36,6 +37,20 @@ class Agency(models.Model):
         return self.acronym
 
 
+class Lender(models.Model):
+    """ Lenders are identified by an agency code followed by a respondent id
+    (e.g. 50000000319). HMDA records and institutions refer to lenders by
+    this table's integer id instead, which is far cheaper to index and join
+    on. """
+
+    code = models.CharField(max_length=11, unique=True)
+
+    objects = LenderManager()
+
+    def __unicode__(self):
+        return self.code
+
+
 class ParentInstitution(models.Model):
     """ Parent and top holder institutions need to be stored a bit differently
     because (1) they can be international and (2) they might not report HMDA so
@@ -90,6 +105,27 @@ class Institution(models.Model):
         related_name='descendants',
         null=True,
         help_text='The company at the top of the ownership chain.')
+    lender = models.ForeignKey(
+        'Lender',
+        null=True,
+        related_name='institutions')
+    num_loans = models.PositiveIntegerField(
+        default=0,
+        help_text='Number of HMDA records reported for this year')
+
+    objects = InstitutionManager()
+
+    def lender_code(self):
+        return str(self.agency_id) + self.ffiec_id
+
+    def auto_fields(self):
+        if self.lender_id is None:
+            code = self.lender_code()
+            self.lender_id = Lender.objects.ids([code])[code]
+
+    def save(self, *args, **kwargs):
+        self.auto_fields()
+        super(Institution, self).save(*args, **kwargs)
 
     def formatted_name(self):
         formatted = defaultfilters.title(self.name) + " (0"
@@ -97,8 +133,7 @@ class Institution(models.Model):
         return formatted
 
     class Meta:
-        unique_together = ('ffiec_id', 'agency')
-        index_together = [['ffiec_id', 'agency', 'year']]
+        unique_together = ('ffiec_id', 'agency', 'year')
 
     def __unicode__(self):
         return self.name
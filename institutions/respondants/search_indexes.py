@@ -16,16 +16,9 @@ class InstitutionIndex(indexes.SearchIndex, indexes.Indexable):
         return Institution
 
     def index_queryset(self, using=None):
-        """To account for the somewhat complicated count query, we need to add
-        an "extra" annotation"""
-        subquery_tail = """
-            FROM hmda_hmdarecord
-            WHERE hmda_hmdarecord.lender
-                    = CAST(respondants_institution.agency_id AS VARCHAR(1))
-                      || respondants_institution.ffiec_id"""
-        return self.get_model().objects.extra(
-            select={"num_loans": "SELECT COUNT(*) " + subquery_tail},
-            where=["SELECT COUNT(*) > 0 " + subquery_tail])
+        """Only institutions which reported loans. Counts are stored by
+        Institution.objects.count_loans after each load"""
+        return self.get_model().objects.filter(num_loans__gt=0)
 
     def prepare_lender_id(self, institution):
         return str(institution.agency_id) + institution.ffiec_id
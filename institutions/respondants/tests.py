@@ -5,43 +5,140 @@ from django.test import RequestFactory, TestCase
 from mock import Mock, patch
 
 from geo.models import Geo
-from hmda.models import HMDARecord
+from hmda.models import HMDARecord, HMDARollup
 from respondants import views, zipcode_utils
-from respondants.models import Agency, Institution, ZipcodeCityState
+from respondants.models import (
+    Agency, Institution, Lender, ParentInstitution, ZipcodeCityState)
 from respondants.management.commands import load_reporter_panel
 from respondants.management.commands import load_transmittal
 from respondants.search_indexes import InstitutionIndex
 
 
 class ZipcodeUtilsTests(TestCase):
-    def test_createzipcode(self):
-        ZipcodeCityState.objects.all().delete()
-        zipcode_utils.create_zipcode('20852', 'Rockville', 'MD')
-
-        results = ZipcodeCityState.objects.filter(state='MD')
-        self.assertEqual(1, len(results))
-
-        self.assertEqual(results[0].zip_code, 20852)
-        self.assertEqual(results[0].city, 'Rockville')
-        self.assertEqual(results[0].state, 'MD')
+    def test_create_zipcodes(self):
+        existing = ZipcodeCityState.objects.create(
+            zip_code=20852, city='Rockville', state='MD')
+        entries = [('20852', 'Rockville', 'MD'),
+                   ('20852-1234', 'Rockville', 'MD'),
+                   ('20852', 'North Bethesda', 'MD'),
+                   ('60601-0101', 'Chicago', 'IL'),
+                   ('606O1', 'Chicago', 'IL')]
+        zipcodes = zipcode_utils.create_zipcodes(entries)
+
+        self.assertEqual(3, ZipcodeCityState.objects.count())
+        self.assertEqual(existing.pk, zipcodes[entries[0]].pk)
+        self.assertEqual(existing.pk, zipcodes[entries[1]].pk)
+        self.assertEqual('North Bethesda', zipcodes[entries[2]].city)
+        chicago = ZipcodeCityState.objects.get(city='Chicago')
+        self.assertEqual(chicago.pk, zipcodes[entries[3]].pk)
+        self.assertEqual((60601, 101), (chicago.zip_code, chicago.plus_four))
+        # Malformed
+        self.assertFalse(entries[4] in zipcodes)
 
     def test_duplicate_entries(self):
         """ We insert a duplicate entry, and check that it wasn't in fact
         duplicated. """
-        zipcode_utils.create_zipcode('20852', 'Rockville', 'MD')
+        zipcode_utils.create_zipcodes([('20852', 'Rockville', 'MD')])
+        zipcode_utils.create_zipcodes([('20852', 'Rockville', 'MD')])
         results = ZipcodeCityState.objects.filter(state='MD')
         self.assertEqual(1, len(results))
 
 
+class LenderTests(TestCase):
+    fixtures = ['agency', 'dummy_tracts']
+
+    def test_ids(self):
+        ids = Lender.objects.ids(['10000055547', '90123456789'])
+        self.assertEqual(2, Lender.objects.count())
+        self.assertEqual(Lender.objects.get(code='10000055547').id,
+                         ids['10000055547'])
+        # Known lenders keep their ids
+        again = Lender.objects.ids(['90123456789', '50000000319'])
+        self.assertEqual(ids['90123456789'], again['90123456789'])
+        self.assertEqual(3, Lender.objects.count())
+
+    def test_institution_lender(self):
+        zipcode = ZipcodeCityState.objects.create(
+            zip_code=12345, city='City', state='IL')
+        inst = Institution.objects.create(
+            year=1234, ffiec_id='9876543210', agency=Agency.objects.get(pk=9),
+            tax_id='1111111111', name='Institution', mailing_address='mail',
+            zip_code=zipcode)
+        self.assertEqual('99876543210', inst.lender.code)
+
+    def test_count_loans(self):
+        zipcode = ZipcodeCityState.objects.create(
+            zip_code=12345, city='City', state='IL')
+        for year, ffiec_id in ((2012, '0123456789'), (2013, '9876543210')):
+            Institution.objects.create(
+                year=year, ffiec_id=ffiec_id,
+                agency=Agency.objects.get(pk=9), tax_id='1111111111',
+                name='Institution', mailing_address='mail',
+                zip_code=zipcode, num_loans=7)
+        lender = Institution.objects.get(year=2013).lender
+        geo = Geo.objects.get(geoid='1122233300')
+        for action_taken, num_loans in ((1, 3), (3, 2)):
+            HMDARollup.objects.create(
+                lender=lender, geoid=geo, as_of_year=2013, statefp='11',
+                countyfp='222', action_taken=action_taken,
+                num_loans=num_loans, loan_amount_000s=100)
+
+        Institution.objects.count_loans(2013)
+        self.assertEqual(5, Institution.objects.get(year=2013).num_loans)
+        # Other years are left alone
+        self.assertEqual(7, Institution.objects.get(year=2012).num_loans)
+        Institution.objects.count_loans(2012)
+        self.assertEqual(0, Institution.objects.get(year=2012).num_loans)
+
+
 class ReporterPanelLoadingTests(TestCase):
+    fixtures = ['agency']
+    reporter_line = "201400000555471                                                                   0312328543920FIRST FAKE BK NA                                                      TERRE HAUTE              CA                    0001208595FIRST FC                      TERRE HAUTE              CAUNITED STATES                           0000693345001234000018"
+
     def test_parseline(self):
-        reporter_line = "201400000555471                                                                   0312328543920FIRST FAKE BK NA                                                      TERRE HAUTE              CA                    0001208595FIRST FC                      TERRE HAUTE              CAUNITED STATES                           0000693345001234000018"
-        reporter_row = load_reporter_panel.parse_line(reporter_line)
+        reporter_row = load_reporter_panel.parse_line(self.reporter_line)
         self.assertEqual('2014', reporter_row.year)
         self.assertEqual('0000055547', reporter_row.respondant_id)
         self.assertEqual(1, reporter_row.agency_code)
         self.assertEqual('', reporter_row.parent_id)
 
+    def test_process_reporter(self):
+        zipcode = ZipcodeCityState.objects.create(
+            zip_code=90210, city='City', state='CA')
+        agency = Agency.objects.get(pk=1)
+        bank, parent_bank = [Institution.objects.create(
+            year=2014, ffiec_id=ffiec_id, agency=agency, tax_id='1111111111',
+            name=name, mailing_address='mail', zip_code=zipcode)
+            for ffiec_id, name in (('0000055547', 'Bank'),
+                                   ('0000012345', 'Parent'))]
+        reporter = load_reporter_panel.parse_line(self.reporter_line)
+        reporters = [
+            # Parent found by HMDA ID and state
+            reporter._replace(parent_id='0000012345', parent_state='CA'),
+            # Parent doesn't report HMDA; same top holder
+            reporter._replace(respondant_id='0000012345',
+                              respondant_rssd_id='0000000000',
+                              parent_id='9999999999', parent_name='Holding',
+                              parent_rssd_id='0000000777')]
+        load_reporter_panel.process_reporter(reporters)
+
+        bank = Institution.objects.get(pk=bank.pk)
+        parent_bank = Institution.objects.get(pk=parent_bank.pk)
+        self.assertEqual('0000693345', bank.rssd_id)
+        self.assertEqual(parent_bank, bank.parent)
+        self.assertEqual(None, bank.non_reporting_parent)
+        self.assertEqual(None, parent_bank.rssd_id)
+        self.assertEqual(None, parent_bank.parent)
+        self.assertEqual('Holding', parent_bank.non_reporting_parent.name)
+        self.assertEqual('0001208595', bank.top_holder.rssd_id)
+        self.assertEqual(bank.top_holder, parent_bank.top_holder)
+        self.assertEqual(2, ParentInstitution.objects.count())
+
+        # Missing institutions are an error
+        self.assertRaises(
+            Institution.DoesNotExist, load_reporter_panel.process_reporter,
+            [reporter._replace(respondant_id='0000000001')])
+
 
 class LoadTransmittalTests(TestCase):
     fixtures = ['agency']
@@ -66,6 +163,46 @@ class LoadTransmittalTests(TestCase):
         self.assertEqual(inst.ffiec_id, '0000055547')
         self.assertEqual(inst.agency_id, 1)
         self.assertEqual(inst.assets, 121212)
+        self.assertEqual(inst.lender.code, '10000055547')
+
+    @patch('__builtin__.open')
+    def test_handle_second_year(self, mock_open):
+        mock_open = mock_open.return_value.__enter__.return_value
+        line = "\t0000055547\t1\tTAXIDHERE\tFIRST FAKE BK NA\t"
+        line += "1122 S 3RD ST\tTERRE HAUTE\tCA\t90210\t"
+        line += "FIRST FAKE CORPORATION\tONE ADDR\tTERRE HAUTE\tCA\t90210\t"
+        line += "FIRST FAKE BK NA\tTERRE HAUTE\tCA\t121212\t0\t3\t3657\tN"
+        cmd = load_transmittal.Command()
+        for year in ('2012', '2013'):
+            mock_open.__iter__.return_value = [year + line]
+            cmd.handle('somefile.txt')
+
+        query = Institution.objects.order_by('year')
+        self.assertEqual([2012, 2013], [inst.year for inst in query])
+        self.assertEqual(1, len(set(inst.lender_id for inst in query)))
+
+        results = self.client.get(
+            reverse('respondants:select_metro',
+                    kwargs={'agency_id': '1', 'respondent': '0000055547'}))
+        self.assertEqual(200, results.status_code)
+        self.assertEqual(2013, results.context['institution'].year)
+
+    @patch('__builtin__.open')
+    def test_handle_bad_zipcode(self, mock_open):
+        mock_open = mock_open.return_value.__enter__.return_value
+        line = "2012\t%s\t1\tTAXIDHERE\tFIRST FAKE BK NA\t"
+        line += "1122 S 3RD ST\tTERRE HAUTE\tCA\t%s\t"
+        line += "FIRST FAKE CORPORATION\tONE ADDR\tTERRE HAUTE\tCA\t90210\t"
+        line += "FIRST FAKE BK NA\tTERRE HAUTE\tCA\t121212\t0\t3\t3657\tN"
+        mock_open.__iter__.return_value = [line % ('0000055547', '90210'),
+                                           line % ('0000055548', 'N/A')]
+        cmd = load_transmittal.Command()
+        cmd.stderr = Mock()
+        cmd.handle('somefile.txt')
+
+        self.assertEqual(['0000055547'], [
+            inst.ffiec_id for inst in Institution.objects.all()])
+        self.assertTrue(cmd.stderr.write.called)
 
 
 class ViewTest(TestCase):
@@ -232,17 +369,19 @@ class InstitutionIndexTests(TestCase):
         zipcode = ZipcodeCityState.objects.create(
             zip_code=12345, city='City', state='IL')
         inst1 = Institution.objects.create(
-            year=1234, ffiec_id='9876543210', agency=Agency.objects.get(pk=9),
+            year=2005, ffiec_id='9876543210', agency=Agency.objects.get(pk=9),
             tax_id='1111111111', name='Institution', mailing_address='mail',
             zip_code=zipcode)
         inst2 = Institution.objects.create(
-            year=1234, ffiec_id='0123456789', agency=Agency.objects.get(pk=9),
+            year=2005, ffiec_id='0123456789', agency=Agency.objects.get(pk=9),
             tax_id='2222222222', name='Institution', mailing_address='mail',
             zip_code=zipcode)
         hmda = HMDARecord.objects.create(
             as_of_year=2005, respondent_id='9876543210', agency_code='9',
             loan_amount_000s=100, action_taken=4, statefp='00',
-            countyfp='000', lender='998765433210', geoid=Geo.objects.all()[0])
+            countyfp='000', geoid=Geo.objects.all()[0])
+        HMDARollup.objects.rebuild(2005)
+        Institution.objects.count_loans(2005)
 
         found1, found2 = False, False
         index = InstitutionIndex()
@@ -255,6 +394,7 @@ class InstitutionIndexTests(TestCase):
         self.assertTrue(found1)
         self.assertFalse(found2)
 
+        HMDARollup.objects.all().delete()
         hmda.delete()
         inst2.delete()
         inst1.delete()
@@ -1,5 +1,6 @@
 import re
 
+from django.http import Http404
 from django.shortcuts import render, get_object_or_404
 from haystack.inputs import AutoQuery, Exact
 from haystack.query import SearchQuerySet
@@ -41,9 +42,13 @@ def search_home(request):
 
 
 def select_metro(request, agency_id, respondent):
-    """Once an institution is selected, search for a metro"""
-    institution = get_object_or_404(Institution, ffiec_id=respondent,
-                                    agency_id=int(agency_id))
+    """Once an institution is selected, search for a metro. Institutions
+    are listed once per year; use the latest"""
+    institution = Institution.objects.filter(
+        ffiec_id=respondent, agency_id=int(agency_id))
+    institution = institution.order_by('-year').first()
+    if not institution:
+        raise Http404
     return render(request, 'respondants/metro_search.html', {
         'institution': institution
     })
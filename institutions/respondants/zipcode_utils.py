@@ -1,27 +1,44 @@
-from django.db.utils import IntegrityError
 from respondants.models import ZipcodeCityState
 
-def create_zipcode(zip_code, city, state):
 
-    zipcode_city = ZipcodeCityState(
-        city = city,
-        state = state,
-    )
-    
+def split_zipcode(zip_code):
+    """ Returns (zip code, plus four), the latter possibly None. Raises
+    ValueError if the zip code is malformed. """
+    plus_four = None
     if '-' in zip_code:
         zip_code, plus_four = zip_code.split('-')
-        zipcode_city.plus_four = plus_four
+        plus_four = int(plus_four)
+    return int(zip_code), plus_four
 
-    zipcode_city.zip_code = zip_code
-    try: 
-        zipcode_city.save()
-    except IntegrityError:
-        results = ZipcodeCityState.objects.filter(
-            zip_code=zip_code, 
-            city=city)
-        if len(results) > 0:
-            return results[0]
-        else:
-            raise
-    return zipcode_city
 
+def create_zipcodes(entries):
+    """ Takes (zip_code, city, state) tuples and returns a dictionary
+    mapping each to its ZipcodeCityState, fetching the existing ones in one
+    query and creating the rest in another. Zip code and city identify a
+    row. Entries with malformed zip codes are left out of the results. """
+    keys, wanted = {}, {}
+    for entry in entries:
+        raw_zip_code, city, state = entry
+        try:
+            zip_code, plus_four = split_zipcode(raw_zip_code)
+        except ValueError:
+            continue
+        keys[entry] = (zip_code, city)
+        wanted.setdefault((zip_code, city), ZipcodeCityState(
+            zip_code=zip_code, plus_four=plus_four, city=city, state=state))
+
+    def fetch():
+        zip_codes = set(zip_code for zip_code, _ in wanted)
+        return dict(((zipcode_city.zip_code, zipcode_city.city), zipcode_city)
+                    for zipcode_city in ZipcodeCityState.objects.filter(
+                        zip_code__in=zip_codes)
+                    if (zipcode_city.zip_code, zipcode_city.city) in wanted)
+
+    found = fetch()
+    missing = [zipcode_city for key, zipcode_city in wanted.items()
+               if key not in found]
+    if missing:
+        ZipcodeCityState.objects.bulk_create(missing)
+        found = fetch()
+
+    return dict((entry, found[key]) for entry, key in keys.items())